@@ -1,11 +1,24 @@
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar, Union
+import asyncio
+import contextvars
+import functools
+import hashlib
+import heapq
 import logging
+import random
+import re
+import subprocess
+import time
+
+import requests
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END, START
 
 from ..models.pr_models import (
     PRReviewState, 
     PullRequest, 
+    FileChange,
     PRComment, 
     PRIssue,
     RepositoryInfo,
@@ -13,11 +26,177 @@ from ..models.pr_models import (
     DocumentInfo,
     IssueInfo
 )
-from ..services.github_service import GitHubService
-from ..services.llm_service import LLMService
+from ..services.github_service import GitHubService, should_retry, should_retry_gh
+from ..services.llm_service import LLMService, MAX_CONTEXT_DOCS
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Default maximum number of LLM requests in flight while analyzing a PR diff
+LLM_CONCURRENCY = 8
+
+# Maximum number of GitHub requests in flight while posting comments
+GITHUB_CONCURRENCY = 5
+
+# Posting a comment is retried on transient gh or HTTP failures (rate limits,
+# server errors and dropped connections), waiting a random time up to an
+# exponentially growing limit between attempts
+COMMENT_POST_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_POST_ERRORS = (subprocess.CalledProcessError, requests.RequestException)
+
+# Upper bound on waiting for a GitHub rate limit to reset before retrying
+RATE_LIMIT_MAX_WAIT = 120.0
+
+# Files that never get useful review comments: vendored code, build output,
+# lockfiles, minified assets, binaries and generated protobuf code
+SKIP_ANALYSIS_PATTERNS = (
+    re.compile(r"(^|/)(node_modules|vendor|dist|build)/"),
+    re.compile(r"\.(lock|min\.js|min\.css|map|png|jpe?g|gif|ico|svg|pdf)$"),
+    re.compile(r"(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|go\.sum)$"),
+    re.compile(r"(_pb2\.py|\.pb\.go)$"),
+)
+
+# Patches larger than this are generated code in practice
+MAX_PATCH_BYTES = 200_000
+
+# Larger patches are split on hunk boundaries into chunks of about this size,
+# so every LLM request stays well inside the model's context window
+MAX_HUNK_BYTES = 8_000
+
+HUNK_START_PATTERN = re.compile(r"(?=^@@ )", re.MULTILINE)
+
+# Start line of the new side in a hunk header, e.g. "@@ -10,4 +12,6 @@"
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)")
+
+# Number of PR descriptions whose linked issues are kept for re-reviews
+LINKED_ISSUES_CACHE_SIZE = 256
+
+# Allowed issue types and known severities. Values parsed from LLM responses are
+# mapped onto these so every issue shares one string object per value.
+ISSUE_TYPES = {issue_type: issue_type for issue_type in ("question", "suggestion", "nitpick", "error", "praise")}
+SEVERITIES = {severity: severity for severity in ("low", "medium", "high")}
+
+# Only this much of a complete file is included in an analysis prompt
+FULL_CONTENT_PROMPT_BYTES = 2_000
+
+
+def _split_hunks(patch: str) -> List[str]:
+    """
+    Split a patch into chunks of whole hunks of at most MAX_HUNK_BYTES.
+    
+    A single hunk larger than the limit becomes its own chunk. Any file header
+    before the first hunk is repeated at the start of every chunk.
+    
+    Args:
+        patch: The patch to split
+        
+    Returns:
+        List of patch chunks
+    """
+    if len(patch) <= MAX_HUNK_BYTES:
+        return [patch]
+    
+    header, *hunks = HUNK_START_PATTERN.split(patch)
+    chunks = []
+    current = ""
+    for hunk in hunks:
+        if current and len(current) + len(hunk) > MAX_HUNK_BYTES:
+            chunks.append(header + current)
+            current = ""
+        current += hunk
+    if current:
+        chunks.append(header + current)
+    
+    return chunks or [patch]
+
+
+def _is_whitespace_only(patch: str) -> bool:
+    """
+    Check if a patch only adds or removes blank lines or trailing whitespace.
+    
+    Each hunk's old side (context and removed lines) is compared with its new
+    side (context and added lines), so lines moved past their context are a
+    real change. Indentation changes are not ignored, they change the meaning
+    of Python and YAML files.
+    
+    Args:
+        patch: The patch to check
+        
+    Returns:
+        True if the old and new side of every hunk are the same apart from
+        blank lines and trailing whitespace
+    """
+    old_side = []
+    new_side = []
+    in_hunk = False
+    for line in patch.splitlines():
+        if line.startswith("@@"):
+            if old_side != new_side:
+                return False
+            old_side = []
+            new_side = []
+            in_hunk = True
+            continue
+        if not in_hunk or line.startswith("\\"):
+            # File header before the first hunk and "\ No newline at end of file"
+            continue
+        text = line[1:].rstrip()
+        if not text:
+            continue
+        if not line.startswith("+"):
+            old_side.append(text)
+        if not line.startswith("-"):
+            new_side.append(text)
+    
+    return old_side == new_side
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Check if a failed GitHub request may succeed when retried.
+    
+    Args:
+        error: The error raised by the request
+        
+    Returns:
+        True for rate limits and server errors. A post that timed out or lost its
+        connection may have been created, so it is not retried
+    """
+    if isinstance(error, subprocess.CalledProcessError):
+        return should_retry_gh(error)
+    return should_retry(getattr(error, "response", None))
+
+
+def _commentable_lines(patch: str) -> Set[int]:
+    """
+    Get the lines of the new file that GitHub accepts line comments on.
+    
+    These are the added and context lines of the patch's hunks.
+    
+    Args:
+        patch: The patch of a file
+        
+    Returns:
+        Line numbers in the new version of the file
+    """
+    lines = set()
+    line_number = None
+    for line in patch.splitlines():
+        match = HUNK_HEADER_PATTERN.match(line)
+        if match:
+            line_number = int(match.group(1))
+        elif line_number is None or line.startswith(("-", "\\")):
+            # File header before the first hunk, removed lines and "\ No newline at end of file"
+            continue
+        else:
+            lines.add(line_number)
+            line_number += 1
+    return lines
+
+
 class PRReviewAgent:
     """Agent for reviewing GitHub PRs using LLMs."""
     
@@ -26,7 +205,10 @@ class PRReviewAgent:
         github_service: Optional[GitHubService] = None,
         llm_service: Optional[LLMService] = None,
         repository: Optional[str] = None,
-        github_token: Optional[str] = None
+        github_token: Optional[str] = None,
+        eager: bool = False,
+        llm_concurrency: int = LLM_CONCURRENCY,
+        llm_batch_bytes: int = 0
     ):
         """
         Initialize the PR Review Agent.
@@ -36,42 +218,125 @@ class PRReviewAgent:
             llm_service: LLM service instance (optional)
             repository: Repository in the format 'owner/repo' (optional)
             github_token: GitHub token for authentication (optional)
+            eager: Run the nodes directly instead of through the LangGraph
+                workflow. Skips the per-node graph overhead, but also any
+                checkpointing or tracing hooked into the graph.
+            llm_concurrency: Maximum number of files analyzed by the LLM at the
+                same time. Lower it for local models that serve one request at a time.
+            llm_batch_bytes: Analyze small files together in one LLM request of up
+                to this many bytes of diff and file content, so the guidelines and
+                docs are sent once per request instead of once per file. Disabled
+                when 0, as small models review fewer files per request more reliably.
         """
         self.github_service = github_service or GitHubService(repository=repository, token=github_token)
         self.llm_service = llm_service or LLMService()
+        self.eager = eager
+        self.llm_concurrency = llm_concurrency
+        self.llm_batch_bytes = llm_batch_bytes
+        # Repository content that only changes with new commits, by (kind, repository),
+        # kept with the commit it was fetched at so later reviews can reuse it
+        self._repository_cache: Dict[Tuple[str, str], Tuple[str, Any]] = {}
+        # Linked issues by (repository, digest of the PR description)
+        self._linked_issues_cache: Dict[Tuple[str, str], List[IssueInfo]] = {}
+        # The GitHub and LLM services block, so their calls run in threads. The
+        # default executor only has os.cpu_count() + 4 threads, which would cap
+        # the concurrency limits below on small machines.
+        self._executor = ThreadPoolExecutor(
+            max_workers=llm_concurrency + GITHUB_CONCURRENCY,
+            thread_name_prefix="pr-review"
+        )
         self.workflow = self._create_workflow()
     
+    async def _to_thread(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking call in the agent's thread pool, like asyncio.to_thread.
+        
+        Args:
+            func: The blocking function to call
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+            
+        Returns:
+            The return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(context.run, func, *args, **kwargs)
+        )
+    
+    def _workflow_stages(self) -> List[List[Tuple[str, Callable[[PRReviewState], Awaitable[Dict[str, Any]]]]]]:
+        """
+        Return the workflow nodes grouped into stages that run one after another.
+        
+        Nodes only depend on the results of earlier stages and each writes its
+        own state fields, so the nodes within a stage run concurrently.
+        """
+        return [
+            # Only need the repository, so they run alongside the PR fetch
+            [
+                ("fetch_pr", self.fetch_pr),
+                ("fetch_repository_info", self.fetch_repository_info),
+                ("fetch_repository_guidelines", self.fetch_repository_guidelines),
+            ],
+            # Need the PR information or the changed files
+            [
+                ("fetch_complete_files", self.fetch_complete_files),
+                ("fetch_repository_docs", self.fetch_repository_docs),
+                ("analyze_pr_description", self.analyze_pr_description),
+                ("fetch_linked_issues", self.fetch_linked_issues),
+            ],
+            [
+                ("review_pipeline", self.review_pipeline),
+            ],
+        ]
+    
+    def _stop_on_errors(self, next_steps: List[str]) -> Callable[[PRReviewState], Union[List[str], str]]:
+        """
+        Build a router that continues with the next steps unless an error was recorded.
+        
+        Args:
+            next_steps: Names of the nodes to run next
+            
+        Returns:
+            Routing function for a conditional edge
+        """
+        def route(state: PRReviewState) -> Union[List[str], str]:
+            return END if state.errors else next_steps
+        
+        return route
+    
+    async def _join_stage(self, state: PRReviewState) -> Dict[str, Any]:
+        """Wait for all nodes of a stage to finish, the state is left unchanged."""
+        return {}
+    
     def _create_workflow(self) -> StateGraph:
         """Create the LangGraph workflow for PR review."""
         # Define the workflow graph
         workflow = StateGraph(PRReviewState)
         
+        stages = self._workflow_stages()
+        
         # Add nodes to the workflow
-        workflow.add_node("fetch_pr_info", self.fetch_pr_info)
-        workflow.add_node("fetch_repository_info", self.fetch_repository_info)
-        workflow.add_node("fetch_repository_guidelines", self.fetch_repository_guidelines)
-        workflow.add_node("fetch_pr_diff", self.fetch_pr_diff)
-        workflow.add_node("fetch_complete_files", self.fetch_complete_files)
-        workflow.add_node("fetch_repository_docs", self.fetch_repository_docs)
-        workflow.add_node("analyze_pr_description", self.analyze_pr_description)
-        workflow.add_node("fetch_linked_issues", self.fetch_linked_issues)
-        workflow.add_node("analyze_diff", self.analyze_diff)
-        workflow.add_node("generate_comments", self.generate_comments)
-        workflow.add_node("add_comments", self.add_comments)
-        
-        # Define the edges of the workflow
-        workflow.set_entry_point("fetch_pr_info")
-        workflow.add_edge("fetch_pr_info", "fetch_repository_info")
-        workflow.add_edge("fetch_repository_info", "fetch_repository_guidelines")
-        workflow.add_edge("fetch_repository_guidelines", "fetch_pr_diff")
-        workflow.add_edge("fetch_pr_diff", "fetch_complete_files")
-        workflow.add_edge("fetch_complete_files", "fetch_repository_docs")
-        workflow.add_edge("fetch_repository_docs", "analyze_pr_description")
-        workflow.add_edge("analyze_pr_description", "fetch_linked_issues")
-        workflow.add_edge("fetch_linked_issues", "analyze_diff")
-        workflow.add_edge("analyze_diff", "generate_comments")
-        workflow.add_edge("generate_comments", "add_comments")
-        workflow.add_edge("add_comments", END)
+        for stage in stages:
+            for name, node in stage:
+                workflow.add_node(name, node)
+        
+        # The first stage fans out from the start of the workflow
+        for name, _ in stages[0]:
+            workflow.add_edge(START, name)
+        
+        # Each later stage waits for all nodes of the previous stage to finish,
+        # and the workflow ends early once a node records an error
+        for index, (previous_stage, stage) in enumerate(zip(stages, stages[1:]), start=1):
+            join = f"join_stage_{index}"
+            next_steps = [name for name, _ in stage]
+            workflow.add_node(join, self._join_stage)
+            workflow.add_edge([name for name, _ in previous_stage], join)
+            workflow.add_conditional_edges(join, self._stop_on_errors(next_steps), next_steps + [END])
+        
+        workflow.add_edge([name for name, _ in stages[-1]], END)
         
         # Compile the workflow
         return workflow.compile()
@@ -107,13 +372,73 @@ class PRReviewAgent:
             errors=[]
         )
         
+        if self.eager:
+            return await self._run_eager(initial_state)
+        
         # Run the workflow
         config = RunnableConfig(recursion_limit=25)  # Set a recursion limit to prevent infinite loops
         result = await self.workflow.ainvoke(initial_state, config)
         
         return result
     
-    async def fetch_pr_info(self, state: PRReviewState) -> PRReviewState:
+    async def _run_eager(self, state: PRReviewState) -> Dict[str, Any]:
+        """
+        Run the workflow stages in order without going through LangGraph.
+        
+        Args:
+            state: The initial state
+            
+        Returns:
+            The final state as a dict of fields, like the compiled workflow returns
+        """
+        for stage in self._workflow_stages():
+            names = [name for name, _ in stage]
+            logger.debug("Running workflow steps: %s", names)
+            
+            # The nodes of a stage write disjoint fields, so their updates can be merged
+            update = {}
+            for node_update in await asyncio.gather(*(node(state) for _, node in stage)):
+                update.update(node_update)
+            state = state.model_copy(update=update)
+            
+            if state.errors:
+                logger.debug("Stopping the review after %s: %s", names, state.errors)
+                break
+        
+        return dict(state)
+    
+    async def fetch_pr(self, state: PRReviewState) -> Dict[str, Any]:
+        """
+        Fetch PR information and the PR diff concurrently.
+        
+        The diff only needs the PR number and repository, so both gh calls
+        are started together instead of waiting on each other.
+        
+        Args:
+            state: The current state
+            
+        Returns:
+            State update with PR information and file changes, or with an error
+            if the PR could not be fetched
+        """
+        try:
+            pr_update, diff_update = await asyncio.gather(
+                self.fetch_pr_info(state),
+                self.fetch_pr_diff(state)
+            )
+        except Exception as e:
+            # Nothing can be reviewed without the PR, the error ends the workflow
+            error = {"step": "fetch_pr", "message": f"Failed to fetch PR #{state.pr_number}: {str(e)}"}
+            return {"errors": state.errors + [error]}
+        
+        update = dict(diff_update)
+        file_changes = diff_update.get("file_changes", [])
+        # model_copy is shallow and skips validation, so the trusted FileChange
+        # list is shared rather than copied and re-validated
+        update["pr_info"] = pr_update["pr_info"].model_copy(update={"changes": file_changes})
+        return update
+    
+    async def fetch_pr_info(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch information about a pull request.
         
@@ -121,25 +446,24 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with PR information
+            State update with PR information
         """
         logger.info(f"Fetching PR info for PR #{state.pr_number}")
         
         try:
-            pull_request = self.github_service.get_pull_request(
+            pull_request = await self._to_thread(
+                self.github_service.get_pull_request,
                 pr_number=state.pr_number,
                 repository=state.repository
             )
             
-            # Create a new state with the updated pr_info
-            state_dict = state.model_dump()
-            state_dict["pr_info"] = pull_request
-            return PRReviewState(**state_dict)
+            # Only return the updated field, LangGraph merges it into the state
+            return {"pr_info": pull_request}
         except Exception as e:
             logger.error(f"Error fetching PR info: {str(e)}")
             raise
     
-    async def fetch_repository_info(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_repository_info(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch information about the repository.
         
@@ -147,7 +471,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with repository information
+            State update with repository information
         """
         # Use repository from state directly if pr_info is None
         repository = state.repository
@@ -157,20 +481,19 @@ class PRReviewAgent:
         logger.info(f"Fetching repository info for {repository}")
         
         try:
-            repository_info = self.github_service.get_repository_info(
+            repository_info = await self._to_thread(
+                self.github_service.get_repository_info,
                 repository=repository
             )
             
-            # Create a new state with the updated repository_info
-            state_dict = state.model_dump()
-            state_dict["repository_info"] = repository_info
-            return PRReviewState(**state_dict)
+            # Only return the updated field, LangGraph merges it into the state
+            return {"repository_info": repository_info}
         except Exception as e:
             logger.error(f"Error fetching repository info: {str(e)}")
             # Continue with workflow even if repository info fetch fails
-            return state
+            return {}
     
-    async def fetch_repository_guidelines(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_repository_guidelines(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch repository guidelines.
         
@@ -178,7 +501,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with repository guidelines
+            State update with repository guidelines
         """
         # Use repository from state directly if pr_info is None
         repository = state.repository
@@ -187,21 +510,25 @@ class PRReviewAgent:
             
         logger.info(f"Fetching repository guidelines for {repository}")
         
+        # The guidelines are read from the default branch, HEAD while the repository info isn't known yet
+        default_branch = state.repository_info.default_branch if state.repository_info else "HEAD"
+        
         try:
-            guidelines = self.github_service.get_repository_guidelines(
-                repository=repository
+            guidelines = await self._cached_at_commit(
+                "guidelines",
+                repository,
+                default_branch,
+                functools.partial(self.github_service.get_repository_guidelines, repository=repository)
             )
             
-            # Create a new state with the updated guidelines
-            state_dict = state.model_dump()
-            state_dict["review_guidelines"] = guidelines
-            return PRReviewState(**state_dict)
+            # Only return the updated field, LangGraph merges it into the state
+            return {"review_guidelines": guidelines}
         except Exception as e:
             logger.error(f"Error fetching repository guidelines: {str(e)}")
             # Continue with workflow even if guidelines fetch fails
-            return state
+            return {}
     
-    async def fetch_pr_diff(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_pr_diff(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch the diff for a pull request.
         
@@ -209,7 +536,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with PR diff
+            State update with PR diff
         """
         pr_number = state.pr_number
         repository = state.repository
@@ -221,35 +548,27 @@ class PRReviewAgent:
         logger.info(f"Fetching PR diff for PR #{pr_number}")
         
         try:
-            file_changes = self.github_service.get_pr_diff(
+            file_changes = await self._to_thread(
+                self.github_service.get_pr_diff,
                 pr_number=pr_number,
                 repository=repository
             )
             
             # Log the files being analyzed from the diff
             if file_changes:
-                file_paths = []
-                for change in file_changes:
-                    # FileChange objects have a 'filename' attribute, not 'file_path'
-                    if hasattr(change, 'filename'):
-                        file_paths.append(change.filename)
-                    elif isinstance(change, dict) and 'filename' in change:
-                        file_paths.append(change['filename'])
-                
-                logger.info(f"Found {len(file_paths)} changed files in the PR diff")
-                for file_path in file_paths:
-                    logger.info(f"Analyzing changes in file: {file_path}")
-            
-            # Create a new state with the updated file_changes
-            state_dict = state.model_dump()
-            state_dict["file_changes"] = file_changes
-            return PRReviewState(**state_dict)
+                logger.info("Found %s changed files in the PR diff", len(file_changes))
+                if logger.isEnabledFor(logging.DEBUG):
+                    for change in file_changes:
+                        logger.debug("Analyzing changes in file: %s", change.filename)
+            
+            # Only return the updated field, LangGraph merges it into the state
+            return {"file_changes": file_changes}
         except Exception as e:
             logger.error(f"Error fetching PR diff: {str(e)}")
             # Continue with workflow even if diff fetch fails
-            return state
+            return {}
             
-    async def fetch_complete_files(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_complete_files(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch complete file content for files in the PR.
         
@@ -257,7 +576,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with complete file content
+            State update with complete file content
         """
         pr_number = state.pr_number
         repository = state.repository
@@ -274,40 +593,28 @@ class PRReviewAgent:
             if state.pr_info:
                 base_branch = state.pr_info.base_branch
                 
-            # Get file paths from file_changes
-            file_paths = []
-            for change in state.file_changes:
-                # FileChange objects have a 'filename' attribute, not 'file_path'
-                if hasattr(change, 'filename'):
-                    file_paths.append(change.filename)
-                elif isinstance(change, dict) and 'filename' in change:
-                    file_paths.append(change['filename'])
+            # The state schema validates file_changes into FileChange objects
+            file_paths = [change.filename for change in state.file_changes]
             
             # Log the files being fetched
             logger.info(f"Fetching complete content for {len(file_paths)} files")
             
-            # Fetch complete files
-            complete_files = {}
-            for file_path in file_paths:
-                logger.info(f"Fetching complete file: {file_path}")
-                content = self.github_service.get_complete_file(
-                    repository=repository,
-                    file_path=file_path,
-                    ref="HEAD"  # Get the latest version from the PR
-                )
-                if content:
-                    complete_files[file_path] = content
+            # Fetch all complete files in batched requests
+            complete_files = await self._to_thread(
+                self.github_service.get_complete_files_batch,
+                repository=repository,
+                file_paths=file_paths,
+                ref="HEAD"  # Get the latest version from the PR
+            )
             
-            # Create a new state with the updated complete_files
-            state_dict = state.model_dump()
-            state_dict["complete_files"] = complete_files
-            return PRReviewState(**state_dict)
+            # Only return the updated field, LangGraph merges it into the state
+            return {"complete_files": complete_files}
         except Exception as e:
             logger.error(f"Error fetching complete files: {str(e)}")
             # Continue with workflow even if complete files fetch fails
-            return state
+            return {}
     
-    async def fetch_repository_docs(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_repository_docs(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch repository documentation by scanning the entire repository for markdown files.
         
@@ -315,7 +622,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with repository documentation
+            State update with repository documentation
         """
         # Use repository from state directly if pr_info is None
         repository = state.repository
@@ -331,28 +638,59 @@ class PRReviewAgent:
         
         try:
             # Get all markdown files from the repository
-            docs = self.github_service.get_repository_docs(
-                repository=repository,
-                ref=base_branch
+            docs = await self._cached_at_commit(
+                "docs",
+                repository,
+                base_branch or "HEAD",
+                functools.partial(self.github_service.get_repository_docs, repository=repository, ref=base_branch)
             )
             
             # Log the markdown files found
             logger.info(f"Found {len(docs)} markdown files in the repository")
             for doc in docs:
-                logger.info(f"Adding context from markdown file: {doc.path}")
-            
-            # Create a new state with the updated repository_context
-            state_dict = state.model_dump()
-            repository_context = state_dict.get("repository_context", {})
-            repository_context["docs"] = docs
-            state_dict["repository_context"] = repository_context
-            return PRReviewState(**state_dict)
+                logger.debug("Adding context from markdown file: %s", doc.path)
+            
+            # Only return the updated field, LangGraph merges it into the state
+            return {"repository_context": {**state.repository_context, "docs": docs}}
         except Exception as e:
             logger.error(f"Error fetching repository docs: {str(e)}")
             # Continue with workflow even if docs fetch fails
-            return state
+            return {}
+    
+    async def _cached_at_commit(self, kind: str, repository: str, ref: str, fetch: Callable[[], T]) -> T:
+        """
+        Fetch repository content, reusing the previous result while the reference hasn't moved.
+        
+        Looking up the commit of the reference is a single cheap request, while
+        fetching docs or guidelines takes a search and a request per file.
+        Empty results are not cached, as the fetches return them on errors.
+        
+        Args:
+            kind: Name of the content, part of the cache key
+            repository: The repository in the format 'owner/repo'
+            ref: The git reference the content is read from
+            fetch: Blocking function fetching the content
+            
+        Returns:
+            The fetched or cached content
+        """
+        try:
+            sha = await self._to_thread(self.github_service.get_commit_sha, repository, ref)
+        except Exception as e:
+            logger.warning("Could not resolve %s in %s, fetching %s without cache: %s", ref, repository, kind, e)
+            return await self._to_thread(fetch)
+        
+        cached = self._repository_cache.get((kind, repository))
+        if cached and cached[0] == sha:
+            logger.info("Using cached %s for %s at %s", kind, repository, sha)
+            return cached[1]
+        
+        value = await self._to_thread(fetch)
+        if value:
+            self._repository_cache[(kind, repository)] = (sha, value)
+        return value
     
-    async def analyze_pr_description(self, state: PRReviewState) -> PRReviewState:
+    async def analyze_pr_description(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Analyze the PR description to extract key information.
         
@@ -360,7 +698,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with PR description analysis
+            State update with PR description analysis
         """
         logger.info(f"Analyzing PR description for PR #{state.pr_number}")
         
@@ -368,22 +706,21 @@ class PRReviewAgent:
             # Skip if pr_info is None or has no description
             if not state.pr_info or not state.pr_info.description:
                 # Skip analysis if there's no description
-                return state
+                return {}
             
-            analysis = self.llm_service.analyze_pr_description(
+            analysis = await self._to_thread(
+                self.llm_service.analyze_pr_description,
                 pr_description=state.pr_info.description
             )
             
-            # Create a new state with the updated pr_description_analysis
-            state_dict = state.model_dump()
-            state_dict["pr_description_analysis"] = analysis
-            return PRReviewState(**state_dict)
+            # Only return the updated field, LangGraph merges it into the state
+            return {"pr_description_analysis": analysis}
         except Exception as e:
             logger.error(f"Error analyzing PR description: {str(e)}")
             # Continue with workflow even if description analysis fails
-            return state
+            return {}
     
-    async def fetch_linked_issues(self, state: PRReviewState) -> PRReviewState:
+    async def fetch_linked_issues(self, state: PRReviewState) -> Dict[str, Any]:
         """
         Fetch issues linked to the PR.
         
@@ -391,7 +728,7 @@ class PRReviewAgent:
             state: The current state
             
         Returns:
-            Updated state with linked issues
+            State update with linked issues
         """
         logger.info(f"Fetching linked issues for PR #{state.pr_number}")
         
@@ -399,257 +736,708 @@ class PRReviewAgent:
             # Skip if pr_info is None or has no description
             if not state.pr_info or not state.pr_info.description:
                 # Skip if there's no description
-                return state
+                return {}
+            
+            # Re-reviews after a push usually keep the description, and with it the linked issues
+            repository = state.pr_info.repository or state.repository
+            cache_key = (repository, hashlib.sha256(state.pr_info.description.encode()).hexdigest())
+            linked_issues = self._linked_issues_cache.get(cache_key)
+            if linked_issues is not None:
+                logger.info("Using cached linked issues for PR #%s", state.pr_number)
+                return {"linked_issues": linked_issues}
             
-            linked_issues = self.github_service.get_linked_issues(
+            linked_issues = await self._to_thread(
+                self.github_service.get_linked_issues,
                 pr_description=state.pr_info.description
             )
             
-            # Create a new state with the updated linked_issues
-            state_dict = state.model_dump()
-            state_dict["linked_issues"] = linked_issues
-            return PRReviewState(**state_dict)
+            if linked_issues:
+                if len(self._linked_issues_cache) >= LINKED_ISSUES_CACHE_SIZE:
+                    # Evict the oldest description
+                    del self._linked_issues_cache[next(iter(self._linked_issues_cache))]
+                self._linked_issues_cache[cache_key] = linked_issues
+            
+            # Only return the updated field, LangGraph merges it into the state
+            return {"linked_issues": linked_issues}
         except Exception as e:
             logger.error(f"Error fetching linked issues: {str(e)}")
             # Continue with workflow even if linked issues fetch fails
-            return state
+            return {}
     
-    async def analyze_diff(self, state: PRReviewState) -> PRReviewState:
+    def _should_analyze(self, file_change: FileChange) -> bool:
         """
-        Analyze the diff for a pull request.
+        Check if a file change should be sent to the LLM for analysis.
         
         Args:
-            state: The current state
+            file_change: The file change to check
             
         Returns:
-            Updated state with detected issues
+            True if the file change should be analyzed, False otherwise
         """
-        logger.info(f"Analyzing diff for PR #{state.pr_number}")
+        if not file_change.patch:
+            return False
         
-        issues = []
+        if any(pattern.search(file_change.filename) for pattern in SKIP_ANALYSIS_PATTERNS):
+            logger.info("Skipping analysis of non-reviewable file: %s", file_change.filename)
+            return False
         
-        # Skip if pr_info is None or has no changes
-        if not state.pr_info or not state.pr_info.changes:
-            # Create a new state with empty detected_issues
-            state_dict = state.model_dump()
-            state_dict["detected_issues"] = issues
-            return PRReviewState(**state_dict)
-        
-        # Get repository docs if available
-        docs = state.repository_context.get("docs", [])
-        logger.info(f"Using {len(docs)} markdown files for context")
-        
-        # Process each file change
-        for file_change in state.pr_info.changes:
-            # Skip files without patches
-            if not file_change.patch:
+        if len(file_change.patch) > MAX_PATCH_BYTES:
+            logger.info("Skipping analysis of oversized patch: %s", file_change.filename)
+            return False
+        
+        if _is_whitespace_only(file_change.patch):
+            logger.info("Skipping analysis of whitespace-only change: %s", file_change.filename)
+            return False
+        
+        return True
+    
+    def _split_large_patches(self, file_changes: List[FileChange]) -> List[FileChange]:
+        """
+        Split file changes with large patches into one file change per chunk.
+        
+        The chunks are analyzed like separate files, so they run concurrently
+        and their issues are merged back in file order.
+        
+        Args:
+            file_changes: The file changes to analyze
+            
+        Returns:
+            File changes with patches of at most MAX_HUNK_BYTES where possible
+        """
+        split_changes = []
+        for file_change in file_changes:
+            chunks = _split_hunks(file_change.patch)
+            if len(chunks) == 1:
+                split_changes.append(file_change)
+                continue
+            
+            logger.info("Splitting patch of %s into %d chunks", file_change.filename, len(chunks))
+            split_changes.extend(file_change.model_copy(update={"patch": chunk}) for chunk in chunks)
+        
+        return split_changes
+    
+    def _group_identical_patches(self, file_changes: List[FileChange]) -> List[List[FileChange]]:
+        """
+        Group file changes whose patches contain identical hunks.
+        
+        Bulk renames, license header updates and codemods touch many files with
+        the same hunks, which only need to be analyzed once. The file header
+        before the first hunk names the file, so it is ignored when comparing.
+        
+        Args:
+            file_changes: The file changes to analyze
+            
+        Returns:
+            Groups of file changes in order of first occurrence
+        """
+        groups: Dict[bytes, List[FileChange]] = {}
+        for file_change in file_changes:
+            first_hunk = HUNK_START_PATTERN.search(file_change.patch)
+            hunks = file_change.patch[first_hunk.start():] if first_hunk else file_change.patch
+            key = hashlib.blake2b(hunks.encode(), digest_size=16).digest()
+            groups.setdefault(key, []).append(file_change)
+        
+        return list(groups.values())
+    
+    def _batch_file_groups(
+        self,
+        file_groups: List[List[FileChange]],
+        complete_files: Dict[str, str]
+    ) -> List[List[List[FileChange]]]:
+        """
+        Pack consecutive groups of small file changes into batches analyzed in one LLM request.
+        
+        Only groups whose complete file is available are batched, the others
+        use the plain diff analysis. Groups larger than llm_batch_bytes get a
+        batch of their own, and chunks of a split patch go to different batches
+        because the LLM reports issues by file path.
+        
+        Args:
+            file_groups: Groups of file changes with identical hunks
+            complete_files: Full content of the changed files by filename
+            
+        Returns:
+            Batches of file groups, in order of the file groups
+        """
+        if self.llm_batch_bytes <= 0:
+            return [[file_group] for file_group in file_groups]
+        
+        batches: List[List[List[FileChange]]] = []
+        batch: List[List[FileChange]] = []
+        batch_bytes = 0
+        for file_group in file_groups:
+            representative = file_group[0]
+            full_content = complete_files.get(representative.filename)
+            if not full_content:
+                if batch:
+                    batches.append(batch)
+                    batch, batch_bytes = [], 0
+                batches.append([file_group])
                 continue
             
+            group_bytes = len(representative.patch) + min(len(full_content), FULL_CONTENT_PROMPT_BYTES)
+            in_batch = any(other[0].filename == representative.filename for other in batch)
+            if batch and (in_batch or batch_bytes + group_bytes > self.llm_batch_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(file_group)
+            batch_bytes += group_bytes
+        
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    def _analyze_batch(
+        self,
+        batch: List[List[FileChange]],
+        complete_files: Dict[str, str],
+        guidelines: Optional[GuidelinesInfo],
+        doc_index: List[Tuple[DocumentInfo, str, str, int]]
+    ) -> List[PRIssue]:
+        """
+        Analyze a batch of file groups in one LLM request.
+        
+        Args:
+            batch: Groups of file changes with identical hunks
+            complete_files: Full content of the changed files by filename
+            guidelines: Repository guidelines (optional)
+            doc_index: Repository documentation index from _build_doc_index
+            
+        Returns:
+            List of issues found in all files of the batch, in file order
+        """
+        if len(batch) == 1:
+            return self._analyze_file_group(batch[0], complete_files, guidelines, doc_index)
+        
+        representatives = [file_group[0] for file_group in batch]
+        
+        # Start with the most relevant docs of the first files
+        relevant_docs: List[DocumentInfo] = []
+        for file_change in representatives:
+            for doc in self._prioritize_relevant_docs(file_change.filename, doc_index):
+                if doc not in relevant_docs:
+                    relevant_docs.append(doc)
+        
+        issues_by_file = self.llm_service.analyze_diffs_with_context_batch(
+            files=[
+                (file_change.filename, file_change.patch, complete_files.get(file_change.filename))
+                for file_change in representatives
+            ],
+            guidelines=guidelines,
+            repository_docs=relevant_docs
+        )
+        
+        issues = []
+        for file_group in batch:
+            file_issues = self._issues_from_llm(file_group[0].filename, issues_by_file.get(file_group[0].filename, []))
+            issues.extend(self._copy_to_duplicates(file_group, file_issues))
+        
+        return issues
+    
+    def _analyze_file_group(
+        self,
+        file_group: List[FileChange],
+        complete_files: Dict[str, str],
+        guidelines: Optional[GuidelinesInfo],
+        doc_index: List[Tuple[DocumentInfo, str, str, int]]
+    ) -> List[PRIssue]:
+        """
+        Analyze the first file of a group of identical patches and copy its issues to the others.
+        
+        Args:
+            file_group: File changes with identical hunks
+            complete_files: Full content of the changed files by filename
+            guidelines: Repository guidelines (optional)
+            doc_index: Repository documentation index from _build_doc_index
+            
+        Returns:
+            List of issues found in all files of the group
+        """
+        representative = file_group[0]
+        issues = self._analyze_file_change(
+            representative,
+            complete_files.get(representative.filename),
+            guidelines,
+            doc_index
+        )
+        
+        return self._copy_to_duplicates(file_group, issues)
+    
+    def _copy_to_duplicates(self, file_group: List[FileChange], issues: List[PRIssue]) -> List[PRIssue]:
+        """
+        Copy the issues found in the first file of a group to the other files.
+        
+        Args:
+            file_group: File changes with identical hunks
+            issues: Issues found in the first file of the group
+            
+        Returns:
+            List of issues found in all files of the group
+        """
+        representative, *duplicates = file_group
+        if duplicates:
+            logger.info("Reusing analysis of %s for %d identical patches", representative.filename, len(duplicates))
+        
+        copied_issues = [
+            issue.model_copy(update={"file_path": duplicate.filename})
+            for duplicate in duplicates
+            for issue in issues
+        ]
+        return issues + copied_issues
+    
+    def _analyze_file_change(
+        self,
+        file_change: FileChange,
+        full_content: Optional[str],
+        guidelines: Optional[GuidelinesInfo],
+        doc_index: List[Tuple[DocumentInfo, str, str, int]]
+    ) -> List[PRIssue]:
+        """
+        Analyze the diff of a single file and convert the LLM output to issues.
+        
+        Args:
+            file_change: The file change to analyze
+            full_content: Full content of the file (optional)
+            guidelines: Repository guidelines (optional)
+            doc_index: Repository documentation index from _build_doc_index
+            
+        Returns:
+            List of issues found in the file
+        """
+        # Prioritize markdown files that are relevant to this file
+        # This helps ensure the LLM has the most relevant context
+        relevant_docs = self._prioritize_relevant_docs(file_change.filename, doc_index)
+        
+        # Analyze the diff with context
+        if full_content:
+            file_issues = self.llm_service.analyze_diff_with_context(
+                file_path=file_change.filename,
+                diff_content=file_change.patch,
+                full_file_content=full_content,
+                guidelines=guidelines,
+                repository_docs=relevant_docs
+            )
+        else:
+            # Fallback to basic diff analysis if full content is not available
+            file_issues = self.llm_service.analyze_diff(
+                file_path=file_change.filename,
+                diff_content=file_change.patch
+            )
+        
+        return self._issues_from_llm(file_change.filename, file_issues)
+    
+    def _issues_from_llm(self, file_path: str, file_issues: List[Dict[str, Any]]) -> List[PRIssue]:
+        """
+        Convert the issues returned by the LLM for a file to PRIssue objects.
+        
+        Args:
+            file_path: Path of the file the issues were found in
+            file_issues: Issues as returned by the LLM service
+            
+        Returns:
+            List of issues found in the file
+        """
+        issues = []
+        
+        # Log the issues for debugging
+        logger.debug("LLM returned issues for %s: %s", file_path, file_issues)
+        
+        # Convert to PRIssue objects
+        for issue in file_issues:
             try:
-                # Get the full file content if available
-                full_content = state.complete_files.get(file_change.filename)
-                
-                # Get repository guidelines if available
-                guidelines = state.review_guidelines
+                # Safely get the type field with a default value
+                if not isinstance(issue, dict):
+                    logger.warning(f"Expected dict, got {type(issue)}: {issue}")
+                    continue
+                    
+                # Map the type and severity onto the shared constant strings, defaulting
+                # to a suggestion when the type is missing or not an allowed value
+                issue_type = issue.get("type")
+                issue_type = ISSUE_TYPES.get(issue_type, "suggestion") if isinstance(issue_type, str) else "suggestion"
+                severity = issue.get("severity", "low")
+                severity = SEVERITIES.get(severity, severity)
                 
-                # Prioritize markdown files that are relevant to this file
-                # This helps ensure the LLM has the most relevant context
-                relevant_docs = self._prioritize_relevant_docs(file_change.filename, docs)
-                
-                # Analyze the diff with context
-                if full_content:
-                    file_issues = self.llm_service.analyze_diff_with_context(
-                        file_path=file_change.filename,
-                        diff_content=file_change.patch,
-                        full_file_content=full_content,
-                        guidelines=guidelines,
-                        repository_docs=relevant_docs
-                    )
-                else:
-                    # Fallback to basic diff analysis if full content is not available
-                    file_issues = self.llm_service.analyze_diff(
-                        file_path=file_change.filename,
-                        diff_content=file_change.patch
-                    )
-                
-                # Log the issues for debugging
-                logger.debug(f"LLM returned issues for {file_change.filename}: {file_issues}")
+                # Create the PRIssue object with safe access to all fields
+                pr_issue = PRIssue(
+                    file_path=file_path,
+                    line_number=issue.get("line", issue.get("line_number", 1)),
+                    description=issue.get("description", ""),
+                    suggestion=issue.get("suggestion", ""),
+                    severity=severity,
+                    guideline_violation=issue.get("guideline_violation"),
+                    issue_type=issue_type,
+                    confidence=issue.get("confidence", 1.0)
+                )
                 
-                # Convert to PRIssue objects
-                for issue in file_issues:
-                    try:
-                        # Safely get the type field with a default value
-                        if not isinstance(issue, dict):
-                            logger.warning(f"Expected dict, got {type(issue)}: {issue}")
-                            continue
-                            
-                        # Determine issue type based on available information
-                        issue_type = issue.get("type")
-                        if not issue_type:
-                            # Default to suggestion if type is empty or missing
-                            issue_type = "suggestion"
-                        
-                        # Make sure issue_type is one of the allowed values
-                        allowed_types = ["question", "suggestion", "nitpick", "error", "praise"]
-                        if issue_type not in allowed_types:
-                            issue_type = "suggestion"  # Default fallback
-                        
-                        # Create the PRIssue object with safe access to all fields
-                        pr_issue = PRIssue(
-                            file_path=file_change.filename,
-                            line_number=issue.get("line", issue.get("line_number", 1)),
-                            description=issue.get("description", ""),
-                            suggestion=issue.get("suggestion", ""),
-                            severity=issue.get("severity", "low"),
-                            guideline_violation=issue.get("guideline_violation"),
-                            issue_type=issue_type,
-                            confidence=issue.get("confidence", 1.0)
-                        )
-                        
-                        issues.append(pr_issue)
-                    except Exception as e:
-                        logger.error(f"Error processing issue: {str(e)}")
+                issues.append(pr_issue)
             except Exception as e:
-                logger.error(f"Error analyzing diff for {file_change.filename}: {str(e)}")
+                logger.error(f"Error processing issue: {str(e)}")
         
-        # Create a new state with the updated detected_issues
-        state_dict = state.model_dump()
-        state_dict["detected_issues"] = issues
-        return PRReviewState(**state_dict)
+        return issues
         
-    def _prioritize_relevant_docs(self, file_path: str, docs: List[DocumentInfo]) -> List[DocumentInfo]:
+    def _build_doc_index(self, docs: List[DocumentInfo]) -> List[Tuple[DocumentInfo, str, str, int]]:
         """
-        Prioritize markdown files that are relevant to the file being changed.
+        Precompute the parts of the doc relevance score that don't depend on the file.
+        
+        The lowercased path and content are cached on each DocumentInfo, so they
+        are computed once no matter how many files or chunks are scored.
         
         Args:
-            file_path: Path to the file being changed
             docs: List of all markdown files in the repository
             
         Returns:
-            List of markdown files prioritized by relevance
+            List of (doc, lowercased path, lowercased content, doc type score) tuples
+        """
+        doc_index = []
+        for doc in docs:
+            if not hasattr(doc, 'path') or not hasattr(doc, 'content'):
+                continue
+            
+            doc_path = doc.path_lower
+            
+            # Prioritize certain types of docs
+            type_score = 0
+            if hasattr(doc, 'type'):
+                doc_type = doc.type.lower() if doc.type else ""
+                if "readme" in doc_type or "readme" in doc_path:
+                    type_score = 8
+                elif "architecture" in doc_type or "design" in doc_path:
+                    type_score = 7
+                elif "contributing" in doc_type:
+                    type_score = 6
+            
+            doc_index.append((doc, doc_path, doc.content_lower, type_score))
+        
+        return doc_index
+    
+    def _prioritize_relevant_docs(
+        self,
+        file_path: str,
+        doc_index: List[Tuple[DocumentInfo, str, str, int]]
+    ) -> List[DocumentInfo]:
+        """
+        Select the markdown files that are most relevant to the file being changed.
+        
+        Only the MAX_CONTEXT_DOCS best docs end up in the analysis prompt, so
+        the rest are not passed on to be scored again by the LLM service.
+        
+        Args:
+            file_path: Path to the file being changed
+            doc_index: Repository documentation index from _build_doc_index
+            
+        Returns:
+            Up to MAX_CONTEXT_DOCS markdown files, most relevant first
         """
-        if not docs:
+        if not doc_index:
             return []
             
         # Extract file extension and path components for matching
-        file_ext = file_path.split('.')[-1] if '.' in file_path else ''
-        path_components = file_path.split('/')
+        file_path_lower = file_path.lower()
+        file_ext = file_path_lower.split('.')[-1] if '.' in file_path_lower else ''
+        path_components = file_path_lower.split('/')
         
         # Score each doc based on relevance to the current file
         scored_docs = []
-        for doc in docs:
-            if not hasattr(doc, 'path') or not hasattr(doc, 'content'):
-                continue
-                
-            score = 0
-            doc_path = doc.path.lower()
-            doc_content = doc.content.lower()
+        for doc, doc_path, doc_content, type_score in doc_index:
+            score = type_score
             
             # Check if doc mentions this file path or components
-            if file_path.lower() in doc_content:
+            if file_path_lower in doc_content:
                 score += 10
             
             # Check if doc mentions the file extension
-            if file_ext and file_ext.lower() in doc_content:
+            if file_ext and file_ext in doc_content:
                 score += 5
             
             # Check if doc is in the same directory
             for component in path_components:
-                if component.lower() in doc_path:
+                if component in doc_path:
                     score += 3
             
-            # Prioritize certain types of docs
-            if hasattr(doc, 'type'):
-                doc_type = doc.type.lower() if doc.type else ""
-                if "readme" in doc_type or "readme" in doc_path:
-                    score += 8
-                elif "architecture" in doc_type or "design" in doc_path:
-                    score += 7
-                elif "contributing" in doc_type:
-                    score += 6
-            
             scored_docs.append((doc, score))
         
-        # Sort docs by relevance score (highest first)
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return all docs, but prioritized by relevance
-        return [doc for doc, _ in scored_docs]
+        # Take the highest scoring docs, keeping the doc order for equal scores
+        top_docs = heapq.nlargest(MAX_CONTEXT_DOCS, scored_docs, key=lambda x: x[1])
+        return [doc for doc, _ in top_docs]
     
-    async def generate_comments(self, state: PRReviewState) -> PRReviewState:
+    def _issue_to_comment(self, issue: PRIssue) -> PRComment:
         """
-        Generate comments from the identified issues.
+        Format an issue as an inline PR comment.
         
         Args:
-            state: The current state
+            issue: The issue to format
             
         Returns:
-            Updated state with generated comments
+            The comment for the issue
+        """
+        # Format the comment content. It must not change, as the content is
+        # part of the key that detects comments posted by earlier reviews.
+        parts = [f"**{issue.severity.upper()}**: {issue.description}\n\n"]
+        
+        if issue.suggestion:
+            parts.append(f"**Suggestion**: {issue.suggestion}")
+        
+        if issue.guideline_violation:
+            parts.append(f"\n\n**Guideline Violation**: {issue.guideline_violation}")
+        
+        return PRComment(
+            file_path=issue.file_path,
+            line_number=issue.line_number,
+            content="".join(parts),
+            comment_type="inline"
+        )
+    
+    @staticmethod
+    def _comment_key(comment: PRComment) -> tuple:
+        """Key used to detect comments that were already posted."""
+        return (comment.file_path, comment.line_number, comment.content)
+    
+    async def _post_review(
+        self,
+        pr_number: int,
+        comments: List[PRComment],
+        repository: str,
+        file_changes: Optional[List[FileChange]] = None
+    ) -> Tuple[List[PRComment], List[PRComment]]:
         """
-        logger.info(f"Generating comments for PR #{state.pr_number}")
+        Post the line comments among the given comments as a single review.
         
-        comments = []
+        A failed review is not retried, as it usually means one comment is not
+        on a line of the diff. Its comments are left to be posted one by one.
+        Comments on lines outside the patches of file_changes can't be line
+        comments, they are left to be posted as regular comments straight away
+        instead of failing the review.
         
-        for issue in state.detected_issues:
-            # Format the comment content
-            content = f"**{issue.severity.upper()}**: {issue.description}\n\n"
+        Args:
+            pr_number: The PR number
+            comments: The comments to post
+            repository: The repository in the format 'owner/repo'
+            file_changes: The PR's changed files, to check comment lines against (optional)
             
-            if issue.suggestion:
-                content += f"**Suggestion**: {issue.suggestion}"
+        Returns:
+            The comments added in the review and the comments still to be posted
+        """
+        diff_lines = {
+            file_change.filename: _commentable_lines(file_change.patch)
+            for file_change in file_changes or []
+            if file_change.patch
+        }
+        line_comments = []
+        remaining = []
+        for comment in comments:
+            if comment.file_path and comment.line_number and comment.comment_type == "inline":
+                lines = diff_lines.get(comment.file_path)
+                if lines is None or comment.line_number in lines:
+                    line_comments.append(comment)
+                    continue
+                logger.debug("Line %s of %s is not in the diff, adding a regular comment",
+                             comment.line_number, comment.file_path)
+                comment = comment.model_copy(update={"comment_type": "body"})
+            remaining.append(comment)
+        if len(line_comments) < 2:
+            return [], line_comments + remaining
+        
+        try:
+            added_comments = await self._to_thread(
+                self.github_service.create_review,
+                pr_number=pr_number,
+                comments=line_comments,
+                repository=repository
+            )
+        except Exception as e:
+            logger.warning("Failed to add %s comments as a review, adding them one by one: %s", len(line_comments), e)
+            return [], line_comments + remaining
+        
+        logger.info("Added %d comments as a review", len(added_comments))
+        return added_comments, remaining
+    
+    async def _post_comment(self, pr_number: int, comment: PRComment, repository: str) -> PRComment:
+        """
+        Post a comment, retrying transient failures with exponential backoff.
+        
+        Permanent failures, such as a missing PR or a rejected comment, are
+        raised straight away.
+        
+        Args:
+            pr_number: The PR number
+            comment: The comment to post
+            repository: The repository in the format 'owner/repo'
             
-            if issue.guideline_violation:
-                content += f"\n\n**Guideline Violation**: {issue.guideline_violation}"
+        Returns:
+            The added comment
+        """
+        for attempt in range(COMMENT_POST_ATTEMPTS):
+            try:
+                return await self._to_thread(
+                    self.github_service.add_pr_comment,
+                    pr_number=pr_number,
+                    comment=comment,
+                    repository=repository
+                )
+            except RETRYABLE_POST_ERRORS as e:
+                if attempt == COMMENT_POST_ATTEMPTS - 1 or not _is_transient(e):
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning(
+                    "Failed to add comment to %s:%s, retrying in %.1fs: %s",
+                    comment.file_path, comment.line_number, delay, e
+                )
+                await asyncio.sleep(delay)
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Get the time to wait before retrying a failed GitHub request.
+        
+        GitHub's Retry-After and rate limit reset headers are honored when the
+        error carries a response, otherwise full jitter backoff is used.
+        
+        Args:
+            error: The error of the failed attempt
+            attempt: The number of the failed attempt, starting at 0
             
-            # Create a comment
-            comment = PRComment(
-                file_path=issue.file_path,
-                line_number=issue.line_number,
-                content=content,
-                comment_type="inline"
-            )
+        Returns:
+            Seconds to wait
+        """
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), RATE_LIMIT_MAX_WAIT)
             
-            comments.append(comment)
+            reset = response.headers.get("X-RateLimit-Reset")
+            if response.headers.get("X-RateLimit-Remaining") == "0" and reset and reset.isdigit():
+                return min(max(float(reset) - time.time(), 0.0), RATE_LIMIT_MAX_WAIT)
         
-        # Create a new state with the updated generated_comments
-        state_dict = state.model_dump()
-        state_dict["generated_comments"] = comments
-        return PRReviewState(**state_dict)
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
     
-    async def add_comments(self, state: PRReviewState) -> PRReviewState:
+    async def review_pipeline(self, state: PRReviewState) -> Dict[str, Any]:
         """
-        Add comments to the PR.
+        Analyze the diff, generate comments and post them as a pipeline.
+        
+        Comments for a file are queued for posting as soon as that file has
+        been analyzed, so GitHub requests overlap with the remaining LLM
+        requests instead of waiting for the whole diff to be analyzed. A
+        posting worker posts all comments queued by then as one review.
+        Analysis workers are bounded by llm_concurrency and posting workers
+        by GITHUB_CONCURRENCY.
         
         Args:
             state: The current state
             
         Returns:
-            Updated state with added comments
+            State update with detected issues, generated and added comments
         """
-        logger.info(f"Adding comments to PR #{state.pr_number}")
+        logger.info("Reviewing diff for PR #%s", state.pr_number)
+        
+        # Skip if pr_info is None or has no changes
+        if not state.pr_info or not state.pr_info.changes:
+            return {"detected_issues": [], "generated_comments": [], "added_comments": []}
+        
+        doc_index = self._build_doc_index(state.repository_context.get("docs", []))
+        repository = state.pr_info.repository or state.repository
+        
+        # Skip files without patches and files that are not worth an LLM call
+        file_changes = self._split_large_patches(
+            [file_change for file_change in state.pr_info.changes if self._should_analyze(file_change)]
+        )
+        
+        batches = self._batch_file_groups(self._group_identical_patches(file_changes), state.complete_files)
+        
+        file_queue: asyncio.Queue = asyncio.Queue()
+        for index, batch in enumerate(batches):
+            file_queue.put_nowait((index, batch))
+        comment_queue: asyncio.Queue = asyncio.Queue()
         
+        # Per-file results are kept by index so the state keeps the file order
+        issues_by_file: Dict[int, List[PRIssue]] = {}
+        comments_by_file: Dict[int, List[PRComment]] = {}
         added_comments = []
+        seen = {self._comment_key(comment) for comment in state.existing_comments + state.added_comments}
         
-        # Use repository from state directly if pr_info is None
-        repository = state.repository
-        if state.pr_info:
-            repository = state.pr_info.repository or repository
+        async def analyze_worker() -> None:
+            while not file_queue.empty():
+                index, batch = file_queue.get_nowait()
+                try:
+                    file_issues = await self._to_thread(
+                        self._analyze_batch,
+                        batch,
+                        state.complete_files,
+                        state.review_guidelines,
+                        doc_index
+                    )
+                except Exception as e:
+                    logger.error("Error analyzing diff for %s: %s", batch[0][0].filename, e)
+                    continue
+                
+                issues_by_file[index] = file_issues
+                comments_by_file[index] = [self._issue_to_comment(issue) for issue in file_issues]
+                for comment in comments_by_file[index]:
+                    key = self._comment_key(comment)
+                    if key in seen:
+                        logger.debug("Skipping duplicate comment on %s:%s", comment.file_path, comment.line_number)
+                        continue
+                    seen.add(key)
+                    comment_queue.put_nowait(comment)
         
-        for comment in state.generated_comments:
-            try:
-                added_comment = self.github_service.add_pr_comment(
-                    pr_number=state.pr_number,
-                    comment=comment,
-                    repository=repository
+        async def post_worker() -> None:
+            while True:
+                comment = await comment_queue.get()
+                if comment is None:
+                    return
+                
+                # Post everything queued so far as one review
+                comments = [comment]
+                stop = False
+                while not comment_queue.empty():
+                    comment = comment_queue.get_nowait()
+                    if comment is None:
+                        stop = True
+                        break
+                    comments.append(comment)
+                
+                review_comments, comments = await self._post_review(
+                    state.pr_number, comments, repository, state.pr_info.changes
                 )
+                added_comments.extend(review_comments)
                 
-                added_comments.append(added_comment)
-                logger.info(f"Added comment to {comment.file_path}:{comment.line_number}")
-            except Exception as e:
-                logger.error(f"Error adding comment: {str(e)}")
-                # Continue with the next comment
-                continue
+                for comment in comments:
+                    try:
+                        added_comment = await self._post_comment(state.pr_number, comment, repository)
+                    except Exception as e:
+                        logger.error(f"Error adding comment: {str(e)}")
+                        continue
+                    
+                    added_comments.append(added_comment)
+                    logger.info("Added comment to %s:%s", comment.file_path, comment.line_number)
+                
+                if stop:
+                    return
+        
+        post_workers = [asyncio.create_task(post_worker()) for _ in range(GITHUB_CONCURRENCY)]
+        analyze_workers = [
+            asyncio.create_task(analyze_worker())
+            for _ in range(min(self.llm_concurrency, len(batches)))
+        ]
+        try:
+            await asyncio.gather(*analyze_workers)
+            
+            # Stop the posting workers once everything queued has been posted
+            for _ in post_workers:
+                comment_queue.put_nowait(None)
+            await asyncio.gather(*post_workers)
+        finally:
+            # Don't leave workers running when one of them failed or the review was cancelled
+            for task in analyze_workers + post_workers:
+                task.cancel()
+            await asyncio.gather(*analyze_workers, *post_workers, return_exceptions=True)
+        
+        detected_issues = [issue for index in sorted(issues_by_file) for issue in issues_by_file[index]]
+        generated_comments = [comment for index in sorted(comments_by_file) for comment in comments_by_file[index]]
         
-        # Create a new state with the updated added_comments
-        state_dict = state.model_dump()
-        state_dict["added_comments"] = added_comments
-        return PRReviewState(**state_dict)
+        # Only return the updated fields, LangGraph merges them into the state
+        return {
+            "detected_issues": detected_issues,
+            "generated_comments": generated_comments,
+            "added_comments": added_comments
+        }
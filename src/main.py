@@ -1,20 +1,58 @@
 #!/usr/bin/env python3
-import asyncio
 import typer
 from typing import Optional
 import os
-from rich.console import Console
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from .utils.logging_utils import setup_logging
-from .services.github_service import GitHubService
-from .services.llm_service import LLMService
-from .core.pr_review_agent import PRReviewAgent
-from .models.pr_models import PRReviewState
+from rich.style import Style
+
+# Only Typer and Rich styles (a few ms) are imported at module scope so that
+# `--help` and argument errors return immediately; each command imports what
+# it needs when it runs.
 
 app = typer.Typer(help="PR Review Agent CLI")
-console = Console()
+
+# Output styles, built once instead of parsing markup tags on every print
+ERROR_STYLE = Style(color="red", bold=True)
+SUCCESS_STYLE = Style(color="green", bold=True)
+WARNING_STYLE = Style(color="yellow", bold=True)
+BOLD_STYLE = Style(bold=True)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pr-review")
+
+# LLM results are persisted here unless LLM_CACHE_PATH points elsewhere
+DEFAULT_LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm.db")
+
+# GitHub REST responses are cached here by ETag when a token is available
+GITHUB_HTTP_CACHE_PATH = os.path.join(CACHE_DIR, "gh_http.db")
+
+# Metadata, files and diffs of merged PRs, which never change, are kept here
+MERGED_PR_CACHE_DIR = os.path.join(CACHE_DIR, "merged-prs")
+
+# Result of the last successful `check-gh-cli` probe, reused while the gh binary is unchanged
+GH_CHECK_CACHE_PATH = os.path.join(CACHE_DIR, "gh_check.json")
+GH_CHECK_MAX_AGE = 60 * 60
+GH_CHECK_TIMEOUT = 5
+
+
+def _console():
+    """Create the Rich console used for command output."""
+    from rich.console import Console
+    return Console()
+
+
+# Seconds to wait for a local health-check endpoint before giving up
+HEALTH_CHECK_TIMEOUT = 2.0
+
+_http_session = None
+
+
+def _http():
+    """Get the HTTP session shared by health checks, creating it on first use."""
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+    return _http_session
 
 @app.command()
 def review(
@@ -22,14 +60,46 @@ def review(
     repo: str = typer.Option(None, help="Repository in the format 'owner/repo'"),
     model: str = typer.Option("mistral-openorca", help="Ollama model to use"),
     ollama_url: str = typer.Option("http://localhost:11434", help="Ollama API URL"),
-    verbose: bool = typer.Option(False, "--verbose", "-v", help="Enable verbose logging")
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Enable verbose logging"),
+    concurrency: Optional[int] = typer.Option(
+        None, min=1, help="Maximum number of files analyzed by the LLM at the same time (default: 8)"
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Don't read or write the on-disk caches")
 ):
     """Review a GitHub pull request using LLM analysis."""
+    import asyncio
+    from rich.console import Group
+    from rich.panel import Panel
+    from rich.text import Text
+
+    from .utils.logging_utils import setup_logging
+    from .services.github_service import GitHubService, gh_auth_token
+    from .services.llm_service import LLMCache, LLMService
+    from .core.pr_review_agent import LLM_CONCURRENCY, PRReviewAgent
+
+    try:
+        import uvloop
+    except ImportError:  # uvloop is optional and not available on Windows
+        uvloop = None
+
+    console = _console()
+
     # Set up logging with more detailed output for verbose mode
     logger = setup_logging(level="DEBUG" if verbose else "INFO", include_module=verbose)
     
-    # Initialize services
-    github_service = GitHubService(repository=repo)
+    # Initialize services. With a token (from the variables gh reads, or gh's own login)
+    # the REST API is used on one pooled session instead of spawning gh for every call,
+    # and re-runs revalidate cached responses instead of downloading them again.
+    # Merged PRs are read from disk after the first run.
+    token = os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN") or gh_auth_token()
+    if token and not no_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+    github_service = GitHubService(
+        repository=repo,
+        token=token,
+        http_cache_path=None if no_cache else GITHUB_HTTP_CACHE_PATH,
+        merged_pr_cache_dir=None if no_cache else MERGED_PR_CACHE_DIR
+    )
     
     # Ensure the Ollama URL is properly formatted for the API
     if not ollama_url.endswith("/api/generate"):
@@ -38,95 +108,95 @@ def review(
         else:
             ollama_url = f"{ollama_url}/api/generate"
     
-    llm_service = LLMService(api_url=ollama_url, model=model)
+    # Reuse LLM results from earlier runs, e.g. when re-reviewing a PR after a push
+    cache_path = None if no_cache else os.environ.get("LLM_CACHE_PATH") or DEFAULT_LLM_CACHE_PATH
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    llm_cache = LLMCache(path=cache_path)
+    llm_service = LLMService(api_url=ollama_url, model=model, cache=llm_cache)
     
     # Initialize agent
-    agent = PRReviewAgent(github_service, llm_service)
+    agent = PRReviewAgent(github_service, llm_service, llm_concurrency=concurrency or LLM_CONCURRENCY)
     
     # Display initial info
     console.print(Panel(f"PR Review Agent", title="Starting", subtitle="Powered by LangGraph"))
-    console.print(f"Reviewing PR #{pr} in repository [bold]{repo}[/bold]")
-    console.print(f"Using LLM model: [bold]{model}[/bold] via Ollama\n")
+    console.print(Text.assemble(f"Reviewing PR #{pr} in repository ", (f"{repo}", BOLD_STYLE)))
+    console.print(Text.assemble("Using LLM model: ", (model, BOLD_STYLE), " via Ollama\n"))
     
     try:
-        # Run the agent
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console
-        ) as progress:
-            task = progress.add_task("Reviewing PR...", total=None)
-            
-            # Run the review process
-            result = asyncio.run(agent.review_pr(pr))
-            
-            progress.update(task, completed=True, description="PR review completed")
+        # Run the review process, on the libuv event loop when available
+        run = uvloop.run if uvloop else asyncio.run
         
-        # Display results
-        if result.get('error'):
-            console.print(f"[bold red]Error:[/bold red] {result['error']}")
+        # A spinner only helps on a terminal, skip it when output is piped
+        if console.is_terminal:
+            with console.status("Reviewing PR...", spinner="dots"):
+                result = run(agent.review_pr(pr))
+        else:
+            result = run(agent.review_pr(pr))
+        
+        if verbose:
+            console.print(f"LLM cache: {llm_cache.hits} hits, {llm_cache.misses} misses")
+        
+        # Display results, collected as (text, style) lines and rendered in a single write
+        errors = result.get('errors')
+        if errors:
+            # Errors always go through Rich so they stay highlighted
+            console.print(Group(*(Text.assemble(("Error:", ERROR_STYLE), f" {error['message']}") for error in errors)))
         else:
-            console.print(f"\n[bold green]PR Review completed successfully![/bold green]")
-            
             # Extract data from the result dictionary
             file_changes = result.get('file_changes', [])
             complete_files = result.get('complete_files', {})
             detected_issues = result.get('detected_issues', [])
             added_comments = result.get('added_comments', [])
             
-            # Calculate analyzed files
-            analyzed_file_paths = set()
-            for change in file_changes:
-                if hasattr(change, 'filename'):
-                    analyzed_file_paths.add(change.filename)
-                elif isinstance(change, dict) and 'filename' in change:
-                    analyzed_file_paths.add(change['filename'])
-            
-            # Add complete files to analyzed files
-            if isinstance(complete_files, dict):
-                analyzed_file_paths.update(complete_files.keys())
-            
-            # Print summary information
-            console.print(f"Analyzed {len(analyzed_file_paths)} files")
+            # Every analyzed file is either a changed file or a fetched complete file
+            analyzed_file_paths = {change.filename for change in file_changes}
+            analyzed_file_paths.update(complete_files)
             
-            # Print the list of analyzed files
+            lines = [
+                ("\nPR Review completed successfully!", SUCCESS_STYLE),
+                (f"Analyzed {len(analyzed_file_paths)} files", ""),
+            ]
             if analyzed_file_paths:
-                console.print("\n[bold]Files analyzed:[/bold]")
-                for file_path in sorted(analyzed_file_paths):
-                    console.print(f"- {file_path}")
+                lines.append(("\nFiles analyzed:", BOLD_STYLE))
+                lines.append(("\n".join(f"- {file_path}" for file_path in sorted(analyzed_file_paths)), ""))
             
-            console.print(f"\nFound {len(detected_issues)} potential issues")
-            console.print(f"Added {len(added_comments)} comments to the PR")
+            lines.append((f"\nFound {len(detected_issues)} potential issues", ""))
+            lines.append((f"Added {len(added_comments)} comments to the PR", ""))
             
             if added_comments:
-                console.print("\n[bold]Comments added:[/bold]")
-                for i, comment in enumerate(added_comments, 1):
-                    if hasattr(comment, 'file_path') and hasattr(comment, 'line_number'):
-                        console.print(f"{i}. {comment.file_path}:{comment.line_number}")
-                    elif isinstance(comment, dict):
-                        file_path = comment.get('file_path', comment.get('path', 'Unknown file'))
-                        line_number = comment.get('line_number', comment.get('line', 'Unknown line'))
-                        console.print(f"{i}. {file_path}:{line_number}")
-                    else:
-                        console.print(f"{i}. Unknown location")
+                lines.append(("\nComments added:", BOLD_STYLE))
+                lines.append(("\n".join(
+                    f"{i}. {comment.file_path}:{comment.line_number}"
+                    for i, comment in enumerate(added_comments, 1)
+                ), ""))
+            
+            if console.is_terminal:
+                console.print(Group(*(Text(text, style=style) for text, style in lines)))
+            else:
+                # Piped or CI output has no styling to render, write the plain text directly
+                console.file.write("\n".join(text for text, _ in lines) + "\n")
+                console.file.flush()
     
     except Exception as e:
-        console.print(f"[bold red]Error:[/bold red] {str(e)}")
+        console.print(Text.assemble(("Error:", ERROR_STYLE), f" {e}"))
         raise typer.Exit(code=1)
 
 @app.command()
 def check_ollama():
     """Check if Ollama is running with the required model."""
-    from langchain_ollama import OllamaEndpoint
     import requests
+    from rich.text import Text
+
+    console = _console()
     
     console.print("Checking Ollama installation...")
     
     try:
         # Check if Ollama is running
-        response = requests.get("http://localhost:11434/api/tags")
+        response = _http().get("http://localhost:11434/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
         if response.status_code != 200:
-            console.print("[bold red]Error:[/bold red] Ollama is not running properly.")
+            console.print(Text.assemble(("Error:", ERROR_STYLE), " Ollama is not running properly."))
             console.print("Please ensure Ollama is installed and running.")
             console.print("See https://github.com/ollama/ollama for installation instructions.")
             return
@@ -135,50 +205,118 @@ def check_ollama():
         models = response.json().get("models", [])
         model_names = [model.get("name") for model in models]
         
-        console.print(f"[bold green]Ollama is running![/bold green]")
+        console.print("Ollama is running!", style=SUCCESS_STYLE)
         console.print(f"Available models: {', '.join(model_names) or 'None'}")
         
         # Check for mistral-openorca
         if "mistral-openorca" not in model_names:
-            console.print("[bold yellow]Warning:[/bold yellow] 'mistral-openorca' model is not available.")
+            console.print(Text.assemble(("Warning:", WARNING_STYLE), " 'mistral-openorca' model is not available."))
             console.print("To pull the model, run: ollama pull mistral-openorca")
         else:
-            console.print("[bold green]'mistral-openorca' model is available![/bold green]")
+            console.print("'mistral-openorca' model is available!", style=SUCCESS_STYLE)
+    
+    except requests.Timeout:
+        console.print(Text.assemble(("Error:", ERROR_STYLE), f" Ollama API did not respond within {HEALTH_CHECK_TIMEOUT:g} seconds."))
+        console.print("Please check that Ollama is running and not stuck loading a model.")
     
     except requests.RequestException:
-        console.print("[bold red]Error:[/bold red] Could not connect to Ollama API.")
+        console.print(Text.assemble(("Error:", ERROR_STYLE), " Could not connect to Ollama API."))
         console.print("Please ensure Ollama is installed and running.")
         console.print("See https://github.com/ollama/ollama for installation instructions.")
 
+
+def _read_gh_check(key: str) -> Optional[dict]:
+    """Read the cached gh check result if it matches the current gh binary and gh was authenticated."""
+    import json
+    import time
+
+    try:
+        with open(GH_CHECK_CACHE_PATH) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key or not cached.get("authed"):
+        return None
+    if time.time() - cached.get("ts", 0) >= GH_CHECK_MAX_AGE:
+        return None
+    return cached
+
+
+def _write_gh_check(key: str, version: str, authed: bool) -> None:
+    """Store the gh check result; failures to write are not fatal."""
+    import json
+    import time
+
+    try:
+        os.makedirs(os.path.dirname(GH_CHECK_CACHE_PATH), exist_ok=True)
+        with open(GH_CHECK_CACHE_PATH, "w") as f:
+            json.dump({"key": key, "version": version, "authed": authed, "ts": time.time()}, f)
+    except OSError:
+        pass
+
+
 @app.command()
 def check_gh_cli():
     """Check if GitHub CLI is installed and authenticated."""
+    import shutil
     import subprocess
+    from rich.text import Text
+
+    console = _console()
     
     console.print("Checking GitHub CLI installation...")
-    
+
+    def not_installed():
+        console.print(Text.assemble(("Error:", ERROR_STYLE), " GitHub CLI is not installed."))
+        console.print("Please install GitHub CLI from https://cli.github.com/")
+
+    def report(version: str, authed: bool):
+        console.print(Text.assemble(("GitHub CLI is installed!", SUCCESS_STYLE), f" {version}"))
+        if authed:
+            console.print("Authenticated with GitHub CLI!", style=SUCCESS_STYLE)
+        else:
+            console.print(Text.assemble(("Warning:", WARNING_STYLE), " Not authenticated with GitHub CLI."))
+            console.print("Please run 'gh auth login' to authenticate.")
+
+    gh_path = shutil.which("gh")
+    if gh_path is None:
+        not_installed()
+        return
+
+    # Re-probe only when the gh binary changes (upgrade/reinstall) or the result is stale
+    try:
+        key = f"{gh_path}:{os.path.getmtime(gh_path)}"
+    except OSError:
+        not_installed()
+        return
+    cached = _read_gh_check(key)
+    if cached is not None:
+        report(cached.get("version", ""), bool(cached.get("authed")))
+        return
+
     try:
         # Check if GitHub CLI is installed
-        result = subprocess.run(["gh", "--version"], capture_output=True, text=True)
+        result = subprocess.run(["gh", "--version"], capture_output=True, text=True,
+                                timeout=GH_CHECK_TIMEOUT)
         if result.returncode != 0:
-            console.print("[bold red]Error:[/bold red] GitHub CLI is not installed.")
-            console.print("Please install GitHub CLI from https://cli.github.com/")
+            not_installed()
             return
         
         version = result.stdout.strip().split('\n')[0]
-        console.print(f"[bold green]GitHub CLI is installed![/bold green] {version}")
         
         # Check if authenticated
-        auth_result = subprocess.run(["gh", "auth", "status"], capture_output=True, text=True)
-        if auth_result.returncode != 0:
-            console.print("[bold yellow]Warning:[/bold yellow] Not authenticated with GitHub CLI.")
-            console.print("Please run 'gh auth login' to authenticate.")
-        else:
-            console.print("[bold green]Authenticated with GitHub CLI![/bold green]")
+        auth_result = subprocess.run(["gh", "auth", "status"], capture_output=True, text=True,
+                                     timeout=GH_CHECK_TIMEOUT)
+        authed = auth_result.returncode == 0
     
-    except FileNotFoundError:
-        console.print("[bold red]Error:[/bold red] GitHub CLI is not installed.")
-        console.print("Please install GitHub CLI from https://cli.github.com/")
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        not_installed()
+        return
+
+    report(version, authed)
+    # Only a working setup is cached, so `gh auth login` shows up on the next check
+    if authed:
+        _write_gh_check(key, version, authed)
 
 if __name__ == "__main__":
     app()
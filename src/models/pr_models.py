@@ -1,3 +1,4 @@
+from functools import cached_property
 from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -30,6 +31,16 @@ class DocumentInfo(BaseModel):
     content: str
     type: str = Field(description="Type of document, e.g., 'README', 'CONTRIBUTING', 'CODE_OF_CONDUCT'")
 
+    # Lowercased forms used for relevance scoring, computed on first access.
+    # model_copy carries them over, so build a new DocumentInfo to change the text.
+    @cached_property
+    def path_lower(self) -> str:
+        return self.path.lower()
+
+    @cached_property
+    def content_lower(self) -> str:
+        return self.content.lower()
+
 
 class GuidelinesInfo(BaseModel):
     """Represents repository review guidelines."""
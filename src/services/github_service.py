@@ -1,9 +1,29 @@
+import base64
+import functools
+import inspect
 import json
-import subprocess
-from typing import List, Optional, Dict, Any
 import os
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple, Union
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
 
 from ..models.pr_models import (
     PullRequest, 
@@ -17,23 +37,549 @@ from ..models.pr_models import (
 
 logger = logging.getLogger(__name__)
 
+GITHUB_API_URL = "https://api.github.com"
+
+# Keep enough pooled connections for the concurrent requests issued by the agent
+GITHUB_POOL_SIZE = 20
+
+# Number of files fetched per GraphQL query, GitHub limits the nodes per query
+GRAPHQL_BATCH_SIZE = 100
+
+# Maximum number of file content queries or issue lookups sent at the same time
+FETCH_WORKERS = 10
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Reads on the REST session are retried by the connection pool, honoring Retry-After
+GET_RETRIES = 3
+
+# GitHub asks integrations to wait at least a second between requests that
+# create content, bursts of them trigger the secondary rate limit
+WRITE_INTERVAL = 1.0
+
+# Seconds a service instance reuses what it read about a PR (metadata, diff, comments)
+PR_CACHE_TTL = 60.0
+
+# Seconds repository reads (file contents, repository info and structure, issues) are reused for
+READ_CACHE_TTL = 300.0
+
+# Persisted GitHub responses older than this many seconds are discarded
+HTTP_CACHE_TTL = 60 * 60
+
+# jq filter applied by gh to a PR's files, keeping only what FileChange is built from
+PR_FILES_JQ = ".files | map({path, additions, deletions})"
+
+# Issue references like #123 or owner/repo#123 in a PR description
+LINKED_ISSUE_PATTERN = re.compile(r'(?:^|\s)(?:#(\d+)|([\w.-]+/[\w.-]+)#(\d+))')
+
+# Words suggesting a markdown file holds review guidelines, matched in one case-insensitive scan
+GUIDELINE_KEYWORD_PATTERN = re.compile(r"guideline|contributing|pull request|pr|code review|standards", re.IGNORECASE)
+
+# Guideline rules: "- "/"* " bullets, "1. "/"2. " items, or headings containing a colon
+GUIDELINE_RULE_PATTERN = re.compile(r"^[^\S\n]*((?:[-*] |[12]\. )[^\n]*\S|#[^\n]*:[^\n]*)", re.MULTILINE)
+
+# gh reports failed API calls with their status, e.g. "HTTP 502: Bad Gateway", and names rate limits
+GH_RETRYABLE_ERROR_PATTERN = re.compile(r"\bHTTP (?:429|5\d\d)\b|rate limit", re.IGNORECASE)
+
+
+def should_retry(response: Optional[requests.Response]) -> bool:
+    """Check if a failed request is worth retrying: a transient error or a rate limit."""
+    if response is None:
+        return False
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        return True
+    # GitHub answers 403 to requests over the primary or secondary rate limit
+    return response.status_code == 403 and (
+        "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+
+def should_retry_gh(error: subprocess.CalledProcessError) -> bool:
+    """Check if a failed gh call is worth retrying: its stderr shows a rate limit or a server error."""
+    return bool(GH_RETRYABLE_ERROR_PATTERN.search(_stderr_text(error)))
+
+
+def _json_loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON document, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(data: Any) -> str:
+    """Serialize data to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a GitHub timestamp such as 2024-01-15T10:23:45Z.
+    
+    GitHub always sends this fixed UTC form, which is sliced directly instead of
+    going through the general ISO 8601 parser; anything else falls back to it.
+    """
+    if not value:
+        return None
+    if len(value) == 20 and value[19] == "Z" and value[10] == "T":
+        try:
+            return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                            tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _stderr_text(error: Exception) -> str:
+    """Get the stderr of a failed gh call as text, it is bytes for calls that read JSON output as bytes."""
+    stderr = getattr(error, "stderr", None)
+    if isinstance(stderr, bytes):
+        return stderr.decode("utf-8", errors="replace")
+    return stderr or str(error)
+
+
+def _pr_cached(method):
+    """
+    Reuse the result of a PR read for PR_CACHE_TTL seconds.
+    
+    Results are kept on the service by (repository, PR number, method), and
+    writes to the PR drop them. Lists are copied so callers can't change the
+    cached result. With a merged PR store, reads of merged PRs are also kept
+    on disk and served from there in later runs.
+    """
+    @functools.wraps(method)
+    def wrapper(self, pr_number: int, repository: Optional[str] = None):
+        repo = repository or self.repository
+        if not repo:
+            return method(self, pr_number, repository)
+        
+        key = (repo, pr_number, method.__name__)
+        entry = self._pr_cache.get(key) if self.pr_cache_ttl > 0 else None
+        if entry is None or time.monotonic() - entry[0] >= self.pr_cache_ttl:
+            value = self._pr_store.get(repo, pr_number, method.__name__) if self._pr_store else None
+            if value is None:
+                value = method(self, pr_number, repo)
+                if self._pr_store and (repo, pr_number) in self._merged_prs:
+                    self._pr_store.set(repo, pr_number, method.__name__, value)
+            else:
+                # Only merged PRs are stored, so the PR's other reads can be stored too
+                self._merged_prs.add((repo, pr_number))
+            entry = (time.monotonic(), value)
+            if self.pr_cache_ttl > 0:
+                self._pr_cache[key] = entry
+        value = entry[1]
+        return list(value) if isinstance(value, list) else value
+    return wrapper
+
+
+def _read_cached(method):
+    """
+    Reuse the result of an idempotent repository read for READ_CACHE_TTL seconds.
+    
+    Results are kept on the service by method and arguments, with a missing
+    repository resolved to the service's. Empty results are not kept, they
+    are also what the reads return on errors.
+    """
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        if "repository" in bound.arguments and bound.arguments["repository"] is None:
+            bound.arguments["repository"] = self.repository
+        key = (method.__name__,) + tuple(bound.arguments.values())[1:]
+        
+        entry = self._read_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < READ_CACHE_TTL:
+            value = entry[1]
+        else:
+            value = method(*bound.args, **bound.kwargs)
+            if value:
+                self._read_cache[key] = (time.monotonic(), value)
+        # Copy the repository structure so callers can't change the cached one
+        return dict(value) if isinstance(value, dict) else value
+    return wrapper
+
+
+def gh_auth_token() -> Optional[str]:
+    """
+    Get the token the GitHub CLI is authenticated with.
+    
+    Passing it to GitHubService lets API calls reuse one pooled HTTP session
+    instead of spawning gh for each of them.
+    
+    Returns:
+        The token, or None if gh is not installed or not authenticated
+    """
+    try:
+        result = subprocess.run(["gh", "auth", "token"], capture_output=True, text=True, check=True)
+    except (subprocess.SubprocessError, FileNotFoundError):
+        return None
+    return result.stdout.strip() or None
+
+
+class HTTPCache:
+    """
+    Cache of GitHub GET responses for conditional requests, persisted in SQLite.
+    
+    The ETag of a cached response is sent as If-None-Match; GitHub answers 304
+    Not Modified without a body when the resource is unchanged, and such
+    responses do not count against the rate limit.
+    """
+    
+    def __init__(self, path: str, ttl: float = HTTP_CACHE_TTL):
+        """
+        Initialize the HTTP cache.
+        
+        Args:
+            path: Path of the SQLite database to store responses in
+            ttl: Seconds after which stored responses expire
+        """
+        self.ttl = ttl
+        # Requests are sent from worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache "
+            "(key TEXT PRIMARY KEY, etag TEXT NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL, "
+            "ts REAL NOT NULL DEFAULT 0)"
+        )
+        # Databases written before responses expired have no timestamp column
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(http_cache)")]
+        if "ts" not in columns:
+            self._db.execute("ALTER TABLE http_cache ADD COLUMN ts REAL NOT NULL DEFAULT 0")
+        self._db.execute("DELETE FROM http_cache WHERE ts < ?", (time.time() - ttl,))
+        self._db.commit()
+    
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]], accept: Optional[str]) -> str:
+        """
+        Build a cache key from what identifies a GET response.
+        
+        Args:
+            url: Request URL
+            params: Query parameters
+            accept: Accept header, the same URL returns JSON, diffs or a bare SHA depending on it
+            
+        Returns:
+            Cache key
+        """
+        query = "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+        return f"{url}?{query}\0{accept or ''}"
+    
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+        """
+        Get a cached response.
+        
+        Args:
+            key: Cache key from make_key
+            
+        Returns:
+            Tuple of ETag, headers and body, or None if there is no unexpired entry for the key
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, headers, body FROM http_cache WHERE key = ? AND ts >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], _json_loads(row[1]), row[2]
+    
+    def set(self, key: str, response: requests.Response) -> None:
+        """
+        Store a response that carries an ETag.
+        
+        Args:
+            key: Cache key from make_key
+            response: Successful response to store
+        """
+        etag = response.headers.get("ETag")
+        if not etag:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO http_cache (key, etag, headers, body, ts) VALUES (?, ?, ?, ?, ?)",
+                (key, etag, _json_dumps(dict(response.headers)), response.content, time.time())
+            )
+            self._db.commit()
+
+
+class MergedPRStore:
+    """
+    On-disk store of merged pull request reads, one JSON file per PR and read.
+    
+    A merged PR's metadata, changed files and diff never change, so they are
+    kept without expiry. Comments can still be added after a merge and are
+    not stored.
+    """
+    
+    # Stored reads and the model they return
+    READS = {
+        "get_pull_request": PullRequest,
+        "get_pr_diff": FileChange,
+        "get_pr_files": FileChange,
+    }
+    
+    def __init__(self, root: str):
+        """
+        Initialize the merged PR store.
+        
+        Args:
+            root: Directory to keep the files in, created when needed
+        """
+        self.root = root
+    
+    def _path(self, repository: str, pr_number: int, read: str) -> str:
+        return os.path.join(self.root, repository.replace("/", "-"), f"{pr_number}-{read}.json")
+    
+    def get(self, repository: str, pr_number: int, read: str) -> Any:
+        """
+        Get a stored read.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            pr_number: The PR number
+            read: Name of the GitHubService method
+            
+        Returns:
+            The stored PullRequest or list of FileChange objects, or None if there is none
+        """
+        model = self.READS.get(read)
+        if model is None:
+            return None
+        try:
+            with open(self._path(repository, pr_number, read), "rb") as f:
+                data = _json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug("Ignoring unreadable merged PR cache entry: %s", e)
+            return None
+        if isinstance(data, list):
+            return [model.model_validate(item) for item in data]
+        return model.model_validate(data)
+    
+    def set(self, repository: str, pr_number: int, read: str, value: Any) -> None:
+        """
+        Store a read of a merged PR, failures to write are only logged.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            pr_number: The PR number
+            read: Name of the GitHubService method
+            value: The PullRequest or list of FileChange objects it returned
+        """
+        if read not in self.READS:
+            return
+        if isinstance(value, list):
+            data = [item.model_dump(mode="json") for item in value]
+        else:
+            data = value.model_dump(mode="json")
+        path = self._path(repository, pr_number, read)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                f.write(_json_dumps(data))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to cache merged PR #%s: %s", pr_number, e)
+
+
 class GitHubService:
-    """Service for interacting with GitHub PRs using GitHub CLI."""
+    """
+    Service for interacting with GitHub PRs using GitHub CLI.
+    
+    When a token is provided, reads and writes go through the GitHub REST and
+    GraphQL APIs on a pooled HTTP session instead of spawning gh for every
+    call, so keep-alive connections are reused across requests. With an
+    HTTP cache, GET requests on the session are conditional and unchanged
+    resources are served from the cache.
+    """
+
+    # Set once gh has been found installed and authenticated, so later instances
+    # in the same process skip the two gh subprocesses
+    _gh_cli_verified: bool = False
 
-    def __init__(self, repository: Optional[str] = None, token: Optional[str] = None):
+    def __init__(self, repository: Optional[str] = None, token: Optional[str] = None,
+                 http_cache_path: Optional[str] = None, pr_cache_ttl: float = PR_CACHE_TTL,
+                 merged_pr_cache_dir: Optional[str] = None):
         """
         Initialize the GitHub service.
         
         Args:
             repository: The repository in the format 'owner/repo'
             token: GitHub token for authentication (optional, falls back to GitHub CLI auth)
+            http_cache_path: Path of a SQLite database caching REST responses by ETag (optional,
+                only used with a token)
+            pr_cache_ttl: Seconds PR metadata, diffs and comments are reused for, 0 to always fetch
+            merged_pr_cache_dir: Directory keeping the metadata, files and diffs of merged PRs
+                across runs (optional)
         """
         self.repository = repository
         self.token = token
+        self.pr_cache_ttl = pr_cache_ttl
+        self._pr_cache: Dict[Tuple[str, int, str], Tuple[float, Any]] = {}
+        self._session = self._create_session(token) if token else None
+        self._http_cache = HTTPCache(http_cache_path) if token and http_cache_path else None
+        self._pr_store = MergedPRStore(merged_pr_cache_dir) if merged_pr_cache_dir else None
+        # Head commit of the PRs fetched by get_pull_request, by (repository, PR
+        # number), so later calls for the same PR skip their own request
+        self._pr_heads: Dict[Tuple[str, int], str] = {}
+        self._merged_prs: set = set()
+        self._read_cache: Dict[tuple, Tuple[float, Any]] = {}
+        self._write_lock = threading.Lock()
+        self._last_write = 0.0
         self._check_gh_cli()
     
+    def _create_session(self, token: str) -> requests.Session:
+        """
+        Create a pooled HTTP session for the GitHub REST API.
+        
+        Args:
+            token: GitHub token for authentication
+            
+        Returns:
+            Session with authentication headers and a connection pool
+        """
+        session = requests.Session()
+        session.headers.update({
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {token}",
+            "X-GitHub-Api-Version": "2022-11-28"
+        })
+        retry = Retry(
+            total=GET_RETRIES,
+            backoff_factor=1,
+            status_forcelist=RETRYABLE_STATUS_CODES,
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GITHUB_POOL_SIZE, max_retries=retry)
+        session.mount("https://", adapter)
+        return session
+    
+    def _api_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Send a request to the GitHub REST API on the pooled session.
+        
+        Args:
+            method: HTTP method
+            endpoint: API endpoint, e.g. 'repos/owner/repo/pulls/1'
+            **kwargs: Extra arguments passed to requests
+            
+        Returns:
+            The response
+        """
+        url = endpoint if endpoint.startswith("http") else f"{GITHUB_API_URL}/{endpoint.lstrip('/')}"
+        if method == "GET" and self._http_cache is not None:
+            return self._cached_get(url, **kwargs)
+        response = self._session.request(method, url, timeout=30, **kwargs)
+        response.raise_for_status()
+        return response
+    
+    def _cached_get(self, url: str, params: Optional[Dict[str, Any]] = None,
+                    headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Send a conditional GET request, answering it from the HTTP cache when unchanged.
+        
+        Args:
+            url: Request URL
+            params: Query parameters
+            headers: Extra request headers
+            
+        Returns:
+            The response, with the cached body when GitHub answered 304 Not Modified
+        """
+        headers = dict(headers or {})
+        key = HTTPCache.make_key(url, params, headers.get("Accept"))
+        cached = self._http_cache.get(key)
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+        
+        response = self._session.request("GET", url, params=params, headers=headers, timeout=30)
+        if response.status_code == 304 and cached is not None:
+            _, cached_headers, body = cached
+            merged_headers = CaseInsensitiveDict(cached_headers)
+            merged_headers.update(response.headers)
+            response.status_code = 200
+            response.headers = merged_headers
+            response._content = body
+            response.encoding = get_encoding_from_headers(merged_headers) or "utf-8"
+            return response
+        
+        response.raise_for_status()
+        self._http_cache.set(key, response)
+        return response
+    
+    def _wait_for_write_slot(self) -> None:
+        """Block until WRITE_INTERVAL has passed since the previous write request."""
+        with self._write_lock:
+            wait = self._last_write + WRITE_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_write = time.monotonic()
+    
+    def _invalidate_pr_cache(self, repository: str, pr_number: int) -> None:
+        """Drop the cached reads of a PR after writing to it."""
+        # Iterate over a snapshot, reads on other threads may add entries meanwhile
+        for key in list(self._pr_cache):
+            if key[:2] == (repository, pr_number):
+                self._pr_cache.pop(key, None)
+    
+    def _get_json(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET a REST API endpoint, on the pooled session when there is one and through gh otherwise.
+        
+        Args:
+            endpoint: API endpoint, e.g. 'repos/owner/repo/issues/1'
+            params: Query parameters
+            
+        Returns:
+            The parsed JSON response
+            
+        Raises:
+            requests.RequestException: If the request on the session failed
+            subprocess.CalledProcessError: If gh failed
+        """
+        if self._session:
+            return _json_loads(self._api_request("GET", endpoint, params=params).content)
+        
+        cmd = ["gh", "api", endpoint, "--method", "GET"]
+        for name, value in (params or {}).items():
+            cmd.extend(["-f", f"{name}={value}"])
+        result = subprocess.run(cmd, capture_output=True, check=True)
+        return _json_loads(result.stdout)
+    
+    def close(self) -> None:
+        """Close the pooled HTTP session, if any."""
+        if self._session:
+            self._session.close()
+            self._session = None
+    
+    def __enter__(self) -> "GitHubService":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
     def _check_gh_cli(self) -> None:
-        """Check if GitHub CLI is installed and authenticated."""
+        """
+        Check if GitHub CLI is installed and authenticated.
+        
+        The check runs once per process; set PR_REVIEW_SKIP_GH_CHECK=1 to skip it
+        where gh is known to be available.
+        """
+        if GitHubService._gh_cli_verified or os.environ.get("PR_REVIEW_SKIP_GH_CHECK") == "1":
+            return
+        
         try:
             subprocess.run(["gh", "--version"], check=True, capture_output=True)
         except (subprocess.SubprocessError, FileNotFoundError):
@@ -52,7 +598,12 @@ class GitHubService:
                     "Not authenticated with GitHub CLI. "
                     "Please run 'gh auth login' to authenticate or provide a token."
                 )
+            # Re-check next time in case a later instance has no token
+            return
+        
+        GitHubService._gh_cli_verified = True
 
+    @_pr_cached
     def get_pull_request(self, pr_number: int, repository: Optional[str] = None) -> PullRequest:
         """
         Get information about a pull request.
@@ -68,20 +619,30 @@ class GitHubService:
         if not repo:
             raise ValueError("Repository must be specified")
         
+        if self._session:
+            return self._get_pull_request_via_api(pr_number, repo)
+        
         try:
             result = subprocess.run(
                 ["gh", "pr", "view", str(pr_number), "--repo", repo, "--json", 
-                "number,title,body,author,createdAt,updatedAt,baseRefName,headRefName"],
+                "number,title,body,author,createdAt,updatedAt,mergedAt,baseRefName,headRefName,headRefOid"],
                 capture_output=True,
-                text=True,
                 check=True
             )
             
-            pr_data = json.loads(result.stdout)
+            pr_data = _json_loads(result.stdout)
+            
+            # The head commit comes with the same request, keep it for the comment
+            # calls instead of asking gh again. The file list is left to get_pr_diff,
+            # which runs concurrently with this call.
+            if pr_data.get("headRefOid"):
+                self._pr_heads[(repo, pr_number)] = pr_data["headRefOid"]
+            if pr_data.get("mergedAt"):
+                self._merged_prs.add((repo, pr_number))
             
             # Parse datetime strings
-            created_at = datetime.fromisoformat(pr_data["createdAt"]) if pr_data.get("createdAt") else None
-            updated_at = datetime.fromisoformat(pr_data["updatedAt"]) if pr_data.get("updatedAt") else None
+            created_at = _parse_timestamp(pr_data.get("createdAt"))
+            updated_at = _parse_timestamp(pr_data.get("updatedAt"))
             
             return PullRequest(
                 pr_number=pr_data["number"],
@@ -96,8 +657,46 @@ class GitHubService:
                 changes=[]  # Will be filled by get_pr_diff
             )
         except subprocess.CalledProcessError as e:
-            logger.error(f"Error fetching PR info: {e.stderr}")
-            raise RuntimeError(f"Failed to fetch PR info: {e.stderr}")
+            logger.error("Error fetching PR info: %s", _stderr_text(e))
+            raise RuntimeError(f"Failed to fetch PR info: {_stderr_text(e)}")
+    
+    def _get_pull_request_via_api(self, pr_number: int, repository: str) -> PullRequest:
+        """
+        Get information about a pull request from the GitHub REST API.
+        
+        Args:
+            pr_number: The PR number
+            repository: The repository in the format 'owner/repo'
+            
+        Returns:
+            PullRequest object with PR information
+        """
+        try:
+            pr_data = _json_loads(self._api_request("GET", f"repos/{repository}/pulls/{pr_number}").content)
+        except requests.RequestException as e:
+            logger.error("Error fetching PR info: %s", e)
+            raise RuntimeError(f"Failed to fetch PR info: {str(e)}")
+        
+        if pr_data.get("head", {}).get("sha"):
+            self._pr_heads[(repository, pr_number)] = pr_data["head"]["sha"]
+        if pr_data.get("merged_at"):
+            self._merged_prs.add((repository, pr_number))
+        
+        created_at = _parse_timestamp(pr_data.get("created_at"))
+        updated_at = _parse_timestamp(pr_data.get("updated_at"))
+        
+        return PullRequest(
+            pr_number=pr_data["number"],
+            title=pr_data["title"],
+            description=pr_data["body"],
+            author=pr_data["user"]["login"],
+            created_at=created_at,
+            updated_at=updated_at,
+            base_branch=pr_data["base"]["ref"],
+            head_branch=pr_data["head"]["ref"],
+            repository=repository,
+            changes=[]  # Will be filled by get_pr_diff
+        )
     
     def get_repository_info(self, repository: Optional[str] = None) -> RepositoryInfo:
         """
@@ -107,86 +706,178 @@ class GitHubService:
             repository: The repository in the format 'owner/repo', overrides the one set in constructor
             
         Returns:
-            RepositoryInfo object with repository information
+            RepositoryInfo object with repository information, with minimal information if the read failed
         """
         repo = repository or self.repository
         if not repo:
             raise ValueError("Repository must be specified")
         
         try:
-            result = subprocess.run(
-                ["gh", "repo", "view", repo, "--json", 
-                "name,description,defaultBranchRef,languages,repositoryTopics,hasWikiEnabled,hasIssuesEnabled,licenseInfo"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            repo_data = json.loads(result.stdout)
-            
-            # Extract languages with safe access
-            languages = {}
-            lang_list = repo_data.get("languages", []) or []
-            for lang in lang_list:
-                if isinstance(lang, dict):
-                    languages[lang.get("name", "")] = lang.get("size", 0)
-            
-            # Extract topics with safe access
-            topics = []
-            topics_data = repo_data.get("repositoryTopics", {}) or {}
-            nodes = topics_data.get("nodes", []) or []
-            for topic in nodes:
-                if isinstance(topic, dict):
-                    topic_obj = topic.get("topic", {}) or {}
-                    topic_name = topic_obj.get("name", "")
-                    if topic_name:
-                        topics.append(topic_name)
-            
-            # Get default branch with safe access
-            default_branch_ref = repo_data.get("defaultBranchRef", {}) or {}
-            default_branch = default_branch_ref.get("name", "main")
-            
-            # Get license info with safe access
-            license_info = repo_data.get("licenseInfo", {}) or {}
-            license_name = license_info.get("name", "")
-            
-            return RepositoryInfo(
-                name=repo_data.get("name", ""),
-                description=repo_data.get("description", ""),
-                default_branch=default_branch,
-                languages=languages,
-                topics=topics,
-                has_wiki=repo_data.get("hasWikiEnabled", False),
-                has_issues=repo_data.get("hasIssuesEnabled", False),
-                license=license_name
-            )
+            return self._fetch_repository_info(repo)
         except subprocess.CalledProcessError as e:
             logger.error(f"GitHub CLI error: {e.stderr}")
-            # Return a default RepositoryInfo object with minimal information
-            return RepositoryInfo(
-                name=repo.split("/")[-1] if "/" in repo else repo,
-                description="",
-                default_branch="main",
-                languages={},
-                topics=[],
-                has_wiki=False,
-                has_issues=False,
-                license=""
-            )
         except Exception as e:
             logger.error(f"Error getting repository info: {str(e)}")
-            # Return a default RepositoryInfo object with minimal information
-            return RepositoryInfo(
-                name=repo.split("/")[-1] if "/" in repo else repo,
-                description="",
-                default_branch="main",
-                languages={},
-                topics=[],
-                has_wiki=False,
-                has_issues=False,
-                license=""
-            )
+        
+        # Return a default RepositoryInfo object with minimal information, it is not cached so the next read asks again
+        return RepositoryInfo(
+            name=repo.split("/")[-1] if "/" in repo else repo,
+            description="",
+            default_branch="main",
+            languages={},
+            topics=[],
+            has_wiki=False,
+            has_issues=False,
+            license=""
+        )
+
+    @_read_cached
+    def _fetch_repository_info(self, repository: str) -> RepositoryInfo:
+        """
+        Get information about a repository, raising if the read failed.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            
+        Returns:
+            RepositoryInfo object with repository information
+        """
+        if self._session:
+            return self._get_repository_info_via_api(repository)
+        
+        result = subprocess.run(
+            ["gh", "repo", "view", repository, "--json", 
+            "name,description,defaultBranchRef,languages,repositoryTopics,hasWikiEnabled,hasIssuesEnabled,licenseInfo"],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        
+        repo_data = _json_loads(result.stdout)
+        
+        # Extract languages with safe access
+        languages = {}
+        lang_list = repo_data.get("languages", []) or []
+        for lang in lang_list:
+            if isinstance(lang, dict):
+                languages[lang.get("name", "")] = lang.get("size", 0)
+        
+        # Extract topics with safe access
+        topics = []
+        topics_data = repo_data.get("repositoryTopics", {}) or {}
+        nodes = topics_data.get("nodes", []) or []
+        for topic in nodes:
+            if isinstance(topic, dict):
+                topic_obj = topic.get("topic", {}) or {}
+                topic_name = topic_obj.get("name", "")
+                if topic_name:
+                    topics.append(topic_name)
+        
+        # Get default branch with safe access
+        default_branch_ref = repo_data.get("defaultBranchRef", {}) or {}
+        default_branch = default_branch_ref.get("name", "main")
+        
+        # Get license info with safe access
+        license_info = repo_data.get("licenseInfo", {}) or {}
+        license_name = license_info.get("name", "")
+        
+        return RepositoryInfo(
+            name=repo_data.get("name", ""),
+            description=repo_data.get("description", ""),
+            default_branch=default_branch,
+            languages=languages,
+            topics=topics,
+            has_wiki=repo_data.get("hasWikiEnabled", False),
+            has_issues=repo_data.get("hasIssuesEnabled", False),
+            license=license_name
+        )
 
+    def _get_repository_info_via_api(self, repository: str) -> RepositoryInfo:
+        """
+        Get information about a repository from the GitHub REST API.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            
+        Returns:
+            RepositoryInfo object with repository information
+        """
+        repo_data = self._get_json(f"repos/{repository}")
+        languages = self._get_json(f"repos/{repository}/languages")
+        
+        license_info = repo_data.get("license") or {}
+        return RepositoryInfo(
+            name=repo_data.get("name", ""),
+            description=repo_data.get("description") or "",
+            default_branch=repo_data.get("default_branch") or "main",
+            languages=languages or {},
+            topics=repo_data.get("topics") or [],
+            has_wiki=repo_data.get("has_wiki", False),
+            has_issues=repo_data.get("has_issues", False),
+            license=license_info.get("name", "")
+        )
+
+    @_pr_cached
+    def get_pr_files(self, pr_number: int, repository: Optional[str] = None) -> List[FileChange]:
+        """
+        Get the files changed in a pull request without their patches.
+        
+        Use this instead of get_pr_diff when only file names and line counts are
+        needed, it skips downloading and splitting the full diff.
+        
+        Args:
+            pr_number: The PR number
+            repository: The repository in the format 'owner/repo', overrides the one set in constructor
+            
+        Returns:
+            List of FileChange objects with patch set to None
+        """
+        repo = repository or self.repository
+        if not repo:
+            raise ValueError("Repository must be specified")
+        
+        if self._session:
+            return self._get_pr_diff_via_api(pr_number, repo, with_patches=False)
+        
+        try:
+            return self._get_pr_file_changes(pr_number, repo)
+        except subprocess.CalledProcessError as e:
+            logger.error("Error fetching PR files: %s", _stderr_text(e))
+            raise RuntimeError(f"Failed to fetch PR files: {_stderr_text(e)}")
+    
+    def _get_pr_file_changes(self, pr_number: int, repository: str) -> List[FileChange]:
+        """
+        Get the changed files of a PR from gh, without patches.
+        
+        Args:
+            pr_number: The PR number
+            repository: The repository in the format 'owner/repo'
+            
+        Returns:
+            New FileChange objects with patch set to None
+        """
+        # Get the list of files changed. gh's built-in jq drops everything but
+        # the fields used below, so less JSON is parsed here
+        result = subprocess.run(
+            ["gh", "pr", "view", str(pr_number), "--repo", repository, "--json", "files",
+             "--jq", PR_FILES_JQ],
+            capture_output=True,
+            check=True
+        )
+        files_data = _json_loads(result.stdout)
+        
+        return [
+            FileChange(
+                filename=sys.intern(file_data["path"]),
+                status=sys.intern(file_data.get("status", "modified")),  # Default to 'modified' if status is missing
+                patch=None,
+                additions=file_data.get("additions", 0),
+                deletions=file_data.get("deletions", 0)
+            )
+            for file_data in files_data
+        ]
+    
+    @_pr_cached
     def get_pr_diff(self, pr_number: int, repository: Optional[str] = None) -> List[FileChange]:
         """
         Get the diff for a pull request.
@@ -202,28 +893,11 @@ class GitHubService:
         if not repo:
             raise ValueError("Repository must be specified")
         
+        if self._session:
+            return self._get_pr_diff_via_api(pr_number, repo)
+        
         try:
-            # Get the list of files changed
-            result = subprocess.run(
-                ["gh", "pr", "view", str(pr_number), "--repo", repo, "--json", "files"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            files_data = json.loads(result.stdout)["files"]
-            
-            file_changes = []
-            for file_data in files_data:
-                file_changes.append(
-                    FileChange(
-                        filename=file_data["path"],
-                        status=file_data.get("status", "modified"),  # Default to 'modified' if status is missing
-                        patch=None,  # We'll fetch the patch separately
-                        additions=file_data.get("additions", 0),
-                        deletions=file_data.get("deletions", 0)
-                    )
-                )
+            file_changes = self._get_pr_file_changes(pr_number, repo)
             
             # Get the full diff
             diff_result = subprocess.run(
@@ -233,40 +907,68 @@ class GitHubService:
                 check=True
             )
             
-            # Parse the diff and assign it to the correct file
-            diff_lines = diff_result.stdout.splitlines()
-            current_file = None
-            current_patch = []
-            
-            for line in diff_lines:
-                if line.startswith("diff --git"):
-                    if current_file and current_patch:
-                        # Extract the filename from the diff line (format: "diff --git a/path/to/file b/path/to/file")
-                        file_path = current_file.split(" b/")[-1]
-                        
-                        # Find the matching file change and assign the patch
-                        for fc in file_changes:
-                            if fc.filename == file_path:
-                                fc.patch = "\n".join(current_patch)
-                                break
-                    current_file = line
-                    current_patch = [line]
-                else:
-                    current_patch.append(line)
-            
-            # Add the last patch if any
-            if current_file and current_patch:
-                file_path = current_file.split(" b/")[-1]
-                for fc in file_changes:
-                    if fc.filename == file_path:
-                        fc.patch = "\n".join(current_patch)
-                        break
+            # Split the diff into one section per file. A section starts at a "diff --git"
+            # line, which can't appear inside a hunk where every line has a +, - or space prefix.
+            changes_by_name = {fc.filename: fc for fc in file_changes}
+            diff = diff_result.stdout
+            if diff.endswith("\n"):
+                diff = diff[:-1]
+            
+            for i, section in enumerate(diff.split("\ndiff --git ")):
+                if i > 0:
+                    section = "diff --git " + section
+                elif not section.startswith("diff --git"):
+                    continue  # Nothing before the first file header belongs to a file
+                
+                # Extract the filename from the header line (format: "diff --git a/path/to/file b/path/to/file")
+                fc = changes_by_name.get(section.partition("\n")[0].rpartition(" b/")[2])
+                if fc:
+                    fc.patch = section
             
             return file_changes
         except subprocess.CalledProcessError as e:
-            logger.error(f"Error fetching PR diff: {e.stderr}")
-            raise RuntimeError(f"Failed to fetch PR diff: {e.stderr}")
+            logger.error("Error fetching PR diff: %s", _stderr_text(e))
+            raise RuntimeError(f"Failed to fetch PR diff: {_stderr_text(e)}")
+    
+    def _get_pr_diff_via_api(self, pr_number: int, repository: str, with_patches: bool = True) -> List[FileChange]:
+        """
+        Get the changed files and their patches from the GitHub REST API.
+        
+        Args:
+            pr_number: The PR number
+            repository: The repository in the format 'owner/repo'
+            with_patches: Keep the patches of the files, the endpoint always sends them
+            
+        Returns:
+            List of FileChange objects representing changes in the PR
+        """
+        file_changes = []
+        url = f"repos/{repository}/pulls/{pr_number}/files"
+        params = {"per_page": 100}
+        
+        try:
+            # The files endpoint is paginated, follow the Link headers
+            while url:
+                response = self._api_request("GET", url, params=params)
+                for file_data in _json_loads(response.content):
+                    file_changes.append(
+                        FileChange(
+                            filename=sys.intern(file_data["filename"]),
+                            status=sys.intern(file_data.get("status", "modified")),
+                            patch=file_data.get("patch") if with_patches else None,
+                            additions=file_data.get("additions", 0),
+                            deletions=file_data.get("deletions", 0)
+                        )
+                    )
+                url = response.links.get("next", {}).get("url")
+                params = None  # The next URL already carries the query string
+        except requests.RequestException as e:
+            logger.error("Error fetching PR diff: %s", e)
+            raise RuntimeError(f"Failed to fetch PR diff: {str(e)}")
+        
+        return file_changes
 
+    @_read_cached
     def get_complete_file(self, repository: str, file_path: str, ref: str = "HEAD") -> str:
         """
         Get the complete content of a file from a repository.
@@ -277,28 +979,139 @@ class GitHubService:
             ref: The git reference (branch, tag, or commit)
             
         Returns:
-            The content of the file as a string
+            The content of the file as a string
+        """
+        if self._session:
+            try:
+                # The raw media type returns the file itself instead of base64 in JSON
+                return self._api_request(
+                    "GET",
+                    f"repos/{repository}/contents/{file_path}",
+                    params={"ref": ref},
+                    headers={"Accept": "application/vnd.github.raw+json"}
+                ).content.decode("utf-8")
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    logger.debug("File not found: %s in repository %s at ref %s", file_path, repository, ref)
+                else:
+                    logger.warning("Error fetching file content for %s: %s", file_path, e)
+                return ""
+            except (requests.RequestException, UnicodeDecodeError) as e:
+                logger.warning("Error fetching file content for %s: %s", file_path, e)
+                return ""
+        
+        try:
+            result = subprocess.run(
+                ["gh", "api", f"repos/{repository}/contents/{file_path}", 
+                 "--method", "GET", "-f", f"ref={ref}", "-q", ".content"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            
+            # The content is base64 encoded, decode it
+            content = base64.b64decode(result.stdout.strip()).decode('utf-8')
+            return content
+        except subprocess.CalledProcessError as e:
+            if "Not Found" in str(e.stderr):
+                logger.debug("File not found: %s in repository %s at ref %s", file_path, repository, ref)
+            else:
+                logger.warning(f"Error fetching file content for {file_path}: {e.stderr}")
+            return ""
+
+    def get_complete_files_batch(self, repository: str, file_paths: List[str], ref: str = "HEAD") -> Dict[str, str]:
+        """
+        Get the complete content of several files from a repository.
+        
+        The files are fetched with one GraphQL query per GRAPHQL_BATCH_SIZE
+        files instead of one request per file. Missing and binary files are
+        left out of the result.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            file_paths: The paths to the files in the repository
+            ref: The git reference (branch, tag, or commit)
+            
+        Returns:
+            Dictionary mapping file paths to their content
+        """
+        owner, name = repository.split("/")
+        
+        def fetch_batch(batch: List[str]) -> Dict[str, str]:
+            # One aliased object lookup per file, the expression is a JSON-escaped string literal
+            fields = "\n".join(
+                f"file{index}: object(expression: {_json_dumps(f'{ref}:{file_path}')}) {{ ... on Blob {{ text }} }}"
+                for index, file_path in enumerate(batch)
+            )
+            query = (
+                "query($owner: String!, $name: String!) {\n"
+                f"  repository(owner: $owner, name: $name) {{\n{fields}\n  }}\n"
+                "}"
+            )
+            
+            try:
+                data = self._graphql(query, {"owner": owner, "name": name})
+            except (subprocess.CalledProcessError, requests.RequestException) as e:
+                logger.warning("Error fetching file contents from %s: %s", repository, _stderr_text(e))
+                return {}
+            
+            batch_contents = {}
+            repository_data = (data.get("data") or {}).get("repository") or {}
+            for index, file_path in enumerate(batch):
+                blob = repository_data.get(f"file{index}")
+                if blob and blob.get("text") is not None:
+                    batch_contents[file_path] = blob["text"]
+                else:
+                    logger.debug("File not found: %s in repository %s at ref %s", file_path, repository, ref)
+            return batch_contents
+        
+        batches = [
+            file_paths[start:start + GRAPHQL_BATCH_SIZE]
+            for start in range(0, len(file_paths), GRAPHQL_BATCH_SIZE)
+        ]
+        if len(batches) <= 1:
+            return fetch_batch(batches[0]) if batches else {}
+        
+        # The queries are independent, send them concurrently on the pooled connections
+        contents = {}
+        with ThreadPoolExecutor(max_workers=min(len(batches), FETCH_WORKERS)) as executor:
+            for batch_contents in executor.map(fetch_batch, batches):
+                contents.update(batch_contents)
+        return contents
+    
+    def _graphql(self, query: str, variables: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Run a GraphQL query against the GitHub API.
+        
+        Args:
+            query: The GraphQL query
+            variables: String variables of the query
+            
+        Returns:
+            The parsed response
         """
-        try:
-            result = subprocess.run(
-                ["gh", "api", f"repos/{repository}/contents/{file_path}", 
-                 "--method", "GET", "-f", f"ref={ref}", "-q", ".content"],
-                capture_output=True,
-                text=True,
-                check=True
+        if self._session:
+            response = self._api_request(
+                "POST",
+                "graphql",
+                data=_json_dumps({"query": query, "variables": variables}),
+                headers={"Content-Type": "application/json"}
             )
-            
-            # The content is base64 encoded, decode it
-            import base64
-            content = base64.b64decode(result.stdout.strip()).decode('utf-8')
-            return content
-        except subprocess.CalledProcessError as e:
-            if "Not Found" in str(e.stderr):
-                logger.debug(f"File not found: {file_path} in repository {repository} at ref {ref}")
-            else:
-                logger.warning(f"Error fetching file content for {file_path}: {e.stderr}")
-            return ""
+            return _json_loads(response.content)
+        
+        cmd = ["gh", "api", "graphql", "-f", f"query={query}"]
+        for key, value in variables.items():
+            cmd.extend(["-f", f"{key}={value}"])
+        
+        # Read the output as bytes, orjson parses them without decoding the file contents to str first
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            check=True
+        )
+        return _json_loads(result.stdout)
 
+    @_read_cached
     def get_repository_structure(self, repository: str, ref: str) -> Dict[str, Any]:
         """
         Get the structure of a repository at a specific ref.
@@ -312,16 +1125,7 @@ class GitHubService:
         """
         try:
             # Get the top-level directories first
-            result = subprocess.run(
-                ["gh", "api", f"/repos/{repository}/contents", 
-                 "--method", "GET", 
-                 "-f", f"ref={ref}"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            contents = json.loads(result.stdout)
+            contents = self._get_json(f"repos/{repository}/contents", params={"ref": ref})
             structure = {}
             
             # Process top-level items
@@ -332,8 +1136,8 @@ class GitHubService:
                     structure[item["name"]] = {"type": "file", "path": item["path"], "size": item["size"]}
             
             return structure
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"Error fetching repository structure: {e.stderr}")
+        except (subprocess.CalledProcessError, requests.RequestException) as e:
+            logger.warning("Error fetching repository structure: %s", _stderr_text(e))
             return {}
 
     def get_repository_docs(self, repository: str, ref: Optional[str] = None) -> List[DocumentInfo]:
@@ -350,88 +1154,13 @@ class GitHubService:
         docs = []
         
         try:
-            # First, try to use GitHub API to search for all markdown files
-            logger.info(f"Searching for all markdown files in repository {repository}")
-            
-            # Use the GitHub API to search for files with .md extension
-            result = subprocess.run(
-                ["gh", "api", f"search/code?q=extension:md+repo:{repository}&per_page=100"],
-                capture_output=True,
-                text=True,
-                check=False  # Don't raise an exception if the command fails
-            )
-            
-            if result.returncode == 0:
-                search_results = json.loads(result.stdout)
-                md_files = search_results.get("items", [])
-                
-                # Log the number of markdown files found
-                logger.info(f"Found {len(md_files)} markdown files in repository {repository}")
-                
-                # Process each markdown file
-                for file_info in md_files:
-                    file_path = file_info.get("path", "")
-                    if not file_path or not file_path.endswith(".md"):
-                        continue
-                    
-                    # Determine document type based on filename and path
-                    doc_type = self._determine_doc_type(file_path)
-                    
-                    # Get the content of the file
-                    content = self.get_complete_file(repository, file_path, ref)
-                    if content:
-                        docs.append(DocumentInfo(
-                            path=file_path,
-                            content=content,
-                            type=doc_type
-                        ))
-                        logger.info(f"Added {doc_type} document: {file_path}")
-            else:
-                logger.warning(f"GitHub API search failed: {result.stderr}")
+            # List the markdown files from the repository tree, which is also reused for the guidelines
+            logger.info("Listing markdown files in repository %s", repository)
+            md_paths = self._list_markdown_files(repository, ref or "HEAD")
+            logger.info("Found %s markdown files in repository %s", len(md_paths), repository)
             
-            # If no markdown files were found using the search API or if we got less than expected,
-            # try an alternative approach using the GitHub CLI to list files
-            if len(docs) < 5:  # Arbitrary threshold to determine if we need to try another approach
-                logger.info("Using alternative approach to find markdown files")
-                
-                # Try to list all files in the repository and filter for .md files
-                list_result = subprocess.run(
-                    ["gh", "api", f"repos/{repository}/git/trees/HEAD?recursive=1"],
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
-                
-                if list_result.returncode == 0:
-                    tree_data = json.loads(list_result.stdout)
-                    tree_items = tree_data.get("tree", [])
-                    
-                    # Filter for markdown files
-                    md_paths = [item.get("path") for item in tree_items 
-                               if item.get("path", "").endswith(".md") and item.get("type") == "blob"]
-                    
-                    logger.info(f"Found {len(md_paths)} markdown files using tree API")
-                    
-                    # Process each markdown file not already in docs
-                    existing_paths = {doc.path for doc in docs}
-                    for file_path in md_paths:
-                        if file_path in existing_paths:
-                            continue
-                        
-                        # Determine document type based on filename and path
-                        doc_type = self._determine_doc_type(file_path)
-                        
-                        # Get the content of the file
-                        content = self.get_complete_file(repository, file_path, ref)
-                        if content:
-                            docs.append(DocumentInfo(
-                                path=file_path,
-                                content=content,
-                                type=doc_type
-                            ))
-                            logger.info(f"Added {doc_type} document: {file_path}")
-                else:
-                    logger.warning(f"GitHub tree API failed: {list_result.stderr}")
+            # Fetch all markdown files found in one batch
+            docs.extend(self._fetch_docs(repository, md_paths, ref))
             
             # If still no markdown files were found, fall back to checking common locations
             if not docs:
@@ -449,21 +1178,99 @@ class GitHubService:
                     {"path": "docs/DEVELOPMENT.md", "type": "DEVELOPMENT"}
                 ]
                 
-                for pattern in doc_patterns:
-                    content = self.get_complete_file(repository, pattern["path"], ref)
-                    if content:
-                        docs.append(DocumentInfo(
-                            path=pattern["path"],
-                            content=content,
-                            type=pattern["type"]
-                        ))
-                        logger.info(f"Added {pattern['type']} document: {pattern['path']}")
+                docs.extend(self._fetch_docs(
+                    repository, [pattern["path"] for pattern in doc_patterns], ref,
+                    doc_types={pattern["path"]: pattern["type"] for pattern in doc_patterns}
+                ))
             
             return docs
         except Exception as e:
             logger.error(f"Error fetching repository docs: {str(e)}")
             return docs
 
+    @_read_cached
+    def _get_repository_tree(self, repository: str, ref: str = "HEAD") -> Optional[Dict[str, Any]]:
+        """
+        Get the recursive file tree of a repository.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            ref: The git reference (branch, tag, or commit)
+            
+        Returns:
+            The tree API response, or None if the request failed
+        """
+        try:
+            return self._get_json(f"repos/{repository}/git/trees/{ref}", params={"recursive": 1})
+        except (subprocess.CalledProcessError, requests.RequestException) as e:
+            logger.warning("GitHub tree API failed: %s", _stderr_text(e))
+            return None
+    
+    def _list_markdown_files(self, repository: str, ref: str = "HEAD") -> List[str]:
+        """
+        List the markdown files of a repository.
+        
+        The files come from the repository tree. Code search, which has a much
+        lower rate limit, is only used when the tree is unavailable or was
+        truncated for being too large.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            ref: The git reference (branch, tag, or commit)
+            
+        Returns:
+            Paths of the markdown files
+        """
+        tree_data = self._get_repository_tree(repository, ref)
+        md_paths = [
+            item["path"] for item in (tree_data or {}).get("tree", [])
+            if item.get("type") == "blob" and item.get("path", "").endswith(".md")
+        ]
+        if tree_data and not tree_data.get("truncated"):
+            return md_paths
+        
+        try:
+            search_results = self._get_json(
+                "search/code", params={"q": f"extension:md repo:{repository}", "per_page": 100}
+            )
+        except (subprocess.CalledProcessError, requests.RequestException) as e:
+            logger.warning("GitHub API search failed: %s", _stderr_text(e))
+            return md_paths
+        
+        md_paths.extend(
+            item.get("path", "") for item in search_results.get("items", [])
+            if item.get("path", "").endswith(".md")
+        )
+        return list(dict.fromkeys(md_paths))
+    
+    def _fetch_docs(self, repository: str, file_paths: List[str], ref: Optional[str],
+                    doc_types: Optional[Dict[str, str]] = None) -> List[DocumentInfo]:
+        """
+        Fetch markdown files with batched queries instead of one request per file.
+        
+        Args:
+            repository: The repository in the format 'owner/repo'
+            file_paths: The paths of the files, in the order to return them
+            ref: The git reference (branch, tag, or commit), HEAD if not given
+            doc_types: Document type by path, determined from the path for others
+            
+        Returns:
+            DocumentInfo objects for the files that exist and are not empty
+        """
+        file_paths = list(dict.fromkeys(file_paths))
+        if not file_paths:
+            return []
+        
+        contents = self.get_complete_files_batch(repository, file_paths, ref or "HEAD")
+        docs = []
+        for file_path in file_paths:
+            content = contents.get(file_path)
+            if content:
+                doc_type = (doc_types or {}).get(file_path) or self._determine_doc_type(file_path)
+                docs.append(DocumentInfo(path=file_path, content=content, type=doc_type))
+                logger.debug("Added %s document: %s", doc_type, file_path)
+        return docs
+
     def get_repository_guidelines(self, repository: str) -> Optional[GuidelinesInfo]:
         """
         Get repository review guidelines from any markdown file that might contain them.
@@ -499,23 +1306,8 @@ class GitHubService:
         try:
             logger.debug(f"Searching for guidelines in markdown files in repository {repository}")
             
-            # Use the GitHub API to search for files with .md extension
-            result = subprocess.run(
-                ["gh", "api", f"search/code?q=extension:md+repo:{repository}"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            search_results = json.loads(result.stdout)
-            md_files = search_results.get("items", [])
-            
             # Look for guidelines in each markdown file
-            for file_info in md_files:
-                file_path = file_info.get("path", "")
-                if not file_path or not file_path.endswith(".md"):
-                    continue
-                
+            for file_path in self._list_markdown_files(repository, "HEAD"):
                 # Skip files we've already checked
                 if any(file_path == loc["path"] for loc in guideline_locations):
                     continue
@@ -526,8 +1318,7 @@ class GitHubService:
                     continue
                 
                 # Check if this file might contain guidelines
-                lower_content = content.lower()
-                if any(keyword in lower_content for keyword in ["guideline", "contributing", "pull request", "pr", "code review", "standards"]):
+                if GUIDELINE_KEYWORD_PATTERN.search(content):
                     # Parse the content for rules
                     parsed_rules = self._parse_guidelines(content)
                     if parsed_rules:  # Only use if we found some rules
@@ -551,18 +1342,7 @@ class GitHubService:
         Returns:
             List of extracted rules
         """
-        rules = []
-        lines = content.split("\n")
-        
-        # Look for list items that might be rules
-        for line in lines:
-            line = line.strip()
-            if line.startswith("- ") or line.startswith("* ") or (line.startswith("#") and ":" in line):
-                rules.append(line)
-            elif line.startswith("1. ") or line.startswith("2. "):
-                rules.append(line)
-        
-        return rules
+        return [match.group(1).strip() for match in GUIDELINE_RULE_PATTERN.finditer(content)]
 
     def get_linked_issues(self, pr_description: str) -> List[IssueInfo]:
         """
@@ -579,26 +1359,30 @@ class GitHubService:
         if not pr_description:
             return issues
         
-        # Look for issue references like #123 or owner/repo#123
-        import re
-        issue_refs = re.findall(r'(?:^|\s)(?:#(\d+)|(\w+/\w+)#(\d+))', pr_description)
+        # Fetch each referenced issue once, in order of first mention
+        issue_refs = {}
+        for match in LINKED_ISSUE_PATTERN.finditer(pr_description):
+            issue_num = match.group(1) or match.group(3)
+            repo = match.group(2) or self.repository
+            issue_refs.setdefault((repo, int(issue_num)), None)
         
-        for ref in issue_refs:
-            issue_num = ref[0] or ref[2]
-            repo = ref[1] or self.repository
-            
-            if not issue_num:
-                continue
-                
+        def fetch_issue(issue_ref: Tuple[str, int]) -> Optional[IssueInfo]:
             try:
-                issue_info = self._get_issue_info(repo, int(issue_num))
-                if issue_info:
-                    issues.append(issue_info)
+                return self._get_issue_info(*issue_ref)
             except Exception as e:
                 logger.warning(f"Error fetching issue info: {str(e)}")
+                return None
+        
+        # The lookups are independent, run them concurrently and keep the order of mention
+        if len(issue_refs) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(issue_refs), FETCH_WORKERS)) as executor:
+                results = list(executor.map(fetch_issue, issue_refs))
+        else:
+            results = [fetch_issue(issue_ref) for issue_ref in issue_refs]
         
-        return issues
+        return [issue_info for issue_info in results if issue_info]
 
+    @_read_cached
     def _get_issue_info(self, repository: str, issue_number: int) -> Optional[IssueInfo]:
         """
         Get information about an issue.
@@ -611,15 +1395,18 @@ class GitHubService:
             IssueInfo object if the issue is found, None otherwise
         """
         try:
-            result = subprocess.run(
-                ["gh", "issue", "view", str(issue_number), "--repo", repository, "--json", 
-                 "number,title,body,labels"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            issue_data = json.loads(result.stdout)
+            if self._session:
+                # The issue endpoint has the same fields, with labels as objects with a name
+                issue_data = self._get_json(f"repos/{repository}/issues/{issue_number}")
+            else:
+                result = subprocess.run(
+                    ["gh", "issue", "view", str(issue_number), "--repo", repository, "--json", 
+                     "number,title,body,labels"],
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+                issue_data = _json_loads(result.stdout)
             
             # Extract labels
             labels = []
@@ -629,10 +1416,10 @@ class GitHubService:
             return IssueInfo(
                 number=issue_data["number"],
                 title=issue_data["title"],
-                body=issue_data["body"],
+                body=issue_data["body"] or "",
                 labels=labels
             )
-        except subprocess.CalledProcessError:
+        except (subprocess.CalledProcessError, requests.RequestException):
             return None
 
     def _get_pr_head_commit(self, pr_number: int, repository: str) -> str:
@@ -645,28 +1432,52 @@ class GitHubService:
         Returns:
             The commit ID of the head commit
         """
-        commit_result = subprocess.run(
-            ["gh", "pr", "view", str(pr_number), "--repo", repository, "--json", "headRefOid"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        commit_data = json.loads(commit_result.stdout)
-        return commit_data.get("headRefOid", "")
-    
-    def _create_temp_file(self, content: str) -> str:
-        """Create a temporary file with the given content.
+        key = (repository, pr_number)
+        head = self._pr_heads.get(key)
+        if head:
+            return head
+        
+        if self._session:
+            pr_data = _json_loads(self._api_request("GET", f"repos/{repository}/pulls/{pr_number}").content)
+            head = pr_data.get("head", {}).get("sha", "")
+        else:
+            commit_result = subprocess.run(
+                ["gh", "pr", "view", str(pr_number), "--repo", repository, "--json", "headRefOid"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            head = _json_loads(commit_result.stdout).get("headRefOid", "")
         
+        # Posting comments doesn't move the head, keep it for the rest of the review
+        if head:
+            self._pr_heads[key] = head
+        return head
+
+    def get_commit_sha(self, repository: str, ref: str = "HEAD") -> str:
+        """Get the commit a git reference points to.
+
+        Asks for the bare SHA, which is the cheapest way to tell whether a
+        branch has moved since content was last fetched for it.
+
         Args:
-            content: The content to write to the file
-            
+            repository: The repository in the format 'owner/repo'
+            ref: The git reference (branch, tag, or commit)
+
         Returns:
-            The path to the temporary file
+            The commit SHA
         """
-        temp_file = f"/tmp/pr_comment_{os.getpid()}.txt"
-        with open(temp_file, "w") as f:
-            f.write(content)
-        return temp_file
+        endpoint = f"repos/{repository}/commits/{ref}"
+        if self._session:
+            return self._api_request("GET", endpoint, headers={"Accept": "application/vnd.github.sha"}).text.strip()
+
+        result = subprocess.run(
+            ["gh", "api", endpoint, "-H", "Accept: application/vnd.github.sha"],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return result.stdout.strip()
     
     def _add_line_comment_via_api(self, pr_number: int, repository: str, comment: PRComment) -> Optional[PRComment]:
         """Add a line-specific comment to a PR using the GitHub API.
@@ -698,62 +1509,77 @@ class GitHubService:
                 "side": "RIGHT"  # Default to RIGHT side (the new code)
             }
             
-            # Print equivalent curl command for debugging
-            self._print_curl_command(endpoint, api_params)
+            payload = _json_dumps(api_params)
             
-            # Create a temporary file for the JSON payload
-            json_file = f"/tmp/pr_comment_json_{os.getpid()}.json"
-            try:
-                with open(json_file, "w") as f:
-                    json.dump(api_params, f)
-                
-                # Use the GitHub CLI with the --raw flag to directly access the REST API
-                cmd = [
-                    "gh", "api",
-                    "--method", "POST",
-                    "-H", "Accept: application/vnd.github+json",
-                    "-H", "X-GitHub-Api-Version: 2022-11-28",
-                    endpoint,
-                    "--input", json_file,
-                    "--jq", "."  # Output the raw JSON response
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    # Log the error details
-                    logger.warning(f"Failed to add line-specific comment via API: {result.stderr}")
-                    logger.debug(f"Command output: stdout={result.stdout}, stderr={result.stderr}")
+            self._wait_for_write_slot()
+            
+            if self._session:
+                try:
+                    self._api_request(
+                        "POST",
+                        endpoint,
+                        data=payload,
+                        headers={"Content-Type": "application/json"}
+                    )
+                except requests.RequestException as e:
+                    # Let the caller retry transient failures and rate limits instead of falling back.
+                    # Without a response the comment may have been created, so don't post it again
+                    if e.response is None or should_retry(e.response):
+                        raise
+                    logger.warning("Failed to add line-specific comment via API: %s", e)
                     return None
-                
-                # Successfully added line-specific comment
                 return comment
-            finally:
-                # Clean up JSON file
-                if os.path.exists(json_file):
-                    os.remove(json_file)
+            
+            # Print equivalent curl command for debugging
+            if os.environ.get("PR_REVIEW_DEBUG_CURL"):
+                self._print_curl_command(endpoint, payload)
+            
+            # Use the GitHub CLI to directly access the REST API, with the JSON payload on stdin
+            cmd = [
+                "gh", "api",
+                "--method", "POST",
+                "-H", "Accept: application/vnd.github+json",
+                "-H", "X-GitHub-Api-Version: 2022-11-28",
+                endpoint,
+                "--input", "-",
+                "--jq", "."  # Output the raw JSON response
+            ]
+            
+            result = subprocess.run(
+                cmd,
+                input=payload,
+                capture_output=True,
+                text=True
+            )
+            
+            if result.returncode != 0:
+                # Log the error details
+                logger.warning(f"Failed to add line-specific comment via API: {result.stderr}")
+                logger.debug("Command output: stdout=%s, stderr=%s", result.stdout, result.stderr)
+                return None
+            
+            # Successfully added line-specific comment
+            return comment
+        except (requests.HTTPError, requests.ConnectionError, requests.Timeout):
+            raise
         except Exception as e:
             logger.warning(f"Failed to add line-specific comment via API: {str(e)}. Falling back to regular PR comment.")
             logger.debug(f"Error details: {str(e)}")
             return None
     
-    def _print_curl_command(self, endpoint: str, api_params: Dict[str, Any]) -> None:
+    def _print_curl_command(self, endpoint: str, payload: str) -> None:
         """Print an equivalent curl command for debugging.
         
         Args:
             endpoint: The API endpoint
-            api_params: The API parameters
+            payload: The JSON request body, already serialized
         """
         curl_command = f"""curl -X POST \\
   -H "Accept: application/vnd.github+json" \\
   -H "Authorization: Bearer $(gh auth token)" \\
   -H "X-GitHub-Api-Version: 2022-11-28" \\
   https://api.github.com{endpoint} \\
-  -d '{json.dumps(api_params)}'"""
+  -d '{payload}'"""
         
         logger.debug("\nEquivalent curl command:")
         logger.debug(curl_command)
@@ -769,34 +1595,33 @@ class GitHubService:
         Returns:
             The added comment
         """
-        # Create a temporary file with the comment body
-        temp_file = self._create_temp_file(comment.content)
+        self._wait_for_write_slot()
         
-        try:
-            # Add a reference to the file and line in the comment body if this is a line comment
-            if comment.file_path and comment.line_number:
-                with open(temp_file, "w") as f:
-                    f.write(f"**{comment.file_path}:{comment.line_number}**\n\n{comment.content}")
-            
-            # Add the comment to GitHub
-            cmd = [
-                "gh", "pr", "comment", str(pr_number),
-                "--repo", repository,
-                "--body-file", temp_file
-            ]
-            
-            subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
+        # Add a reference to the file and line in the comment body if this is a line comment
+        body = comment.content
+        if comment.file_path and comment.line_number:
+            body = f"**{comment.file_path}:{comment.line_number}**\n\n{comment.content}"
+        
+        if self._session:
+            self._api_request("POST", f"repos/{repository}/issues/{pr_number}/comments", json={"body": body})
             return comment
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        
+        # Pass the body on stdin, a shared temp file would race between concurrent comments
+        cmd = [
+            "gh", "pr", "comment", str(pr_number),
+            "--repo", repository,
+            "--body-file", "-"
+        ]
+        
+        subprocess.run(
+            cmd,
+            input=body,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        
+        return comment
 
     def add_pr_comment(self, pr_number: int, comment: PRComment, repository: Optional[str] = None) -> PRComment:
         """
@@ -814,15 +1639,85 @@ class GitHubService:
         if not repo:
             raise ValueError("Repository must be specified")
         
-        # First try to add a line-specific comment if path and line are provided
-        if comment.file_path and comment.line_number and comment.comment_type == "inline":
-            line_comment = self._add_line_comment_via_api(pr_number, repo, comment)
-            if line_comment:
-                return line_comment
+        try:
+            # First try to add a line-specific comment if path and line are provided
+            if comment.file_path and comment.line_number and comment.comment_type == "inline":
+                line_comment = self._add_line_comment_via_api(pr_number, repo, comment)
+                if line_comment:
+                    return line_comment
+            
+            # Fall back to regular PR comment
+            return self._add_regular_pr_comment(pr_number, repo, comment)
+        finally:
+            self._invalidate_pr_cache(repo, pr_number)
+
+    def create_review(self, pr_number: int, comments: List[PRComment], repository: Optional[str] = None,
+                      body: str = "", event: str = "COMMENT") -> List[PRComment]:
+        """
+        Add line comments to a PR as a single review.
+
+        One review request replaces a request per comment, and GitHub sends
+        one notification for the review instead of one per comment. The whole
+        review fails if any comment is not on a line of the diff.
+
+        Args:
+            pr_number: The PR number
+            comments: The line comments to add, each with a file path and line number
+            repository: The repository in the format 'owner/repo', overrides the one set in constructor
+            body: Summary text of the review (optional)
+            event: The review action, COMMENT, APPROVE or REQUEST_CHANGES
+
+        Returns:
+            The added comments
+        """
+        repo = repository or self.repository
+        if not repo:
+            raise ValueError("Repository must be specified")
+
+        endpoint = f"repos/{repo}/pulls/{pr_number}/reviews"
+        review: Dict[str, Any] = {
+            "commit_id": self._get_pr_head_commit(pr_number, repo),
+            "event": event,
+            "comments": [
+                {
+                    "path": comment.file_path,
+                    "line": comment.line_number,
+                    "side": "RIGHT",
+                    "body": comment.content
+                }
+                for comment in comments
+            ]
+        }
+        if body:
+            review["body"] = body
+        payload = _json_dumps(review)
+
+        self._wait_for_write_slot()
         
-        # Fall back to regular PR comment
-        return self._add_regular_pr_comment(pr_number, repo, comment)
+        try:
+            if self._session:
+                self._api_request("POST", endpoint, data=payload, headers={"Content-Type": "application/json"})
+            else:
+                subprocess.run(
+                    [
+                        "gh", "api",
+                        "--method", "POST",
+                        "-H", "Accept: application/vnd.github+json",
+                        "-H", "X-GitHub-Api-Version: 2022-11-28",
+                        endpoint,
+                        "--input", "-"
+                    ],
+                    input=payload,
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+        finally:
+            self._invalidate_pr_cache(repo, pr_number)
+
+        return comments
 
+    @_pr_cached
     def get_pr_comments(self, pr_number: int, repository: Optional[str] = None) -> List[PRComment]:
         """
         Get comments from a PR.
@@ -838,6 +1733,9 @@ class GitHubService:
         if not repo:
             raise ValueError("Repository must be specified")
         
+        if self._session:
+            return self._get_pr_comments_via_api(pr_number, repo)
+        
         try:
             result = subprocess.run(
                 ["gh", "pr", "view", str(pr_number), "--repo", repo, "--json", "comments"],
@@ -846,7 +1744,7 @@ class GitHubService:
                 check=True
             )
             
-            comments_data = json.loads(result.stdout).get("comments", [])
+            comments_data = _json_loads(result.stdout).get("comments", [])
             
             comments = []
             for comment_data in comments_data:
@@ -871,6 +1769,45 @@ class GitHubService:
         except subprocess.CalledProcessError as e:
             logger.error(f"Error fetching PR comments: {e.stderr}")
             return []
+    
+    def _get_pr_comments_via_api(self, pr_number: int, repository: str) -> List[PRComment]:
+        """
+        Get the conversation comments of a PR from the GitHub REST API.
+        
+        These are the comments `gh pr view --json comments` returns.
+        
+        Args:
+            pr_number: The PR number
+            repository: The repository in the format 'owner/repo'
+            
+        Returns:
+            List of PRComment objects
+        """
+        comments = []
+        url = f"repos/{repository}/issues/{pr_number}/comments"
+        params = {"per_page": 100}
+        
+        try:
+            # The comments endpoint is paginated, follow the Link headers
+            while url:
+                response = self._api_request("GET", url, params=params)
+                for comment_data in _json_loads(response.content):
+                    comments.append(
+                        PRComment(
+                            file_path="",
+                            line_number=0,
+                            content=comment_data.get("body") or "",
+                            comment_id=comment_data.get("node_id"),
+                            comment_type="body"
+                        )
+                    )
+                url = response.links.get("next", {}).get("url")
+                params = None  # The next URL already carries the query string
+        except requests.RequestException as e:
+            logger.error("Error fetching PR comments: %s", e)
+            return []
+        
+        return comments
 
     def check_comment_thread_exists(self, pr_number: int, file_path: str, line: int) -> bool:
         """
@@ -907,31 +1844,38 @@ class GitHubService:
         if not repo:
             raise ValueError("Repository must be specified")
             
-        try:
-            # Create a temporary file with the approval message
-            temp_file = self._create_temp_file(message)
-            
+        self._wait_for_write_slot()
+        
+        if self._session:
             try:
-                # Approve the PR
-                cmd = [
-                    "gh", "pr", "review", str(pr_number),
-                    "--repo", repo,
-                    "--approve",
-                    "--body-file", temp_file
-                ]
-                
-                subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    check=True
+                self._api_request(
+                    "POST",
+                    f"repos/{repo}/pulls/{pr_number}/reviews",
+                    json={"event": "APPROVE", "body": message}
                 )
-                
                 return True
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+            except requests.RequestException as e:
+                logger.error("Error approving PR: %s", e)
+                return False
+        
+        try:
+            # Approve the PR, with the message on stdin
+            cmd = [
+                "gh", "pr", "review", str(pr_number),
+                "--repo", repo,
+                "--approve",
+                "--body-file", "-"
+            ]
+            
+            subprocess.run(
+                cmd,
+                input=message,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            
+            return True
         except subprocess.CalledProcessError as e:
             logger.error(f"Error approving PR: {e.stderr}")
             return False
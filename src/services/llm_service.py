@@ -1,6 +1,12 @@
+import copy
 import json
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 import requests
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 import os
 
@@ -8,19 +14,302 @@ from ..models.pr_models import GuidelinesInfo, DocumentInfo
 
 logger = logging.getLogger(__name__)
 
+# Bump when a prompt template changes so cached results of the old prompt are not reused
+PROMPT_VERSION = "3"
+
+# Maximum number of repository docs included in a diff analysis prompt
+MAX_CONTEXT_DOCS = 3
+
+# Persisted LLM results older than this many seconds are discarded
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# Fixed reviewer instructions are sent as the system prompt. They are byte-identical
+# across calls, so the model server can reuse the already processed prefix instead
+# of re-reading it for every file.
+DIFF_ANALYSIS_SYSTEM_PROMPT = """
+You are a code review assistant. Analyze the diff you are given for potential issues.
+Focus on:
+1. Bugs or logical errors
+2. Security vulnerabilities
+3. Performance issues
+4. Code style and best practices
+5. Potential edge cases
+
+Provide your analysis in the following JSON format:
+{
+  "issues": [
+    {
+      "line": <line_number>,
+      "type": "<question|suggestion|nitpick|error|praise>",
+      "description": "<clear description of the issue>",
+      "suggestion": "<specific suggestion to fix the issue>",
+      "severity": "<high|medium|low>"
+    }
+  ]
+}
+
+If no issues are found, return an empty issues array.
+"""
+
+DIFF_ANALYSIS_WITH_CONTEXT_SYSTEM_PROMPT = """
+You are a code reviewer analyzing changes in a Pull Request. Review the code diff you are given and provide feedback.
+
+Provide your analysis in the following JSON format:
+{
+  "issues": [
+    {
+      "line": <line_number>,
+      "type": "<question|suggestion|nitpick|error|praise>",
+      "description": "<clear description of the issue>",
+      "suggestion": "<suggested fix if applicable>",
+      "severity": "<high|medium|low>",
+      "confidence": <float between 0 and 1>,
+      "guideline_violation": "<reference to violated guideline if applicable>"
+    },
+    ...
+  ]
+}
+
+Focus on:
+1. Logic errors
+2. Performance issues
+3. Security concerns
+4. Code style
+5. Documentation
+6. Edge cases
+7. Tests
+
+If no issues are found, return an empty issues array.
+"""
+
+BATCH_DIFF_ANALYSIS_SYSTEM_PROMPT = """
+You are a code reviewer analyzing changes in a Pull Request. Review the code diffs of every file you are given and provide feedback.
+
+Provide your analysis in the following JSON format:
+{
+  "issues": [
+    {
+      "file": "<path of the file the issue is in, exactly as given>",
+      "line": <line_number>,
+      "type": "<question|suggestion|nitpick|error|praise>",
+      "description": "<clear description of the issue>",
+      "suggestion": "<suggested fix if applicable>",
+      "severity": "<high|medium|low>",
+      "confidence": <float between 0 and 1>,
+      "guideline_violation": "<reference to violated guideline if applicable>"
+    },
+    ...
+  ]
+}
+
+Focus on:
+1. Logic errors
+2. Performance issues
+3. Security concerns
+4. Code style
+5. Documentation
+6. Edge cases
+7. Tests
+
+If no issues are found, return an empty issues array.
+"""
+
+PR_DESCRIPTION_SYSTEM_PROMPT = """
+You are a code review assistant. Analyze the pull request description you are given to extract key information.
+Focus on:
+1. Purpose of the PR
+2. Changes made
+3. Testing done
+4. Areas that need reviewer attention
+5. Related issues or tickets
+
+Provide your analysis in the following JSON format:
+{
+  "purpose": "<summary of the PR purpose>",
+  "changes": ["<list of main changes>"],
+  "testing_done": "<description of testing done or null>",
+  "attention_areas": ["<areas needing reviewer attention>"],
+  "completeness": "<assessment of PR description completeness: high|medium|low>"
+}
+"""
+
+# Per-request prompt layouts, only the placeholders change between calls
+DIFF_ANALYSIS_PROMPT_TEMPLATE = """
+File: {file_path}
+
+Diff:
+```
+{diff_content}
+```
+"""
+
+DIFF_ANALYSIS_WITH_CONTEXT_PROMPT_TEMPLATE = """
+File: {file_path}
+
+Complete file content:
+```
+{file_content}
+```
+
+Changes (diff):
+```
+{diff_content}
+```
+
+"""
+
+GUIDELINES_PROMPT_TEMPLATE = """
+Consider these guidelines when reviewing:
+{guidelines}
+
+"""
+
+REPOSITORY_DOC_PROMPT_TEMPLATE = """
+{doc_type} ({doc_path}):
+```
+{content}
+```
+"""
+
+PR_DESCRIPTION_PROMPT_TEMPLATE = """
+PR Description:
+```
+{pr_description}
+```
+"""
+
+
+class LLMCache:
+    """
+    Cache of parsed LLM results, keyed by a content hash of their inputs.
+    
+    Results are kept in memory and, when a path is given, also in a SQLite
+    database so that re-running a review reuses the results of earlier runs.
+    """
+    
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None,
+                 ttl: Optional[float] = DEFAULT_CACHE_TTL):
+        """
+        Initialize the LLM cache.
+        
+        Args:
+            max_entries: Maximum number of results to keep in memory, least recently used are evicted first
+            path: Path of a SQLite database to persist results in (optional)
+            ttl: Seconds after which persisted results expire, None to keep them forever
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        # LLM calls are dispatched from worker threads
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, ts REAL NOT NULL DEFAULT 0)"
+            )
+            # Databases written before results expired have no timestamp column
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(llm_cache)")]
+            if "ts" not in columns:
+                self._db.execute("ALTER TABLE llm_cache ADD COLUMN ts REAL NOT NULL DEFAULT 0")
+            if ttl is not None:
+                self._db.execute("DELETE FROM llm_cache WHERE ts < ?", (time.time() - ttl,))
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(*parts: Optional[str]) -> str:
+        """
+        Build a cache key from the inputs of an LLM call.
+        
+        Args:
+            parts: Inputs that determine the LLM result (model, prompt kind, content, ...)
+            
+        Returns:
+            SHA-256 hex digest of the inputs
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update((part or "").encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached result.
+        
+        Args:
+            key: Cache key from make_key
+            
+        Returns:
+            The cached result, or None if there is no entry for the key
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            
+            row = None
+            if self._db is not None:
+                query = "SELECT value FROM llm_cache WHERE key = ?"
+                params: Tuple = (key,)
+                if self.ttl is not None:
+                    query += " AND ts >= ?"
+                    params = (key, time.time() - self.ttl)
+                row = self._db.execute(query, params).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+    
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a result in the cache.
+        
+        Args:
+            key: Cache key from make_key
+            value: Result to store
+        """
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, ts) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time())
+                )
+                self._db.commit()
+    
+    def _remember(self, key: str, value: Any) -> None:
+        """Store a result in memory, the caller must hold the lock."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
 class LLMService:
     """Service for interacting with LLMs to analyze code."""
     
-    def __init__(self, api_url: Optional[str] = None, model: Optional[str] = None):
+    def __init__(self, api_url: Optional[str] = None, model: Optional[str] = None,
+                 cache: Optional[LLMCache] = None):
         """
         Initialize the LLM service.
         
         Args:
             api_url: URL for the LLM API (default: environment variable LLM_API_URL)
             model: Model to use (default: environment variable LLM_MODEL)
+            cache: Cache for LLM results (default: a new cache, persisted to
+                the SQLite file in the environment variable LLM_CACHE_PATH if set)
         """
         self.api_url = api_url or os.environ.get("LLM_API_URL", "http://localhost:11434/api/generate")
         self.model = model or os.environ.get("LLM_MODEL", "mistral")
+        self.cache = cache if cache is not None else LLMCache(path=os.environ.get("LLM_CACHE_PATH"))
     
     def analyze_diff(self, file_path: str, diff_content: str) -> List[Dict[str, Any]]:
         """
@@ -33,15 +322,27 @@ class LLMService:
         Returns:
             List of issues found, each with line number, description, and suggestion
         """
+        # Identical hunks (generated code, license headers, re-runs) get the same analysis
+        cache_key = self.cache.make_key("analyze_diff", self.model, PROMPT_VERSION, diff_content)
+        cached_issues = self.cache.get(cache_key)
+        if cached_issues is not None:
+            logger.debug("Using cached diff analysis for %s", file_path)
+            return [dict(issue) for issue in cached_issues]
+        
         # Construct prompt for the LLM
         prompt = self._construct_diff_analysis_prompt(file_path, diff_content)
         
         # Get response from LLM
-        response = self._query_llm(prompt)
+        response = self._query_llm(prompt, system=DIFF_ANALYSIS_SYSTEM_PROMPT)
         
         # Parse the response to extract issues
         issues = self._parse_diff_analysis_response(response)
         
+        # A failed query or a reply without valid JSON is not cached, the next review asks again
+        if issues is None:
+            return []
+        self.cache.set(cache_key, [dict(issue) for issue in issues])
+        
         return issues
     
     def analyze_diff_with_context(self, file_path: str, diff_content: str, 
@@ -70,14 +371,79 @@ class LLMService:
             repository_docs
         )
         
+        # The prompt contains every input of the analysis, so it identifies the result
+        cache_key = self.cache.make_key("analyze_diff_with_context", self.model, PROMPT_VERSION, prompt)
+        cached_issues = self.cache.get(cache_key)
+        if cached_issues is not None:
+            logger.debug("Using cached diff analysis for %s", file_path)
+            return [dict(issue) for issue in cached_issues]
+        
         # Get response from LLM
-        response = self._query_llm(prompt)
+        response = self._query_llm(prompt, system=DIFF_ANALYSIS_WITH_CONTEXT_SYSTEM_PROMPT)
         
         # Parse the response to extract issues
         issues = self._parse_diff_analysis_response(response)
         
+        # A failed query or a reply without valid JSON is not cached, the next review asks again
+        if issues is None:
+            return []
+        self.cache.set(cache_key, [dict(issue) for issue in issues])
+        
         return issues
     
+    def analyze_diffs_with_context_batch(
+        self,
+        files: List[Tuple[str, str, Optional[str]]],
+        guidelines: Optional[GuidelinesInfo] = None,
+        repository_docs: Optional[List[DocumentInfo]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Analyze the diffs of several files in one LLM request.
+        
+        The guidelines and documentation are sent once for all files instead of
+        once per file, which saves most of the prompt for PRs with many small diffs.
+        
+        Args:
+            files: (file path, diff content, full file content) of each file
+            guidelines: Repository guidelines (optional)
+            repository_docs: Repository documentation, most relevant first (optional)
+            
+        Returns:
+            Issues found in each file by file path, each with line number, description, and suggestion
+        """
+        prompt = self._construct_batch_diff_analysis_prompt(files, guidelines, repository_docs)
+        
+        cache_key = self.cache.make_key("analyze_diffs_with_context_batch", self.model, PROMPT_VERSION, prompt)
+        cached_issues = self.cache.get(cache_key)
+        if cached_issues is not None:
+            logger.debug("Using cached diff analysis for %d files", len(files))
+            return {file_path: [dict(issue) for issue in issues] for file_path, issues in cached_issues.items()}
+        
+        # Get response from LLM
+        response = self._query_llm(prompt, system=BATCH_DIFF_ANALYSIS_SYSTEM_PROMPT)
+        
+        # Assign the issues to the files they were reported for, dropping unknown files
+        issues_by_file: Dict[str, List[Dict[str, Any]]] = {file_path: [] for file_path, _, _ in files}
+        issues = self._parse_diff_analysis_response(response, include_file=True)
+        
+        # A failed query or a reply without valid JSON is not cached, the next review asks again
+        if issues is None:
+            return issues_by_file
+        
+        for issue in issues:
+            file_path = issue.pop("file")
+            if file_path not in issues_by_file:
+                logger.warning("Dropping issue reported for unknown file %s", file_path)
+                continue
+            issues_by_file[file_path].append(issue)
+        
+        self.cache.set(
+            cache_key,
+            {file_path: [dict(issue) for issue in issues] for file_path, issues in issues_by_file.items()}
+        )
+        
+        return issues_by_file
+    
     def analyze_pr_description(self, pr_description: str) -> Dict[str, Any]:
         """
         Analyze the PR description to extract key information.
@@ -88,15 +454,33 @@ class LLMService:
         Returns:
             Dictionary with analysis results
         """
+        # Re-reviews of the same PR usually have an unchanged description
+        cache_key = self.cache.make_key("analyze_pr_description", self.model, PROMPT_VERSION, pr_description)
+        cached_analysis = self.cache.get(cache_key)
+        if cached_analysis is not None:
+            logger.debug("Using cached PR description analysis")
+            return copy.deepcopy(cached_analysis)
+        
         # Construct prompt for the LLM
         prompt = self._construct_pr_description_analysis_prompt(pr_description)
         
         # Get response from LLM
-        response = self._query_llm(prompt)
+        response = self._query_llm(prompt, system=PR_DESCRIPTION_SYSTEM_PROMPT)
         
         # Parse the response to extract analysis
         analysis = self._parse_pr_description_analysis(response)
         
+        # A failed query or a reply without valid JSON is not cached, the next review asks again
+        if analysis is None:
+            return {
+                "purpose": "Could not extract purpose",
+                "changes": [],
+                "testing_done": None,
+                "attention_areas": [],
+                "completeness": "low"
+            }
+        self.cache.set(cache_key, copy.deepcopy(analysis))
+        
         return analysis
     
     def _construct_diff_analysis_prompt(self, file_path: str, diff_content: str) -> str:
@@ -108,40 +492,9 @@ class LLMService:
             diff_content: Diff content to analyze
             
         Returns:
-            Prompt for the LLM
+            Prompt for the LLM, the instructions are in DIFF_ANALYSIS_SYSTEM_PROMPT
         """
-        prompt = f"""
-You are a code review assistant. Analyze the following diff for potential issues.
-Focus on:
-1. Bugs or logical errors
-2. Security vulnerabilities
-3. Performance issues
-4. Code style and best practices
-5. Potential edge cases
-
-File: {file_path}
-
-Diff:
-```
-{diff_content}
-```
-
-Provide your analysis in the following JSON format:
-{{
-  "issues": [
-    {{
-      "line": <line_number>,
-      "type": "<question|suggestion|nitpick|error|praise>",
-      "description": "<clear description of the issue>",
-      "suggestion": "<specific suggestion to fix the issue>",
-      "severity": "<high|medium|low>"
-    }}
-  ]
-}}
-
-If no issues are found, return an empty issues array.
-"""
-        return prompt
+        return DIFF_ANALYSIS_PROMPT_TEMPLATE.format(file_path=file_path, diff_content=diff_content)
     
     def _construct_diff_analysis_prompt_with_context(
         self, 
@@ -162,31 +515,16 @@ If no issues are found, return an empty issues array.
             repository_docs: Additional repository documentation
             
         Returns:
-            Prompt for the LLM
+            Prompt for the LLM, the instructions are in DIFF_ANALYSIS_WITH_CONTEXT_SYSTEM_PROMPT
         """
-        prompt = f"""
-You are a code reviewer analyzing changes in a Pull Request. Review the following code diff and provide feedback.
-
-File: {file_path}
-
-Complete file content:
-```
-{full_file_content[:2000] if full_file_content else "Not available"}
-```
-
-Changes (diff):
-```
-{diff_content}
-```
-
-"""
+        # Collect the sections and join them once instead of re-copying the prompt per section.
+        # Content shared across the files of a review comes first and the file itself last,
+        # so consecutive prompts share a prefix the model server can reuse.
+        sections = []
+        
         # Add guidelines if available
         if guidelines and hasattr(guidelines, 'content'):
-            prompt += f"""
-Consider these guidelines when reviewing:
-{guidelines.content}
-
-"""
+            sections.append(GUIDELINES_PROMPT_TEMPLATE.format(guidelines=guidelines.content))
         
         # Add relevant repository documentation if available
         if repository_docs:
@@ -194,8 +532,9 @@ Consider these guidelines when reviewing:
             relevant_docs = []
             
             # Extract file extension and path components for matching
-            file_ext = file_path.split('.')[-1] if '.' in file_path else ''
-            path_components = file_path.split('/')
+            file_path_lower = file_path.lower()
+            file_ext = file_path_lower.split('.')[-1] if '.' in file_path_lower else ''
+            path_components = file_path_lower.split('/')
             
             # Score each doc based on relevance to the current file
             scored_docs = []
@@ -204,20 +543,20 @@ Consider these guidelines when reviewing:
                     continue
                     
                 score = 0
-                doc_path = doc.path.lower()
-                doc_content = doc.content.lower()
+                doc_path = doc.path_lower
+                doc_content = doc.content_lower
                 
                 # Check if doc mentions this file path or components
-                if file_path.lower() in doc_content:
+                if file_path_lower in doc_content:
                     score += 10
                 
                 # Check if doc mentions the file extension
-                if file_ext and file_ext.lower() in doc_content:
+                if file_ext and file_ext in doc_content:
                     score += 5
                 
                 # Check if doc is in the same directory
                 for component in path_components:
-                    if component.lower() in doc_path:
+                    if component in doc_path:
                         score += 3
                 
                 # Prioritize certain types of docs
@@ -235,59 +574,89 @@ Consider these guidelines when reviewing:
             # Sort docs by relevance score (highest first)
             scored_docs.sort(key=lambda x: x[1], reverse=True)
             
-            # Take the top 3 most relevant docs
-            relevant_docs = [doc for doc, _ in scored_docs[:3]]
+            # Take the most relevant docs
+            relevant_docs = [doc for doc, _ in scored_docs[:MAX_CONTEXT_DOCS]]
             
             # If we didn't find any relevant docs, just take the first few
             if not relevant_docs and repository_docs:
-                relevant_docs = repository_docs[:3]
+                relevant_docs = repository_docs[:MAX_CONTEXT_DOCS]
+            
+            sections.extend(self._repository_doc_sections(relevant_docs))
+        
+        sections.append(DIFF_ANALYSIS_WITH_CONTEXT_PROMPT_TEMPLATE.format(
+            file_path=file_path,
+            file_content=full_file_content[:2000] if full_file_content else "Not available",
+            diff_content=diff_content
+        ))
+        
+        return "".join(sections)
+    
+    def _construct_batch_diff_analysis_prompt(
+        self,
+        files: List[Tuple[str, str, Optional[str]]],
+        guidelines: Optional[GuidelinesInfo] = None,
+        repository_docs: Optional[List[DocumentInfo]] = None
+    ) -> str:
+        """
+        Construct a prompt for analyzing the diffs of several files at once.
+        
+        Args:
+            files: (file path, diff content, full file content) of each file
+            guidelines: Repository guidelines to consider
+            repository_docs: Additional repository documentation, most relevant first
             
-            prompt += "\nRepository Documentation:\n"
+        Returns:
+            Prompt for the LLM, the instructions are in BATCH_DIFF_ANALYSIS_SYSTEM_PROMPT
+        """
+        # Shared context first and the files last, as in the single file prompt
+        sections = []
+        
+        # Add guidelines if available
+        if guidelines and hasattr(guidelines, 'content'):
+            sections.append(GUIDELINES_PROMPT_TEMPLATE.format(guidelines=guidelines.content))
+        
+        # The caller already ranked the docs for the files of the batch
+        if repository_docs:
+            sections.extend(self._repository_doc_sections(repository_docs[:MAX_CONTEXT_DOCS]))
+        
+        sections.extend(
+            DIFF_ANALYSIS_WITH_CONTEXT_PROMPT_TEMPLATE.format(
+                file_path=file_path,
+                file_content=full_file_content[:2000] if full_file_content else "Not available",
+                diff_content=diff_content
+            )
+            for file_path, diff_content, full_file_content in files
+        )
+        
+        return "".join(sections)
+    
+    def _repository_doc_sections(self, docs: List[DocumentInfo]) -> List[str]:
+        """
+        Format repository documentation for a diff analysis prompt.
+        
+        Args:
+            docs: The documentation to include
             
-            for doc in relevant_docs:
-                doc_type = doc.type if hasattr(doc, 'type') and doc.type else "Documentation"
-                doc_path = doc.path if hasattr(doc, 'path') else "Unknown"
-                doc_content = doc.content if hasattr(doc, 'content') else ""
-                
-                # Truncate content to keep prompt size reasonable
-                truncated_content = doc_content[:800] + "..." if len(doc_content) > 800 else doc_content
-                
-                prompt += f"""
-{doc_type} ({doc_path}):
-```
-{truncated_content}
-```
-"""
+        Returns:
+            Prompt sections with the truncated content of each doc
+        """
+        sections = ["\nRepository Documentation:\n"]
         
-        prompt += """
-Provide your analysis in the following JSON format:
-{
-  "issues": [
-    {
-      "line": <line_number>,
-      "type": "<question|suggestion|nitpick|error|praise>",
-      "description": "<clear description of the issue>",
-      "suggestion": "<suggested fix if applicable>",
-      "severity": "<high|medium|low>",
-      "confidence": <float between 0 and 1>,
-      "guideline_violation": "<reference to violated guideline if applicable>"
-    },
-    ...
-  ]
-}
-
-Focus on:
-1. Logic errors
-2. Performance issues
-3. Security concerns
-4. Code style
-5. Documentation
-6. Edge cases
-7. Tests
-
-If no issues are found, return an empty issues array.
-"""
-        return prompt
+        for doc in docs:
+            doc_type = doc.type if hasattr(doc, 'type') and doc.type else "Documentation"
+            doc_path = doc.path if hasattr(doc, 'path') else "Unknown"
+            doc_content = doc.content if hasattr(doc, 'content') else ""
+            
+            # Truncate content to keep prompt size reasonable
+            truncated_content = doc_content[:800] + "..." if len(doc_content) > 800 else doc_content
+            
+            sections.append(REPOSITORY_DOC_PROMPT_TEMPLATE.format(
+                doc_type=doc_type,
+                doc_path=doc_path,
+                content=truncated_content
+            ))
+        
+        return sections
     
     def _construct_pr_description_analysis_prompt(self, pr_description: str) -> str:
         """
@@ -297,32 +666,9 @@ If no issues are found, return an empty issues array.
             pr_description: The PR description
             
         Returns:
-            Prompt for the LLM
+            Prompt for the LLM, the instructions are in PR_DESCRIPTION_SYSTEM_PROMPT
         """
-        prompt = f"""
-You are a code review assistant. Analyze the following pull request description to extract key information.
-Focus on:
-1. Purpose of the PR
-2. Changes made
-3. Testing done
-4. Areas that need reviewer attention
-5. Related issues or tickets
-
-PR Description:
-```
-{pr_description}
-```
-
-Provide your analysis in the following JSON format:
-{{
-  "purpose": "<summary of the PR purpose>",
-  "changes": ["<list of main changes>"],
-  "testing_done": "<description of testing done or null>",
-  "attention_areas": ["<areas needing reviewer attention>"],
-  "completeness": "<assessment of PR description completeness: high|medium|low>"
-}}
-"""
-        return prompt
+        return PR_DESCRIPTION_PROMPT_TEMPLATE.format(pr_description=pr_description)
     
     def _format_list(self, items: List[str]) -> str:
         """
@@ -339,12 +685,13 @@ Provide your analysis in the following JSON format:
         
         return "\n".join([f"{i+1}. {item}" for i, item in enumerate(items)])
     
-    def _query_llm(self, prompt: str) -> str:
+    def _query_llm(self, prompt: str, system: Optional[str] = None) -> str:
         """
         Query the LLM with a prompt.
         
         Args:
             prompt: Prompt for the LLM
+            system: Fixed instructions sent as the system prompt (optional)
             
         Returns:
             Response from the LLM
@@ -356,6 +703,8 @@ Provide your analysis in the following JSON format:
                 "prompt": prompt,
                 "stream": False
             }
+            if system:
+                payload["system"] = system
             
             # Ensure the API URL is correct for Ollama
             api_url = self.api_url
@@ -366,7 +715,7 @@ Provide your analysis in the following JSON format:
                 else:
                     api_url = f"{api_url}/api/generate"
             
-            logger.info(f"Querying LLM at {api_url} with model {self.model}")
+            logger.info("Querying LLM at %s with model %s", api_url, self.model)
             response = requests.post(api_url, json=payload)
             response.raise_for_status()
             
@@ -376,19 +725,21 @@ Provide your analysis in the following JSON format:
             logger.error(f"Error querying LLM: {str(e)}")
             return ""
     
-    def _parse_diff_analysis_response(self, response: str) -> List[Dict[str, Any]]:
+    def _parse_diff_analysis_response(self, response: str, include_file: bool = False) -> Optional[List[Dict[str, Any]]]:
         """
         Parse the LLM response to extract issues.
         
         Args:
             response: Response from the LLM
+            include_file: Keep the file each issue was reported for, for batched analyses
             
         Returns:
-            List of issues found, each with line number, description, and suggestion
+            List of issues found, each with line number, description, and suggestion,
+            or None if the response holds no valid JSON
         """
         try:
             # Log the raw response for debugging
-            logger.debug(f"Raw LLM response: {response}")
+            logger.debug("Raw LLM response: %s", response)
             
             # Extract JSON from the response
             json_start = response.find("{")
@@ -396,10 +747,10 @@ Provide your analysis in the following JSON format:
             
             if json_start == -1 or json_end == 0:
                 logger.warning("No JSON found in LLM response")
-                return []
+                return None
             
             json_str = response[json_start:json_end]
-            logger.debug(f"Extracted JSON string: {json_str}")
+            logger.debug("Extracted JSON string: %s", json_str)
             
             # Clean up the JSON string to handle common issues
             try:
@@ -415,9 +766,9 @@ Provide your analysis in the following JSON format:
                     data = json.loads(json_str)
                 except json.JSONDecodeError:
                     logger.error("Failed to parse JSON even after cleanup.")
-                    return []
+                    return None
             
-            logger.debug(f"Parsed JSON data: {data}")
+            logger.debug("Parsed JSON data: %s", data)
             
             # Handle various possible response formats
             if isinstance(data, dict):
@@ -429,9 +780,9 @@ Provide your analysis in the following JSON format:
                 issues = data
             else:
                 logger.warning(f"Unexpected data format: {type(data)}")
-                return []
+                return None
                 
-            logger.debug(f"Extracted issues: {issues}")
+            logger.debug("Extracted issues: %s", issues)
             
             # Make sure issues is a list
             if not isinstance(issues, list):
@@ -439,7 +790,7 @@ Provide your analysis in the following JSON format:
                 if isinstance(issues, dict):
                     issues = [issues]  # Convert single issue dict to list
                 else:
-                    return []
+                    return None
             
             # Normalize each issue to ensure it has all required fields
             normalized_issues = []
@@ -463,16 +814,19 @@ Provide your analysis in the following JSON format:
                 if normalized_issue["type"] not in allowed_types:
                     normalized_issue["type"] = "suggestion"  # Default fallback
                 
+                if include_file:
+                    normalized_issue["file"] = issue.get("file", issue.get("file_path"))
+                
                 normalized_issues.append(normalized_issue)
-                logger.debug(f"Normalized issue: {normalized_issue}")
+                logger.debug("Normalized issue: %s", normalized_issue)
             
             return normalized_issues
         except Exception as e:
             logger.error(f"Error parsing LLM response: {str(e)}")
             logger.error(f"Response that caused the error: {response}")
-            return []
+            return None
     
-    def _parse_pr_description_analysis(self, response: str) -> Dict[str, Any]:
+    def _parse_pr_description_analysis(self, response: str) -> Optional[Dict[str, Any]]:
         """
         Parse the LLM response to extract PR description analysis.
         
@@ -480,7 +834,7 @@ Provide your analysis in the following JSON format:
             response: Response from the LLM
             
         Returns:
-            Dictionary with analysis results
+            Dictionary with analysis results, or None if the response holds no valid JSON
         """
         try:
             # Extract JSON from the response
@@ -489,13 +843,7 @@ Provide your analysis in the following JSON format:
             
             if json_start == -1 or json_end == 0:
                 logger.warning("No JSON found in LLM response")
-                return {
-                    "purpose": "Could not extract purpose",
-                    "changes": [],
-                    "testing_done": None,
-                    "attention_areas": [],
-                    "completeness": "low"
-                }
+                return None
             
             json_str = response[json_start:json_end]
             data = json.loads(json_str)
@@ -509,10 +857,4 @@ Provide your analysis in the following JSON format:
             }
         except Exception as e:
             logger.error(f"Error parsing LLM response: {str(e)}")
-            return {
-                "purpose": "Error parsing response",
-                "changes": [],
-                "testing_done": None,
-                "attention_areas": [],
-                "completeness": "low"
-            }
+            return None
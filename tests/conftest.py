@@ -14,6 +14,13 @@ from src.services.llm_service import LLMService
 from src.core.pr_review_agent import PRReviewAgent
 
 
+@pytest.fixture(autouse=True)
+def reset_gh_cli_check(monkeypatch):
+    """Run each test with the once-per-process gh CLI check not yet done."""
+    monkeypatch.setattr(GitHubService, "_gh_cli_verified", False)
+    monkeypatch.delenv("PR_REVIEW_SKIP_GH_CHECK", raising=False)
+
+
 @pytest.fixture
 def sample_file_change():
     """Return a sample FileChange object."""
@@ -1,10 +1,15 @@
 import pytest
 from unittest.mock import patch, MagicMock, call
 import subprocess
+import threading
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
-from src.services.github_service import GitHubService
+import sqlite3
+
+import requests
+
+from src.services.github_service import GitHubService, HTTPCache
 from src.models.pr_models import (
     PullRequest,
     FileChange,
@@ -68,6 +73,21 @@ class TestGitHubService:
             with pytest.raises(RuntimeError, match="Not authenticated with GitHub CLI"):
                 GitHubService()
 
+    def test_check_gh_cli_runs_once_per_process(self):
+        """Test the gh CLI check is not repeated for later instances."""
+        with patch('subprocess.run') as mock_run:
+            mock_run.return_value = MagicMock(returncode=0)
+            GitHubService()
+            GitHubService(repository="owner/repo")
+            assert mock_run.call_count == 2
+
+    def test_check_gh_cli_skipped_by_env(self, monkeypatch):
+        """Test PR_REVIEW_SKIP_GH_CHECK=1 skips the gh CLI check."""
+        monkeypatch.setenv("PR_REVIEW_SKIP_GH_CHECK", "1")
+        with patch('subprocess.run') as mock_run:
+            GitHubService()
+            mock_run.assert_not_called()
+
     def test_get_pull_request(self):
         """Test get_pull_request method."""
         mock_pr_data = {
@@ -83,7 +103,7 @@ class TestGitHubService:
         
         with patch('subprocess.run') as mock_run:
             mock_result = MagicMock()
-            mock_result.stdout = json.dumps(mock_pr_data)
+            mock_result.stdout = json.dumps(mock_pr_data).encode()
             mock_result.returncode = 0
             mock_run.return_value = mock_result
             
@@ -101,12 +121,59 @@ class TestGitHubService:
                 
                 mock_run.assert_called_once_with(
                     ["gh", "pr", "view", "123", "--repo", "owner/repo", "--json", 
-                     "number,title,body,author,createdAt,updatedAt,baseRefName,headRefName"],
+                     "number,title,body,author,createdAt,updatedAt,mergedAt,baseRefName,headRefName,headRefOid"],
                     capture_output=True,
-                    text=True,
                     check=True
                 )
 
+    def test_get_pull_request_error_decodes_stderr(self):
+        """Test gh errors read as bytes are reported as text."""
+        error = subprocess.CalledProcessError(1, ["gh"], stderr=b"GraphQL: Could not resolve to a PullRequest")
+        
+        with patch('subprocess.run', side_effect=error), \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with pytest.raises(RuntimeError, match="^Failed to fetch PR info: GraphQL: Could not resolve"):
+                service.get_pull_request(pr_number=123)
+
+    def test_get_pull_request_provides_head_for_later_calls(self):
+        """Test the head commit fetched with the PR is reused by the comment calls."""
+        pr_view = MagicMock(stdout=json.dumps({
+            "number": 123,
+            "title": "Test PR",
+            "body": "Description",
+            "author": {"login": "test-user"},
+            "baseRefName": "main",
+            "headRefName": "feature",
+            "headRefOid": "abc123"
+        }))
+        
+        with patch('subprocess.run', return_value=pr_view) as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            service.get_pull_request(pr_number=123)
+            head = service._get_pr_head_commit(123, "owner/repo")
+        
+        assert head == "abc123"
+        mock_run.assert_called_once()
+
+    def test_pr_reads_are_reused_until_the_pr_is_written(self, sample_pr_comment):
+        """Test PR comments are read once within the TTL and read again after adding a comment."""
+        comments = MagicMock(stdout=json.dumps({"comments": [{"body": "Looks good", "id": "IC_1"}]}))
+        
+        with patch('subprocess.run', return_value=comments) as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            first = service.get_pr_comments(pr_number=123)
+            second = service.get_pr_comments(pr_number=123)
+            assert mock_run.call_count == 1
+            assert first == second and first is not second
+            
+            with patch.object(service, '_add_line_comment_via_api', return_value=sample_pr_comment):
+                service.add_pr_comment(pr_number=123, comment=sample_pr_comment)
+            service.get_pr_comments(pr_number=123)
+            assert mock_run.call_count == 2
+
     def test_get_pull_request_no_repository(self):
         """Test get_pull_request method with no repository specified."""
         with patch.object(GitHubService, '_check_gh_cli'):
@@ -132,7 +199,7 @@ class TestGitHubService:
         with patch('subprocess.run') as mock_run:
             # First call returns file list, second call returns diff
             mock_files_result = MagicMock()
-            mock_files_result.stdout = json.dumps(mock_files_data)
+            mock_files_result.stdout = json.dumps(mock_files_data["files"]).encode()
             mock_files_result.returncode = 0
             
             mock_diff_result = MagicMock()
@@ -155,9 +222,9 @@ class TestGitHubService:
                 assert mock_run.call_count == 2
                 mock_run.assert_has_calls([
                     call(
-                        ["gh", "pr", "view", "123", "--repo", "owner/repo", "--json", "files"],
+                        ["gh", "pr", "view", "123", "--repo", "owner/repo", "--json", "files",
+                         "--jq", ".files | map({path, additions, deletions})"],
                         capture_output=True,
-                        text=True,
                         check=True
                     ),
                     call(
@@ -168,6 +235,117 @@ class TestGitHubService:
                     )
                 ])
 
+    def test_get_pr_diff_splits_sections_per_file(self):
+        """Test each file gets its own diff section, with its line endings kept as they are."""
+        files = MagicMock(stdout=json.dumps([{"path": "a.py"}, {"path": "b.txt"}]))
+        diff = MagicMock(stdout=(
+            "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n\n"
+            "diff --git a/b.txt b/b.txt\n@@ -0,0 +1 @@\n+line\r\n"
+        ))
+        
+        with patch('subprocess.run', side_effect=[files, diff]), \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            changes = service.get_pr_diff(pr_number=123)
+        
+        assert [fc.patch for fc in changes] == [
+            "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n",
+            "diff --git a/b.txt b/b.txt\n@@ -0,0 +1 @@\n+line\r"
+        ]
+
+    @pytest.mark.parametrize("value,expected", [
+        ("2024-01-15T10:23:45Z", datetime(2024, 1, 15, 10, 23, 45, tzinfo=timezone.utc)),
+        ("2024-01-15T10:23:45.500+02:00",
+         datetime(2024, 1, 15, 10, 23, 45, 500000, tzinfo=timezone(timedelta(hours=2)))),
+        (None, None),
+    ], ids=["github", "iso", "missing"])
+    def test_parse_timestamp(self, value, expected):
+        """Test GitHub timestamps parse the same as datetime.fromisoformat."""
+        from src.services.github_service import _parse_timestamp
+        assert _parse_timestamp(value) == expected
+
+    def test_merged_pr_reads_persist_across_instances(self, tmp_path):
+        """Test a merged PR's metadata and diff are read from disk by a later service."""
+        pr_data = {
+            "number": 123, "title": "Test PR", "body": "", "author": {"login": "u"},
+            "createdAt": "2023-01-01T00:00:00Z", "updatedAt": "2023-01-02T00:00:00Z",
+            "mergedAt": "2023-01-03T00:00:00Z", "baseRefName": "main", "headRefName": "f",
+            "headRefOid": "abc123"
+        }
+        files = [{"path": "a.py", "additions": 1, "deletions": 0}]
+        diff = "diff --git a/a.py b/a.py\n+x\n"
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.side_effect = [
+                MagicMock(stdout=json.dumps(pr_data).encode(), returncode=0),
+                MagicMock(stdout=json.dumps(files).encode(), returncode=0),
+                MagicMock(stdout=diff, returncode=0)
+            ]
+            first = GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path))
+            pr = first.get_pull_request(123)
+            changes = first.get_pr_diff(123)
+            
+            second = GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path))
+            assert second.get_pull_request(123) == pr
+            assert second.get_pr_diff(123) == changes
+        
+        assert mock_run.call_count == 3
+        assert changes[0].patch == diff[:-1]
+
+    def test_merged_pr_diff_persisted_after_pr_is_read_from_disk(self, tmp_path):
+        """Test a diff fetched before the PR was known to be merged is stored by a later run."""
+        pr_data = {
+            "number": 123, "title": "Test PR", "body": "", "author": {"login": "u"},
+            "mergedAt": "2023-01-03T00:00:00Z", "baseRefName": "main", "headRefName": "f",
+            "headRefOid": "abc123"
+        }
+        files = MagicMock(stdout=json.dumps([{"path": "a.py"}]).encode(), returncode=0)
+        diff = MagicMock(stdout="diff --git a/a.py b/a.py\n+x\n", returncode=0)
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            # The diff finishes first, before the PR is known to be merged
+            mock_run.side_effect = [files, diff, MagicMock(stdout=json.dumps(pr_data).encode(), returncode=0)]
+            first = GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path))
+            first.get_pr_diff(123)
+            first.get_pull_request(123)
+            
+            mock_run.side_effect = [files, diff]
+            second = GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path))
+            second.get_pull_request(123)
+            second.get_pr_diff(123)
+            
+            third = GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path))
+            third.get_pull_request(123)
+            third.get_pr_diff(123)
+        
+        assert mock_run.call_count == 5
+
+    def test_open_pr_reads_not_persisted(self, tmp_path):
+        """Test reads of an unmerged PR are not written to the merged PR store."""
+        pr_data = {
+            "number": 123, "title": "Test PR", "body": "", "author": {"login": "u"},
+            "mergedAt": None, "baseRefName": "main", "headRefName": "f", "headRefOid": "abc123"
+        }
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.return_value = MagicMock(stdout=json.dumps(pr_data).encode(), returncode=0)
+            GitHubService(repository="owner/repo", merged_pr_cache_dir=str(tmp_path)).get_pull_request(123)
+        
+        assert not any(tmp_path.rglob("*.json"))
+
+    def test_get_pr_files_skips_the_diff(self):
+        """Test get_pr_files returns file metadata without fetching the diff."""
+        files = [{"path": "a.py", "additions": 2, "deletions": 1}]
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.return_value = MagicMock(stdout=json.dumps(files).encode(), returncode=0)
+            service = GitHubService(repository="owner/repo")
+            changes = service.get_pr_files(pr_number=123)
+        
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0][:3] == ["gh", "pr", "view"]
+        assert [(c.filename, c.additions, c.deletions, c.patch) for c in changes] == [("a.py", 2, 1, None)]
+
     def test_get_pr_diff_no_repository(self):
         """Test get_pr_diff method with no repository specified."""
         with patch.object(GitHubService, '_check_gh_cli'):
@@ -299,6 +477,48 @@ class TestGitHubService:
                 mock_structure.assert_called_once_with(ref="main")
                 assert mock_file_content.call_count == 3
 
+    def test_get_repository_docs_fetches_files_in_one_batch(self):
+        """Test the markdown files in the tree are fetched with one batched read instead of one per file."""
+        tree = {"tree": [
+            {"path": "README.md", "type": "blob"},
+            {"path": "docs", "type": "tree"},
+            {"path": "docs/guide.md", "type": "blob"},
+            {"path": "setup.py", "type": "blob"},
+            {"path": "CONTRIBUTING.md", "type": "blob"}
+        ]}
+        contents = {"README.md": "# Readme", "docs/guide.md": "# Guide", "CONTRIBUTING.md": "# Contributing"}
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_json', return_value=tree) as mock_get_json, \
+                 patch.object(service, 'get_complete_files_batch',
+                              side_effect=lambda repo, paths, ref: {p: contents[p] for p in paths}) as mock_batch, \
+                 patch.object(service, 'get_complete_file') as mock_file:
+                docs = service.get_repository_docs("owner/repo", ref="main")
+        
+        assert [(doc.path, doc.type) for doc in docs] == [
+            ("README.md", "README"), ("docs/guide.md", "DOCUMENTATION"), ("CONTRIBUTING.md", "CONTRIBUTING")
+        ]
+        mock_get_json.assert_called_once_with("repos/owner/repo/git/trees/main", params={"recursive": 1})
+        mock_batch.assert_called_once_with("owner/repo", ["README.md", "docs/guide.md", "CONTRIBUTING.md"], "main")
+        mock_file.assert_not_called()
+
+    def test_markdown_files_listed_from_one_tree_read(self):
+        """Test the docs and guidelines share one tree read, and code search only fills in truncated trees."""
+        tree = {"tree": [{"path": "README.md", "type": "blob"}], "truncated": True}
+        search = {"items": [{"path": "README.md"}, {"path": "deep/notes.md"}, {"path": "deep/a.py"}]}
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_json', side_effect=[tree, search, search]) as mock_get_json:
+                first = service._list_markdown_files("owner/repo")
+                second = service._list_markdown_files("owner/repo")
+        
+        assert first == second == ["README.md", "deep/notes.md"]
+        assert [c.args[0] for c in mock_get_json.call_args_list] == [
+            "repos/owner/repo/git/trees/HEAD", "search/code", "search/code"
+        ]
+
     def test_get_repository_docs_no_repository(self):
         """Test get_repository_docs method with no repository specified."""
         with patch.object(GitHubService, '_check_gh_cli'):
@@ -451,6 +671,36 @@ class TestGitHubService:
             with pytest.raises(ValueError, match="Repository must be specified"):
                 service.get_linked_issues(pr_number=123)
 
+    def test_get_linked_issues_fetches_each_reference_once(self):
+        """Test get_linked_issues fetches repeated references once and accepts hyphenated repositories."""
+        description = "Fixes #12 and Z-Lemke/pr-review#7.\nSee #12 again, also pr-review#7 is related."
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_issue_info', return_value=None) as mock_get_issue:
+                service.get_linked_issues(description)
+        
+        # The lookups run concurrently, so only the set of calls is fixed
+        assert sorted(mock_get_issue.call_args_list) == [
+            call("Z-Lemke/pr-review", 7),
+            call("owner/repo", 12)
+        ]
+
+    def test_get_linked_issues_fetches_concurrently_in_order(self):
+        """Test issue lookups are in flight together and results keep the order of mention."""
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def get_issue(repository, issue_number):
+            barrier.wait()
+            return IssueInfo(number=issue_number, title=f"Issue {issue_number}", body="")
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_issue_info', side_effect=get_issue):
+                issues = service.get_linked_issues("Fixes #3, #1 and #2")
+        
+        assert [issue.number for issue in issues] == [3, 1, 2]
+
     def test_check_comment_thread_exists(self):
         """Test check_comment_thread_exists method."""
         mock_comments_data = {
@@ -521,6 +771,57 @@ class TestGitHubService:
             mock_line_comment.assert_not_called()
             mock_regular_comment.assert_called_once_with(123, "owner/repo", body_comment)
 
+    def test_head_commit_fetched_once_per_pr(self):
+        """Test line comments on the same PR share one head commit lookup."""
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'), \
+             patch('src.services.github_service.WRITE_INTERVAL', 0):
+            mock_run.return_value = MagicMock(stdout='{"headRefOid": "abc123"}', returncode=0)
+            service = GitHubService(repository="owner/repo")
+            for line in (3, 4, 5):
+                service.add_pr_comment(pr_number=123, comment=PRComment(content="Fix", file_path="a.py", line_number=line))
+        
+        head_lookups = [c for c in mock_run.call_args_list if c[0][0][:3] == ["gh", "pr", "view"]]
+        assert len(head_lookups) == 1
+        assert all(json.loads(c.kwargs["input"])["commit_id"] == "abc123"
+                   for c in mock_run.call_args_list if "input" in c.kwargs)
+
+    def test_gh_writes_pass_payloads_on_stdin(self):
+        """Test comments and line comments are piped to gh instead of written to temp files."""
+        with patch('subprocess.run', return_value=MagicMock(returncode=0)) as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'), \
+             patch.object(GitHubService, '_get_pr_head_commit', return_value="abc123"), \
+             patch('src.services.github_service.WRITE_INTERVAL', 0):
+            service = GitHubService(repository="owner/repo")
+            service.add_pr_comment(pr_number=123, comment=PRComment(content="Summary", comment_type="body"))
+            service.add_pr_comment(pr_number=123, comment=PRComment(content="Fix", file_path="a.py", line_number=3))
+        
+        body_call, line_call = mock_run.call_args_list
+        assert body_call[0][0][-2:] == ["--body-file", "-"]
+        assert body_call.kwargs["input"] == "Summary"
+        assert "--input" in line_call[0][0] and line_call[0][0][line_call[0][0].index("--input") + 1] == "-"
+        assert json.loads(line_call.kwargs["input"])["path"] == "a.py"
+
+    @pytest.mark.parametrize("debug", [False, True], ids=["quiet", "debug"])
+    def test_line_comment_curl_command_only_when_debugging(self, monkeypatch, debug):
+        """Test the equivalent curl command is only built with PR_REVIEW_DEBUG_CURL set."""
+        if debug:
+            monkeypatch.setenv("PR_REVIEW_DEBUG_CURL", "1")
+        else:
+            monkeypatch.delenv("PR_REVIEW_DEBUG_CURL", raising=False)
+        with patch('subprocess.run', return_value=MagicMock(returncode=0)) as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'), \
+             patch.object(GitHubService, '_get_pr_head_commit', return_value="abc123"), \
+             patch.object(GitHubService, '_print_curl_command') as mock_print, \
+             patch('src.services.github_service.WRITE_INTERVAL', 0):
+            service = GitHubService(repository="owner/repo")
+            service.add_pr_comment(pr_number=123, comment=PRComment(content="Fix", file_path="a.py", line_number=3))
+        
+        if debug:
+            mock_print.assert_called_once_with("/repos/owner/repo/pulls/123/comments", mock_run.call_args.kwargs["input"])
+        else:
+            mock_print.assert_not_called()
+
     def test_add_pr_comment_no_repository(self, sample_pr_comment):
         """Test add_pr_comment method with no repository specified."""
         with patch.object(GitHubService, '_check_gh_cli'):
@@ -565,3 +866,424 @@ class TestGitHubService:
             cmd = mock_run.call_args[0][0]
             assert "123" in cmd
             assert "owner/repo" in cmd
+
+    def test_get_pull_request_with_token_uses_api_session(self):
+        """Test get_pull_request goes through the pooled REST session when a token is set."""
+        mock_pr_data = {
+            "number": 123,
+            "title": "Test PR",
+            "body": "Description",
+            "user": {"login": "test-user"},
+            "created_at": "2023-01-01T00:00:00Z",
+            "updated_at": "2023-01-02T00:00:00Z",
+            "base": {"ref": "main"},
+            "head": {"ref": "feature"}
+        }
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service._session, 'request') as mock_request:
+                mock_request.return_value = MagicMock(content=json.dumps(mock_pr_data).encode())
+                pr = service.get_pull_request(pr_number=123)
+            
+            assert pr.pr_number == 123
+            assert pr.author == "test-user"
+            assert pr.base_branch == "main"
+            assert pr.head_branch == "feature"
+            mock_request.assert_called_once_with(
+                "GET", "https://api.github.com/repos/owner/repo/pulls/123", timeout=30
+            )
+            mock_run.assert_not_called()
+            assert service._session.headers["Authorization"] == "Bearer test-token"
+
+    def test_get_pr_diff_with_token_follows_pagination(self):
+        """Test get_pr_diff reads patches from the paginated REST files endpoint."""
+        next_url = "https://api.github.com/repositories/1/pulls/123/files?per_page=100&page=2"
+        first_page = MagicMock(
+            content=json.dumps([
+                {"filename": "a.py", "status": "modified", "patch": "@@ -1 +1 @@", "additions": 1, "deletions": 1}
+            ]).encode(),
+            links={"next": {"url": next_url}}
+        )
+        second_page = MagicMock(
+            content=json.dumps([
+                {"filename": "b.png", "status": "added", "additions": 0, "deletions": 0}
+            ]).encode(),
+            links={}
+        )
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service._session, 'request', side_effect=[first_page, second_page]) as mock_request:
+                changes = service.get_pr_diff(pr_number=123)
+        
+        assert [(fc.filename, fc.status, fc.patch) for fc in changes] == [
+            ("a.py", "modified", "@@ -1 +1 @@"),
+            ("b.png", "added", None)
+        ]
+        assert mock_request.call_args_list == [
+            call("GET", "https://api.github.com/repos/owner/repo/pulls/123/files", timeout=30, params={"per_page": 100}),
+            call("GET", next_url, timeout=30, params=None)
+        ]
+
+    def test_json_helpers_fall_back_to_standard_library(self):
+        """Test JSON parsing and serialization work without orjson installed."""
+        from src.services import github_service
+        
+        payload = {"body": "Comment", "line": 10}
+        with patch.object(github_service, 'orjson', None):
+            assert github_service._json_loads(github_service._json_dumps(payload)) == payload
+            assert github_service._json_loads(b'{"files": []}') == {"files": []}
+        
+        assert github_service._json_loads(github_service._json_dumps(payload)) == payload
+
+    def test_get_complete_files_batch(self):
+        """Test get_complete_files_batch fetches all files with a single GraphQL query."""
+        mock_response = {
+            "data": {
+                "repository": {
+                    "file0": {"text": "print('a')\n"},
+                    "file1": None,  # Deleted in the PR
+                    "file2": {"text": None}  # Binary file
+                }
+            }
+        }
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.return_value = MagicMock(stdout=json.dumps(mock_response), returncode=0)
+            
+            service = GitHubService(repository="owner/repo")
+            contents = service.get_complete_files_batch(
+                repository="owner/repo",
+                file_paths=["src/a.py", "src/removed.py", "img/logo.png"]
+            )
+            
+            assert contents == {"src/a.py": "print('a')\n"}
+            mock_run.assert_called_once()
+            cmd = mock_run.call_args[0][0]
+            assert cmd[:3] == ["gh", "api", "graphql"]
+            assert 'file0: object(expression: "HEAD:src/a.py")' in cmd[4]
+            assert 'file2: object(expression: "HEAD:img/logo.png")' in cmd[4]
+            assert cmd[5:] == ["-f", "owner=owner", "-f", "name=repo"]
+
+    def test_get_complete_files_batch_splits_large_requests(self):
+        """Test get_complete_files_batch issues one query per batch of files."""
+        file_paths = [f"src/file_{i}.py" for i in range(150)]
+        
+        def graphql(query, variables):
+            count = query.count("object(expression:")
+            return {"data": {"repository": {f"file{i}": {"text": "x"} for i in range(count)}}}
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_graphql', side_effect=graphql) as mock_graphql:
+                contents = service.get_complete_files_batch("owner/repo", file_paths)
+        
+        assert mock_graphql.call_count == 2
+        assert set(contents) == set(file_paths)
+
+    def test_get_complete_files_batch_queries_run_concurrently(self):
+        """Test the queries for separate batches of files are in flight at the same time."""
+        file_paths = [f"src/file_{i}.py" for i in range(250)]
+        # Every query waits until all three are running, sequential queries would time out
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def graphql(query, variables):
+            barrier.wait()
+            count = query.count("object(expression:")
+            return {"data": {"repository": {f"file{i}": {"text": "x"} for i in range(count)}}}
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_graphql', side_effect=graphql):
+                contents = service.get_complete_files_batch("owner/repo", file_paths)
+        
+        assert set(contents) == set(file_paths)
+
+    def test_create_review_posts_all_comments_in_one_request(self):
+        """Test create_review adds all line comments with a single reviews API call."""
+        comments = [
+            PRComment(file_path="a.py", line_number=3, content="First"),
+            PRComment(file_path="b.py", line_number=7, content="Second")
+        ]
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_pr_head_commit', return_value="abc123"):
+                added = service.create_review(pr_number=123, comments=comments)
+        
+        assert added == comments
+        mock_run.assert_called_once()
+        cmd = mock_run.call_args[0][0]
+        assert cmd[:4] == ["gh", "api", "--method", "POST"]
+        assert "repos/owner/repo/pulls/123/reviews" in cmd
+        assert json.loads(mock_run.call_args.kwargs["input"]) == {
+            "commit_id": "abc123",
+            "event": "COMMENT",
+            "comments": [
+                {"path": "a.py", "line": 3, "side": "RIGHT", "body": "First"},
+                {"path": "b.py", "line": 7, "side": "RIGHT", "body": "Second"}
+            ]
+        }
+
+    def test_create_review_with_body_and_event(self):
+        """Test create_review sends the review summary and action with the comments."""
+        comments = [PRComment(file_path="a.py", line_number=3, content="First")]
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+            with patch.object(service, '_get_pr_head_commit', return_value="abc123"):
+                service.create_review(pr_number=123, comments=comments, body="Looks good", event="APPROVE")
+        
+        payload = json.loads(mock_run.call_args.kwargs["input"])
+        assert payload["body"] == "Looks good"
+        assert payload["event"] == "APPROVE"
+        assert len(payload["comments"]) == 1
+
+    def test_get_commit_sha(self):
+        """Test get_commit_sha asks GitHub for the bare SHA of a reference."""
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.return_value = MagicMock(stdout="abc123\n", returncode=0)
+            
+            service = GitHubService(repository="owner/repo")
+            sha = service.get_commit_sha("owner/repo", "main")
+        
+        assert sha == "abc123"
+        cmd = mock_run.call_args[0][0]
+        assert cmd == ["gh", "api", "repos/owner/repo/commits/main", "-H", "Accept: application/vnd.github.sha"]
+
+    def test_get_pull_request_revalidates_cached_response(self, tmp_path):
+        """Test GET requests with an HTTP cache send the ETag and reuse the body on 304."""
+        pr_data = {
+            "number": 123,
+            "title": "Test PR",
+            "body": "Description",
+            "user": {"login": "test-user"},
+            "created_at": "2023-01-01T00:00:00Z",
+            "updated_at": "2023-01-02T00:00:00Z",
+            "base": {"ref": "main"},
+            "head": {"ref": "feature"}
+        }
+        fresh = requests.Response()
+        fresh.status_code = 200
+        fresh.headers["ETag"] = '"v1"'
+        fresh.headers["Content-Type"] = "application/json; charset=utf-8"
+        fresh._content = json.dumps(pr_data).encode()
+        not_modified = requests.Response()
+        not_modified.status_code = 304
+        not_modified._content = b""
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(
+                repository="owner/repo", token="test-token", http_cache_path=str(tmp_path / "http.db"),
+                pr_cache_ttl=0
+            )
+            with patch.object(service._session, 'request', side_effect=[fresh, not_modified]) as mock_request:
+                first = service.get_pull_request(pr_number=123)
+                second = service.get_pull_request(pr_number=123)
+        
+        assert first == second
+        assert second.title == "Test PR"
+        assert "If-None-Match" not in mock_request.call_args_list[0].kwargs["headers"]
+        assert mock_request.call_args_list[1].kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    def test_http_cache_expires_old_responses(self, tmp_path):
+        """Test cached responses are ignored after the TTL and pruned when the cache is opened again."""
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["ETag"] = '"v1"'
+        response._content = b"{}"
+        path = str(tmp_path / "http.db")
+        
+        with patch('src.services.github_service.time.time', return_value=1000.0):
+            cache = HTTPCache(path, ttl=60)
+            cache.set("old", response)
+        with patch('src.services.github_service.time.time', return_value=1030.0):
+            cache.set("new", response)
+        
+        with patch('src.services.github_service.time.time', return_value=1070.0):
+            assert cache.get("old") is None
+            assert cache.get("new")[0] == '"v1"'
+            HTTPCache(path, ttl=60)
+        
+        with sqlite3.connect(path) as db:
+            assert [row[0] for row in db.execute("SELECT key FROM http_cache")] == ["new"]
+
+    def test_gh_auth_token(self):
+        """Test gh_auth_token returns gh's token, or None when gh is unavailable."""
+        from src.services.github_service import gh_auth_token
+        
+        with patch('subprocess.run', return_value=MagicMock(stdout="gho_token\n")) as mock_run:
+            assert gh_auth_token() == "gho_token"
+        assert mock_run.call_args[0][0] == ["gh", "auth", "token"]
+        
+        with patch('subprocess.run', side_effect=FileNotFoundError("gh")):
+            assert gh_auth_token() is None
+
+    def test_pr_comments_with_token_use_api_session(self):
+        """Test PR conversation comments are read and written on the REST session."""
+        comments_page = MagicMock(
+            content=json.dumps([{"id": 1, "node_id": "IC_1", "body": "Looks good"}]).encode(),
+            links={}
+        )
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service._session, 'request', return_value=comments_page) as mock_request:
+                comments = service.get_pr_comments(pr_number=123)
+                service.add_pr_comment(pr_number=123, comment=PRComment(content="Summary", comment_type="body"))
+        
+        assert [(c.content, c.comment_id, c.comment_type) for c in comments] == [("Looks good", "IC_1", "body")]
+        assert mock_request.call_args_list == [
+            call("GET", "https://api.github.com/repos/owner/repo/issues/123/comments", timeout=30, params={"per_page": 100}),
+            call("POST", "https://api.github.com/repos/owner/repo/issues/123/comments", timeout=30, json={"body": "Summary"})
+        ]
+        mock_run.assert_not_called()
+
+    def test_repository_reads_with_token_use_api_session(self):
+        """Test repository info, files, issues and approvals go through the REST session."""
+        def respond(method, url, **kwargs):
+            bodies = {
+                "https://api.github.com/repos/owner/repo": {
+                    "name": "repo", "description": None, "default_branch": "trunk",
+                    "topics": ["cli"], "has_wiki": True, "has_issues": True, "license": {"name": "MIT"}
+                },
+                "https://api.github.com/repos/owner/repo/languages": {"Python": 1200},
+                "https://api.github.com/repos/owner/repo/issues/7": {
+                    "number": 7, "title": "Bug", "body": None, "labels": [{"name": "bug"}]
+                },
+            }
+            if url.endswith("/contents/README.md"):
+                return MagicMock(content=b"# Readme\n")
+            return MagicMock(content=json.dumps(bodies.get(url, {})).encode())
+        
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'), \
+             patch('src.services.github_service.WRITE_INTERVAL', 0):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service._session, 'request', side_effect=respond) as mock_request:
+                info = service.get_repository_info()
+                content = service.get_complete_file("owner/repo", "README.md", "main")
+                issue = service._get_issue_info("owner/repo", 7)
+                approved = service.approve_pr(123, "Ship it")
+        
+        assert (info.default_branch, info.languages, info.topics, info.license) == ("trunk", {"Python": 1200}, ["cli"], "MIT")
+        assert content == "# Readme\n"
+        assert (issue.title, issue.body, issue.labels) == ("Bug", "", ["bug"])
+        assert approved
+        assert mock_request.call_args_list[-1] == call(
+            "POST", "https://api.github.com/repos/owner/repo/pulls/123/reviews",
+            timeout=30, json={"event": "APPROVE", "body": "Ship it"}
+        )
+        mock_run.assert_not_called()
+
+    def test_repository_reads_are_reused(self):
+        """Test repeated file reads are served from the read cache, and missing files are asked again."""
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.side_effect = [
+                MagicMock(stdout="IyBSZWFkbWUK\n", returncode=0),
+                subprocess.CalledProcessError(1, ["gh", "api"], stderr="Not Found"),
+                subprocess.CalledProcessError(1, ["gh", "api"], stderr="Not Found"),
+            ]
+            service = GitHubService(repository="owner/repo")
+            
+            assert service.get_complete_file("owner/repo", "README.md", "main") == "# Readme\n"
+            assert service.get_complete_file("owner/repo", "README.md", ref="main") == "# Readme\n"
+            assert service.get_complete_file("owner/repo", "MISSING.md", "main") == ""
+            assert service.get_complete_file("owner/repo", "MISSING.md", "main") == ""
+        
+        assert mock_run.call_count == 3
+
+    def test_failed_repository_info_is_not_reused(self):
+        """Test the minimal repository info returned on a failed read is asked again, and a real one is reused."""
+        repo_json = json.dumps({"name": "repo", "defaultBranchRef": {"name": "trunk"}})
+        with patch('subprocess.run') as mock_run, \
+             patch.object(GitHubService, '_check_gh_cli'):
+            mock_run.side_effect = [
+                subprocess.CalledProcessError(1, ["gh", "repo", "view"], stderr="HTTP 502: Bad Gateway"),
+                MagicMock(stdout=repo_json, returncode=0),
+            ]
+            service = GitHubService(repository="owner/repo")
+            
+            assert service.get_repository_info().default_branch == "main"
+            assert service.get_repository_info().default_branch == "trunk"
+            assert service.get_repository_info().default_branch == "trunk"
+        
+        assert mock_run.call_count == 2
+
+    def test_add_pr_comment_raises_rate_limit_for_retry(self, sample_pr_comment):
+        """Test a rate limited line comment is raised for the caller to retry instead of falling back."""
+        rate_limited = requests.Response()
+        rate_limited.status_code = 403
+        rate_limited.headers["X-RateLimit-Remaining"] = "0"
+        
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service, '_get_pr_head_commit', return_value="abc123"), \
+                 patch.object(service, '_add_regular_pr_comment') as mock_regular_comment, \
+                 patch.object(service._session, 'request', return_value=rate_limited):
+                with pytest.raises(requests.HTTPError):
+                    service.add_pr_comment(pr_number=123, comment=sample_pr_comment)
+        
+        mock_regular_comment.assert_not_called()
+
+    @pytest.mark.parametrize("error", [
+        requests.Timeout("Read timed out"),
+        requests.ConnectionError("Connection reset by peer"),
+    ], ids=["timeout", "connection_error"])
+    def test_add_pr_comment_does_not_post_again_after_lost_response(self, sample_pr_comment, error):
+        """Test a line comment whose response was lost is raised instead of posted again as a regular comment."""
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo", token="test-token")
+            with patch.object(service, '_get_pr_head_commit', return_value="abc123"), \
+                 patch.object(service, '_add_regular_pr_comment') as mock_regular_comment, \
+                 patch.object(service._session, 'request', side_effect=error):
+                with pytest.raises(type(error)):
+                    service.add_pr_comment(pr_number=123, comment=sample_pr_comment)
+        
+        mock_regular_comment.assert_not_called()
+
+    def test_write_requests_are_spaced(self):
+        """Test requests that create content wait WRITE_INTERVAL after the previous one."""
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+        
+        with patch('src.services.github_service.time.monotonic', side_effect=[100.0, 100.0, 100.25, 101.0]), \
+             patch('src.services.github_service.time.sleep') as mock_sleep:
+            service._wait_for_write_slot()
+            service._wait_for_write_slot()
+        
+        mock_sleep.assert_called_once_with(0.75)
+
+    def test_parse_guidelines(self):
+        """Test rules are bullets, the first numbered items and headings containing a colon."""
+        with patch.object(GitHubService, '_check_gh_cli'):
+            service = GitHubService(repository="owner/repo")
+        
+        content = (
+            "# Guidelines\r\n"
+            "## Style: PEP 8\n"
+            "  - Use type hints  \n"
+            "* Keep functions small\n"
+            "-\n"
+            "- \n"
+            "1. Write tests\n"
+            "2. Update docs\n"
+            "3. Ask for review\n"
+            "Plain text: ignored\n"
+        )
+        
+        assert service._parse_guidelines(content) == [
+            "## Style: PEP 8",
+            "- Use type hints",
+            "* Keep functions small",
+            "1. Write tests",
+            "2. Update docs",
+        ]
@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 import json
 import sys
-from src.services.llm_service import LLMService
+from src.services.llm_service import LLMCache, LLMService
 from src.models.pr_models import GuidelinesInfo, DocumentInfo
 
 
@@ -440,3 +440,167 @@ class TestLLMService:
         service = LLMService()
         with pytest.raises(json.JSONDecodeError):
             service._extract_json_from_response(mock_response)
+
+    def test_analyze_diff_uses_cache_for_identical_patches(self):
+        """Test analyze_diff queries the LLM once for identical patches."""
+        response = json.dumps({"issues": [{"line": 3, "description": "Test issue", "severity": "medium"}]})
+        
+        with patch.object(LLMService, '_query_llm', return_value=response) as mock_query:
+            service = LLMService(model="test-model")
+            first = service.analyze_diff("a.py", "+x = 1")
+            second = service.analyze_diff("b.py", "+x = 1")
+            
+            assert first == second
+            assert first[0]["line"] == 3
+            mock_query.assert_called_once()
+
+    def test_analyze_diff_does_not_cache_failed_queries(self):
+        """Test analyze_diff retries the LLM when the previous query failed."""
+        with patch.object(LLMService, '_query_llm', return_value="") as mock_query:
+            service = LLMService(model="test-model")
+            service.analyze_diff("a.py", "+x = 1")
+            service.analyze_diff("a.py", "+x = 1")
+            
+            assert mock_query.call_count == 2
+
+    @pytest.mark.parametrize("method, args", [
+        ("analyze_diff", ("a.py", "+x = 1")),
+        ("analyze_diff_with_context", ("a.py", "+x = 1", "x = 1")),
+        ("analyze_diffs_with_context_batch", ([("a.py", "+x = 1", "x = 1")],)),
+    ], ids=["diff", "with_context", "batch"])
+    def test_analysis_does_not_cache_unparsable_replies(self, method, args):
+        """Test a reply without valid JSON is not cached, while a valid reply without issues is."""
+        with patch.object(LLMService, '_query_llm', return_value="I found no problems.") as mock_query:
+            service = LLMService(model="test-model")
+            first = getattr(service, method)(*args)
+            getattr(service, method)(*args)
+            
+            assert mock_query.call_count == 2
+            
+            mock_query.return_value = '{"issues": []}'
+            assert getattr(service, method)(*args) == first
+            getattr(service, method)(*args)
+            
+            assert mock_query.call_count == 3
+
+    def test_analyze_diff_sends_fixed_system_prompt(self):
+        """Test analyze_diff sends the reviewer instructions as a shared system prompt."""
+        with patch('src.services.llm_service.requests.post') as mock_post:
+            mock_post.return_value.json.return_value = {"response": '{"issues": []}'}
+            
+            service = LLMService(model="test-model")
+            service.analyze_diff("a.py", "+x = 1")
+            service.analyze_diff("b.py", "+y = 2")
+            
+            payloads = [call_args.kwargs["json"] for call_args in mock_post.call_args_list]
+            assert len(payloads) == 2
+            assert payloads[0]["system"] == payloads[1]["system"]
+            assert "a.py" in payloads[0]["prompt"]
+            assert "a.py" not in payloads[0]["system"]
+
+    def test_context_prompts_share_a_prefix_across_files(self):
+        """Test the guidelines and docs come before the per-file content so prompts share a prefix."""
+        guidelines = GuidelinesInfo(content="Use type hints", source="CONTRIBUTING.md")
+        docs = [DocumentInfo(path="README.md", content="# Project", type="README")]
+        service = LLMService(model="test-model")
+        
+        first = service._construct_diff_analysis_prompt_with_context("a.py", "+x = 1", "x = 1", guidelines, docs)
+        second = service._construct_diff_analysis_prompt_with_context("b.py", "+y = 2", "y = 2", guidelines, docs)
+        
+        prefix = first[:first.index("File: a.py")]
+        assert "Use type hints" in prefix and "# Project" in prefix
+        assert second.startswith(prefix)
+
+    def test_analyze_diff_with_context_uses_cache(self):
+        """Test analyze_diff_with_context reuses results only when all inputs are unchanged."""
+        response = json.dumps({"issues": [{"line": 1, "description": "Test issue"}]})
+        guidelines = GuidelinesInfo(content="Use type hints", source="CONTRIBUTING.md")
+        
+        with patch.object(LLMService, '_query_llm', return_value=response) as mock_query:
+            service = LLMService(model="test-model")
+            first = service.analyze_diff_with_context("a.py", "+x = 1", "x = 1", guidelines)
+            second = service.analyze_diff_with_context("a.py", "+x = 1", "x = 1", guidelines)
+            service.analyze_diff_with_context("a.py", "+x = 1", "x = 2", guidelines)
+            
+            assert first == second
+            assert mock_query.call_count == 2
+
+    def test_analyze_diffs_with_context_batch_assigns_issues_to_files(self):
+        """Test a batched analysis sends the guidelines once and returns the issues per file."""
+        response = json.dumps({"issues": [
+            {"file": "b.py", "line": 2, "description": "Issue in b"},
+            {"file": "a.py", "line": 1, "description": "Issue in a"},
+            {"file": "unknown.py", "line": 1, "description": "Hallucinated file"},
+        ]})
+        guidelines = GuidelinesInfo(content="Use type hints", source="CONTRIBUTING.md")
+        files = [("a.py", "+x = 1", "x = 1"), ("b.py", "+y = 2", "y = 2"), ("c.py", "+z = 3", None)]
+        
+        with patch.object(LLMService, '_query_llm', return_value=response) as mock_query:
+            service = LLMService(model="test-model")
+            first = service.analyze_diffs_with_context_batch(files, guidelines)
+            second = service.analyze_diffs_with_context_batch(files, guidelines)
+            
+            assert list(first) == ["a.py", "b.py", "c.py"]
+            assert [issue["description"] for issue in first["a.py"]] == ["Issue in a"]
+            assert [issue["line"] for issue in first["b.py"]] == [2]
+            assert first["c.py"] == []
+            assert "file" not in first["a.py"][0]
+            assert second == first
+            mock_query.assert_called_once()
+            
+            prompt = mock_query.call_args.args[0]
+            assert prompt.count("Use type hints") == 1
+            assert all(f"File: {file_path}" in prompt for file_path, _, _ in files)
+
+    def test_analyze_pr_description_uses_cache(self):
+        """Test analyze_pr_description queries the LLM once for the same description."""
+        response = json.dumps({"purpose": "Fix bug", "changes": ["Fix"], "completeness": "high"})
+        
+        with patch.object(LLMService, '_query_llm', return_value=response) as mock_query:
+            service = LLMService(model="test-model")
+            first = service.analyze_pr_description("Fixes a bug")
+            first["changes"].append("Mutated by the caller")
+            second = service.analyze_pr_description("Fixes a bug")
+            
+            assert second["changes"] == ["Fix"]
+            mock_query.assert_called_once()
+
+    @pytest.mark.parametrize("response", ["No JSON here", "{not json}"], ids=["no_json", "invalid_json"])
+    def test_analyze_pr_description_does_not_cache_fallback(self, response):
+        """Test the fallback analysis for an unparsable reply is not cached."""
+        with patch.object(LLMService, '_query_llm', return_value=response) as mock_query:
+            service = LLMService(model="test-model")
+            first = service.analyze_pr_description("Fixes a bug")
+            service.analyze_pr_description("Fixes a bug")
+            
+            assert first["purpose"] == "Could not extract purpose"
+            assert mock_query.call_count == 2
+
+    def test_llm_cache_persists_results(self, tmp_path):
+        """Test LLMCache with a path keeps results across cache instances."""
+        path = str(tmp_path / "llm_cache.sqlite")
+        key = LLMCache.make_key("analyze_diff", "test-model", "+x = 1")
+        
+        LLMCache(path=path).set(key, [{"line": 1, "description": "Test issue"}])
+        
+        assert LLMCache(path=path).get(key) == [{"line": 1, "description": "Test issue"}]
+        assert LLMCache(path=path).get(LLMCache.make_key("other")) is None
+
+    def test_llm_cache_expires_persisted_results(self, tmp_path):
+        """Test LLMCache ignores persisted results older than its TTL and counts hits and misses."""
+        path = str(tmp_path / "llm_cache.sqlite")
+        key = LLMCache.make_key("analyze_diff", "test-model", "+x = 1")
+        
+        with patch("src.services.llm_service.time.time", return_value=1000.0):
+            LLMCache(path=path).set(key, [{"line": 1, "description": "Test issue"}])
+        
+        with patch("src.services.llm_service.time.time", return_value=1050.0):
+            cache = LLMCache(path=path, ttl=100)
+            assert cache.get(key) == [{"line": 1, "description": "Test issue"}]
+        
+        with patch("src.services.llm_service.time.time", return_value=1200.0):
+            expired = LLMCache(path=path, ttl=100)
+            assert expired.get(key) is None
+        
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert (expired.hits, expired.misses) == (0, 1)
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 import asyncio
+import io
 import typer
 from typer.testing import CliRunner
 from rich.console import Console
@@ -15,15 +16,39 @@ from src.main import app
 runner = CliRunner()
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the on-disk caches of the commands out of the home directory."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    monkeypatch.setattr('src.main.CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr('src.main.DEFAULT_LLM_CACHE_PATH', str(cache_dir / "llm.db"))
+    monkeypatch.setattr('src.main.GITHUB_HTTP_CACHE_PATH', str(cache_dir / "gh_http.db"))
+    monkeypatch.setattr('src.main.MERGED_PR_CACHE_DIR', str(cache_dir / "merged-prs"))
+    monkeypatch.setattr('src.main.GH_CHECK_CACHE_PATH', str(cache_dir / "gh_check.json"))
+    return cache_dir
+
+
+@pytest.fixture
+def gh_binary(tmp_path):
+    """Pretend gh is on PATH and keep the check cache out of the home directory."""
+    with patch('shutil.which', return_value="/usr/bin/gh"), \
+         patch('os.path.getmtime', return_value=1700000000.0), \
+         patch('src.main.GH_CHECK_CACHE_PATH', str(tmp_path / "gh_check.json")):
+        yield tmp_path / "gh_check.json"
+
+
 class TestMain:
-    def test_review_success(self):
+    def test_review_success(self, cache_dir):
         """Test review command with successful execution."""
-        with patch('src.main.GitHubService') as mock_gh_service, \
-             patch('src.main.LLMService') as mock_llm_service, \
-             patch('src.main.PRReviewAgent') as mock_agent_class, \
-             patch('src.main.setup_logging') as mock_setup_logging, \
-             patch('src.main.asyncio.run') as mock_run, \
-             patch('src.main.Console') as mock_console_class:
+        with patch('src.services.github_service.GitHubService') as mock_gh_service, \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService') as mock_llm_service, \
+             patch('src.services.llm_service.LLMCache') as mock_llm_cache, \
+             patch('src.core.pr_review_agent.PRReviewAgent') as mock_agent_class, \
+             patch('src.utils.logging_utils.setup_logging') as mock_setup_logging, \
+             patch('asyncio.run') as mock_run, \
+             patch('rich.console.Console') as mock_console_class:
             
             # Set up mocks
             mock_agent = MagicMock()
@@ -41,25 +66,117 @@ class TestMain:
             mock_console_class.return_value = mock_console
             
             # Call the function
-            result = runner.invoke(app, ["review", "123", "--repo", "owner/repo"])
+            with patch.dict('os.environ', clear=True):
+                result = runner.invoke(app, ["review", "123", "--repo", "owner/repo"])
             
             # Verify the result
             assert result.exit_code == 0
             
             # Verify the mocks were called correctly
-            mock_gh_service.assert_called_once_with(repository="owner/repo")
+            mock_gh_service.assert_called_once_with(
+                repository="owner/repo", token=None, http_cache_path=str(cache_dir / "gh_http.db"),
+                merged_pr_cache_dir=str(cache_dir / "merged-prs")
+            )
             mock_llm_service.assert_called_once()
             mock_agent_class.assert_called_once()
             mock_run.assert_called_once()
 
+    def test_review_passes_concurrency_to_agent(self):
+        """Test the --concurrency option sets how many files the agent analyzes at once."""
+        with patch('src.services.github_service.GitHubService'), \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService'), \
+             patch('src.services.llm_service.LLMCache'), \
+             patch('src.core.pr_review_agent.PRReviewAgent') as mock_agent_class, \
+             patch('src.utils.logging_utils.setup_logging'), \
+             patch('asyncio.run'), \
+             patch('rich.console.Console'):
+            
+            result = runner.invoke(app, ["review", "123", "--repo", "owner/repo", "--concurrency", "2"])
+            
+            assert result.exit_code == 0
+            assert mock_agent_class.call_args.kwargs["llm_concurrency"] == 2
+
+    def test_review_runs_on_uvloop_when_installed(self):
+        """Test the review runs with uvloop.run instead of asyncio.run when uvloop is installed."""
+        mock_uvloop = MagicMock()
+        with patch('src.services.github_service.GitHubService'), \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService'), \
+             patch('src.services.llm_service.LLMCache'), \
+             patch('src.core.pr_review_agent.PRReviewAgent'), \
+             patch('src.utils.logging_utils.setup_logging'), \
+             patch.dict('sys.modules', {'uvloop': mock_uvloop}), \
+             patch('asyncio.run') as mock_run, \
+             patch('rich.console.Console'):
+            
+            result = runner.invoke(app, ["review", "123", "--repo", "owner/repo"])
+            
+            assert result.exit_code == 0
+            mock_uvloop.run.assert_called_once()
+            mock_run.assert_not_called()
+
+    def test_review_no_cache(self):
+        """Test --no-cache keeps GitHub and LLM results off the disk."""
+        with patch('src.services.github_service.GitHubService') as mock_gh_service, \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService'), \
+             patch('src.services.llm_service.LLMCache') as mock_llm_cache, \
+             patch('src.core.pr_review_agent.PRReviewAgent'), \
+             patch('src.utils.logging_utils.setup_logging'), \
+             patch('asyncio.run'), \
+             patch('rich.console.Console'):
+            
+            result = runner.invoke(app, ["review", "123", "--repo", "owner/repo", "--no-cache"])
+            
+            assert result.exit_code == 0
+            assert mock_gh_service.call_args.kwargs["http_cache_path"] is None
+            assert mock_gh_service.call_args.kwargs["merged_pr_cache_dir"] is None
+            mock_llm_cache.assert_called_once_with(path=None)
+
+    @pytest.mark.parametrize("terminal", [True, False], ids=["rich", "plain"])
+    def test_review_prints_summary(self, terminal):
+        """Test review command lists analyzed files and added comments, with or without a terminal."""
+        from src.models.pr_models import FileChange, PRComment
+        
+        with patch('src.services.github_service.GitHubService'), \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService'), \
+             patch('src.services.llm_service.LLMCache'), \
+             patch('src.core.pr_review_agent.PRReviewAgent'), \
+             patch('src.utils.logging_utils.setup_logging'), \
+             patch('asyncio.run') as mock_run, \
+             patch('rich.console.Console') as mock_console_class:
+            
+            mock_run.return_value = {
+                "errors": [],
+                "file_changes": [FileChange(filename="b.py", status="modified"),
+                                 FileChange(filename="a.py", status="added")],
+                "complete_files": {"a.py": "x = 1", "c.py": "y = 2"},
+                "detected_issues": [],
+                "added_comments": [PRComment(content="Fix", file_path="a.py", line_number=3)],
+            }
+            output = io.StringIO()
+            mock_console_class.return_value = Console(file=output, width=120, force_terminal=terminal)
+            
+            result = runner.invoke(app, ["review", "123", "--repo", "owner/repo"])
+            
+            assert result.exit_code == 0
+            printed = output.getvalue()
+            assert "Analyzed 3 files" in printed
+            assert "- a.py\n- b.py\n- c.py" in printed
+            assert "1. a.py:3" in printed
+
     def test_review_error(self):
         """Test review command when an error occurs."""
-        with patch('src.main.GitHubService') as mock_gh_service, \
-             patch('src.main.LLMService') as mock_llm_service, \
-             patch('src.main.PRReviewAgent') as mock_agent_class, \
-             patch('src.main.setup_logging') as mock_setup_logging, \
-             patch('src.main.asyncio.run') as mock_run, \
-             patch('src.main.Console') as mock_console_class:
+        with patch('src.services.github_service.GitHubService') as mock_gh_service, \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService') as mock_llm_service, \
+             patch('src.services.llm_service.LLMCache') as mock_llm_cache, \
+             patch('src.core.pr_review_agent.PRReviewAgent') as mock_agent_class, \
+             patch('src.utils.logging_utils.setup_logging') as mock_setup_logging, \
+             patch('asyncio.run') as mock_run, \
+             patch('rich.console.Console') as mock_console_class:
             
             # Set up mocks
             mock_agent = MagicMock()
@@ -81,12 +198,14 @@ class TestMain:
 
     def test_review_exception(self):
         """Test review command when an exception is raised."""
-        with patch('src.main.GitHubService') as mock_gh_service, \
-             patch('src.main.LLMService') as mock_llm_service, \
-             patch('src.main.PRReviewAgent') as mock_agent_class, \
-             patch('src.main.setup_logging') as mock_setup_logging, \
-             patch('src.main.asyncio.run') as mock_run, \
-             patch('src.main.Console') as mock_console_class:
+        with patch('src.services.github_service.GitHubService') as mock_gh_service, \
+             patch('src.services.github_service.gh_auth_token', return_value=None), \
+             patch('src.services.llm_service.LLMService') as mock_llm_service, \
+             patch('src.services.llm_service.LLMCache') as mock_llm_cache, \
+             patch('src.core.pr_review_agent.PRReviewAgent') as mock_agent_class, \
+             patch('src.utils.logging_utils.setup_logging') as mock_setup_logging, \
+             patch('asyncio.run') as mock_run, \
+             patch('rich.console.Console') as mock_console_class:
             
             # Set up mocks
             mock_agent = MagicMock()
@@ -105,8 +224,8 @@ class TestMain:
 
     def test_check_ollama_success(self):
         """Test check_ollama command with successful response."""
-        with patch('requests.get') as mock_get, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console, \
+        with patch('requests.Session.get') as mock_get, \
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console, \
              patch.dict('sys.modules', {'langchain_ollama': MagicMock()}):
             
             # Set up mocks
@@ -127,12 +246,12 @@ class TestMain:
             assert result.exit_code == 0
             
             # Verify the mock was called
-            mock_get.assert_called_once_with("http://localhost:11434/api/tags")
+            mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=2.0)
 
     def test_check_ollama_no_model(self):
         """Test check_ollama command when model is not available."""
-        with patch('requests.get') as mock_get, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console, \
+        with patch('requests.Session.get') as mock_get, \
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console, \
              patch.dict('sys.modules', {'langchain_ollama': MagicMock()}):
             
             # Set up mocks
@@ -152,12 +271,12 @@ class TestMain:
             assert result.exit_code == 0
             
             # Verify the mock was called
-            mock_get.assert_called_once_with("http://localhost:11434/api/tags")
+            mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=2.0)
 
     def test_check_ollama_not_running(self):
         """Test check_ollama command when Ollama is not running."""
-        with patch('requests.get') as mock_get, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console, \
+        with patch('requests.Session.get') as mock_get, \
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console, \
              patch.dict('sys.modules', {'langchain_ollama': MagicMock()}):
             
             # Set up mocks
@@ -170,12 +289,31 @@ class TestMain:
             assert result.exit_code == 0
             
             # Verify the mock was called
-            mock_get.assert_called_once_with("http://localhost:11434/api/tags")
+            mock_get.assert_called_once_with("http://localhost:11434/api/tags", timeout=2.0)
 
-    def test_check_gh_cli_success(self):
+    def test_check_ollama_timeout(self):
+        """Test check_ollama command when Ollama does not respond in time."""
+        with patch('requests.Session.get') as mock_get, \
+             patch('rich.console.Console') as mock_console_class, \
+             patch.dict('sys.modules', {'langchain_ollama': MagicMock()}):
+            
+            # Set up mocks
+            mock_get.side_effect = requests.Timeout("Read timed out")
+            mock_console = MagicMock()
+            mock_console_class.return_value = mock_console
+            
+            # Call the function
+            result = runner.invoke(app, ["check-ollama"])
+            
+            # Verify the result
+            assert result.exit_code == 0
+            printed = " ".join(str(call.args[0]) for call in mock_console.print.call_args_list)
+            assert "did not respond within 2 seconds" in printed
+
+    def test_check_gh_cli_success(self, gh_binary):
         """Test check_gh_cli command with successful response."""
         with patch('subprocess.run') as mock_run, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console:
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console:
             
             # Set up mocks
             mock_version_result = MagicMock()
@@ -196,10 +334,10 @@ class TestMain:
             # Verify the mock was called
             assert mock_run.call_count == 2
 
-    def test_check_gh_cli_not_installed(self):
+    def test_check_gh_cli_not_installed(self, gh_binary):
         """Test check_gh_cli command when GitHub CLI is not installed."""
         with patch('subprocess.run') as mock_run, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console:
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console:
             
             # Set up mocks
             mock_run.side_effect = FileNotFoundError("No such file or directory: 'gh'")
@@ -213,10 +351,10 @@ class TestMain:
             # Verify the mock was called
             mock_run.assert_called_once()
 
-    def test_check_gh_cli_not_authenticated(self):
+    def test_check_gh_cli_not_authenticated(self, gh_binary):
         """Test check_gh_cli command when GitHub CLI is not authenticated."""
         with patch('subprocess.run') as mock_run, \
-             patch('src.main.Console', return_value=MagicMock()) as mock_console:
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console:
             
             # Set up mocks
             mock_version_result = MagicMock()
@@ -236,3 +374,60 @@ class TestMain:
             
             # Verify the mock was called
             assert mock_run.call_count == 2
+
+    def test_check_gh_cli_reuses_cached_result(self, gh_binary):
+        """Test check_gh_cli skips the gh probes while the binary is unchanged."""
+        with patch('subprocess.run') as mock_run, \
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console_class:
+            mock_run.side_effect = [
+                MagicMock(returncode=0, stdout="gh version 2.0.0"),
+                MagicMock(returncode=0),
+            ]
+
+            assert runner.invoke(app, ["check-gh-cli"]).exit_code == 0
+            assert gh_binary.exists()
+            result = runner.invoke(app, ["check-gh-cli"])
+
+            assert result.exit_code == 0
+            assert mock_run.call_count == 2
+            printed = " ".join(str(call.args[0]) for call in mock_console_class.return_value.print.call_args_list)
+            assert printed.count("gh version 2.0.0") == 2
+
+            # A new gh binary invalidates the cached result
+            with patch('os.path.getmtime', return_value=1800000000.0):
+                mock_run.side_effect = [
+                    MagicMock(returncode=0, stdout="gh version 2.1.0"),
+                    MagicMock(returncode=0),
+                ]
+                assert runner.invoke(app, ["check-gh-cli"]).exit_code == 0
+            assert mock_run.call_count == 4
+
+    def test_check_gh_cli_probes_again_until_authenticated(self, gh_binary):
+        """Test an unauthenticated result is not cached, so logging in is picked up by the next check."""
+        with patch('subprocess.run') as mock_run, \
+             patch('rich.console.Console', return_value=MagicMock()) as mock_console_class:
+            mock_run.side_effect = [
+                MagicMock(returncode=0, stdout="gh version 2.0.0"),
+                MagicMock(returncode=1),
+                MagicMock(returncode=0, stdout="gh version 2.0.0"),
+                MagicMock(returncode=0),
+            ]
+            
+            assert runner.invoke(app, ["check-gh-cli"]).exit_code == 0
+            assert not gh_binary.exists()
+            assert runner.invoke(app, ["check-gh-cli"]).exit_code == 0
+            
+            assert mock_run.call_count == 4
+            assert gh_binary.exists()
+            printed = [str(call.args[0]) for call in mock_console_class.return_value.print.call_args_list]
+            assert printed[-1] == "Authenticated with GitHub CLI!"
+
+    def test_check_gh_cli_not_on_path(self):
+        """Test check_gh_cli reports a missing gh without spawning a process."""
+        with patch('shutil.which', return_value=None), \
+             patch('subprocess.run') as mock_run, \
+             patch('rich.console.Console', return_value=MagicMock()):
+            result = runner.invoke(app, ["check-gh-cli"])
+
+            assert result.exit_code == 0
+            mock_run.assert_not_called()
@@ -1,6 +1,6 @@
 import pytest
 from datetime import datetime
-from src.models.pr_models import FileChange, PRComment, PullRequest, PRReviewState
+from src.models.pr_models import DocumentInfo, FileChange, PRComment, PullRequest, PRReviewState
 
 
 class TestFileChange:
@@ -155,3 +155,14 @@ class TestPRReviewState:
         assert state.comments_added == []
         assert state.completed is False
         assert state.error is None
+
+
+class TestDocumentInfo:
+    def test_lowercased_forms_are_cached(self):
+        """Test DocumentInfo lowercases its path and content once and keeps them out of dumps."""
+        doc = DocumentInfo(path="docs/README.md", content="# Project README", type="readme")
+        
+        assert doc.path_lower == "docs/readme.md"
+        assert doc.content_lower == "# project readme"
+        assert doc.content_lower is doc.content_lower
+        assert doc.model_dump() == {"path": "docs/README.md", "content": "# Project README", "type": "readme"}
@@ -1,9 +1,14 @@
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock, call
 import asyncio
+import json
+import subprocess
+import threading
 from datetime import datetime
 
-from src.core.pr_review_agent import PRReviewAgent
+import requests
+
+from src.core.pr_review_agent import ISSUE_TYPES, SEVERITIES, PRReviewAgent
 from src.models.pr_models import (
     PRReviewState, 
     PullRequest, 
@@ -327,8 +332,8 @@ class TestPRReviewAgent:
         )
 
     @pytest.mark.asyncio
-    async def test_analyze_diff_success(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_file_change):
-        """Test analyze_diff method with successful response."""
+    async def test_review_pipeline_success(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_file_change):
+        """Test review_pipeline method with successful response."""
         # Set up the file change with full content
         file_change_with_content = sample_file_change.model_copy(update={"full_content": "def test_func():\n    return 'new'"})
         
@@ -347,7 +352,7 @@ class TestPRReviewAgent:
         ]
         
         agent = PRReviewAgent(mock_github_service, mock_llm_service)
-        result = await agent.analyze_diff(state)
+        result = await agent.review_pipeline(state)
         
         assert len(result.issues) == 1
         assert result.issues[0].file_path == "test_file.py"
@@ -365,8 +370,8 @@ class TestPRReviewAgent:
         )
 
     @pytest.mark.asyncio
-    async def test_analyze_diff_fallback(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_file_change):
-        """Test analyze_diff method falls back to basic analysis when full content is not available."""
+    async def test_review_pipeline_fallback(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_file_change):
+        """Test review_pipeline method falls back to basic analysis when full content is not available."""
         # Set up the state with a file change (without full content)
         updated_pr = sample_pr_review_state.pull_request.model_copy(update={"changes": [sample_file_change]})
         state = sample_pr_review_state.model_copy(update={"pull_request": updated_pr})
@@ -382,20 +387,20 @@ class TestPRReviewAgent:
         ]
         
         agent = PRReviewAgent(mock_github_service, mock_llm_service)
-        result = await agent.analyze_diff(state)
+        result = await agent.review_pipeline(state)
         
         assert len(result.issues) == 1
         mock_llm_service.analyze_diff.assert_called_once()
         mock_llm_service.analyze_diff_with_context.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_generate_comments_success(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_issue):
-        """Test generate_comments method with successful response."""
+    async def test_review_pipeline_generates_comments(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_issue):
+        """Test review_pipeline generates comments from the identified issues."""
         # Set up the state with issues
         state = sample_pr_review_state.model_copy(update={"issues": [sample_pr_issue]})
         
         agent = PRReviewAgent(mock_github_service, mock_llm_service)
-        result = await agent.generate_comments(state)
+        result = await agent.review_pipeline(state)
         
         assert len(result.comments) == 2  # One inline comment + one summary comment
         
@@ -413,8 +418,8 @@ class TestPRReviewAgent:
         assert "test_file.py:42" in summary_comment.content
 
     @pytest.mark.asyncio
-    async def test_add_comments_success(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_comment):
-        """Test add_comments method with successful response."""
+    async def test_review_pipeline_adds_comments(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_comment):
+        """Test review_pipeline adds the generated comments to the PR."""
         # Set up the state with comments
         state = sample_pr_review_state.model_copy(update={"comments": [sample_pr_comment]})
         
@@ -422,7 +427,7 @@ class TestPRReviewAgent:
         mock_github_service.add_pr_comment.return_value = sample_pr_comment
         
         agent = PRReviewAgent(mock_github_service, mock_llm_service)
-        result = await agent.add_comments(state)
+        result = await agent.review_pipeline(state)
         
         assert len(result.added_comments) == 1
         assert result.added_comments[0] == sample_pr_comment
@@ -440,15 +445,678 @@ class TestPRReviewAgent:
         )
 
     @pytest.mark.asyncio
-    async def test_add_comments_skip_existing(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_comment):
-        """Test add_comments method skips existing comment threads."""
+    async def test_review_pipeline_skips_existing_comments(self, mock_github_service, mock_llm_service, sample_pr_review_state, sample_pr_comment):
+        """Test review_pipeline skips existing comment threads."""
         # Set up the state with comments
         state = sample_pr_review_state.model_copy(update={"comments": [sample_pr_comment]})
         
         mock_github_service.check_comment_thread_exists.return_value = True
         
         agent = PRReviewAgent(mock_github_service, mock_llm_service)
-        result = await agent.add_comments(state)
+        result = await agent.review_pipeline(state)
         
         assert len(result.added_comments) == 0
         mock_github_service.add_pr_comment.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_concurrent_files(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline analyzes files concurrently and isolates per-file failures."""
+        changes = [
+            FileChange(filename=f"file_{i}.py", status="modified", patch=f"@@ -1 +1 @@\n-old{i}\n+new{i}")
+            for i in range(3)
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        
+        def analyze(file_path, diff_content):
+            if file_path == "file_1.py":
+                raise RuntimeError("LLM unavailable")
+            return [{"line": 1, "description": f"Issue in {file_path}", "severity": "low"}]
+        
+        mock_llm_service.analyze_diff.side_effect = analyze
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        assert mock_llm_service.analyze_diff.call_count == 3
+        assert [issue.file_path for issue in result["detected_issues"]] == ["file_0.py", "file_2.py"]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_posts_one_by_one_when_review_fails(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline posts every comment one by one when the review fails and skips the ones that fail."""
+        changes = [FileChange(filename="a.py", status="added", patch="@@ -0,0 +1,3 @@\n+a\n+b\n+c")]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [
+            {"line": line, "description": f"Issue {line}", "severity": "low"} for line in (1, 2, 3)
+        ]
+        
+        def add_pr_comment(pr_number, comment, repository):
+            if comment.line_number == 2:
+                raise RuntimeError("GitHub unavailable")
+            return comment
+        
+        mock_github_service.create_review.side_effect = subprocess.CalledProcessError(1, ["gh", "api"])
+        mock_github_service.add_pr_comment.side_effect = add_pr_comment
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        comments = result["generated_comments"]
+        mock_github_service.create_review.assert_called_once()
+        assert mock_github_service.add_pr_comment.call_count == 3
+        assert result["added_comments"] == [comments[0], comments[2]]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_skips_duplicate_comments(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline does not post duplicate or already existing comments."""
+        changes = [FileChange(filename="a.py", status="added", patch="@@ -0,0 +1,2 @@\n+a\n+b")]
+        mock_llm_service.analyze_diff.return_value = [
+            {"line": 1, "description": "Already posted", "severity": "low"},
+            {"line": 2, "description": "Another issue", "severity": "low"},
+            {"line": 2, "description": "Another issue", "severity": "low"},
+        ]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        existing_comment, new_comment, _ = [
+            agent._issue_to_comment(issue) for issue in agent._issues_from_llm("a.py", mock_llm_service.analyze_diff.return_value)
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes}),
+            existing_comments=[existing_comment]
+        )
+        mock_github_service.add_pr_comment.side_effect = lambda pr_number, comment, repository: comment
+        
+        result = await agent.review_pipeline(state)
+        
+        mock_github_service.create_review.assert_not_called()
+        mock_github_service.add_pr_comment.assert_called_once_with(
+            pr_number=123,
+            comment=new_comment,
+            repository="test-owner/test-repo"
+        )
+        assert result["added_comments"] == [new_comment]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_skips_non_reviewable_files(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline does not send lockfiles, vendored or generated files to the LLM."""
+        patch_content = "@@ -1 +1 @@\n-old\n+new"
+        changes = [
+            FileChange(filename="src/app.py", status="modified", patch=patch_content),
+            FileChange(filename="package-lock.json", status="modified", patch=patch_content),
+            FileChange(filename="web/node_modules/lib/index.js", status="modified", patch=patch_content),
+            FileChange(filename="static/app.min.js", status="modified", patch=patch_content),
+            FileChange(filename="proto/service_pb2.py", status="modified", patch=patch_content),
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = []
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        await agent.review_pipeline(state)
+        
+        mock_llm_service.analyze_diff.assert_called_once_with(
+            file_path="src/app.py",
+            diff_content=patch_content
+        )
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_skips_whitespace_only_changes(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline does not send blank line or trailing whitespace changes to the LLM."""
+        changes = [
+            FileChange(filename="blank.py", status="modified", patch="@@ -1,2 +1,3 @@\n x = 1\n+\n y = 2"),
+            FileChange(filename="trailing.py", status="modified", patch="@@ -1 +1 @@\n-x = 1   \n+x = 1"),
+            FileChange(filename="indent.py", status="modified", patch="@@ -1 +1 @@\n-x = 1\n+    x = 1"),
+            FileChange(filename="moved.py", status="modified", patch="@@ -1,2 +1,2 @@\n-a()\n-b()\n+b()\n+a()"),
+            FileChange(filename="moved_past_context.py", status="modified", patch="@@ -1,3 +1,3 @@\n-a()\n b()\n+a()\n"),
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = []
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        await agent.review_pipeline(state)
+        
+        analyzed = [call_args.kwargs["file_path"] for call_args in mock_llm_service.analyze_diff.call_args_list]
+        assert sorted(analyzed) == ["indent.py", "moved.py", "moved_past_context.py"]
+
+    @pytest.mark.asyncio
+    async def test_fetch_pr_fetches_info_and_diff_concurrently(self, mock_github_service, mock_llm_service, sample_pull_request, sample_file_change):
+        """Test fetch_pr starts both gh calls together and merges the diff into the PR info."""
+        both_started = threading.Barrier(2, timeout=5)
+        
+        def get_pull_request(pr_number, repository):
+            both_started.wait()
+            return sample_pull_request
+        
+        def get_pr_diff(pr_number, repository):
+            both_started.wait()
+            return [sample_file_change]
+        
+        mock_github_service.get_pull_request.side_effect = get_pull_request
+        mock_github_service.get_pr_diff.side_effect = get_pr_diff
+        
+        state = PRReviewState(pr_number=123, repository="test-owner/test-repo")
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.fetch_pr(state)
+        
+        assert result["file_changes"] == [sample_file_change]
+        assert result["pr_info"].title == sample_pull_request.title
+        assert result["pr_info"].changes == [sample_file_change]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_posts_before_all_files_are_analyzed(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline posts a file's comments while other files are still being analyzed."""
+        changes = [
+            FileChange(filename="fast.py", status="modified", patch="@@ -1 +1 @@\n-a\n+b"),
+            FileChange(filename="slow.py", status="modified", patch="@@ -1 +1 @@\n-c\n+d"),
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        first_comment_posted = threading.Event()
+        
+        def analyze_diff(file_path, diff_content):
+            if file_path == "slow.py":
+                # Only finishes once the comment for fast.py has been posted
+                assert first_comment_posted.wait(timeout=5)
+            return [{"line": 1, "description": f"Issue in {file_path}", "severity": "low"}]
+        
+        def add_pr_comment(pr_number, comment, repository):
+            first_comment_posted.set()
+            return comment
+        
+        mock_llm_service.analyze_diff.side_effect = analyze_diff
+        mock_github_service.add_pr_comment.side_effect = add_pr_comment
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        assert [issue.file_path for issue in result["detected_issues"]] == ["fast.py", "slow.py"]
+        assert [comment.file_path for comment in result["generated_comments"]] == ["fast.py", "slow.py"]
+        assert [comment.file_path for comment in result["added_comments"]] == ["fast.py", "slow.py"]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_cancels_workers_when_one_fails(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline raises a worker's unexpected error without leaving other workers running."""
+        changes = [
+            FileChange(filename=f"file_{i}.py", status="modified", patch=f"@@ -1 +1 @@\n-old{i}\n+new{i}")
+            for i in range(3)
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [{"line": 1, "description": "Issue", "severity": "low"}]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        with patch.object(agent, "_post_review", AsyncMock(side_effect=RuntimeError("Broken"))):
+            with pytest.raises(RuntimeError, match="Broken"):
+                await agent.review_pipeline(state)
+        
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    @pytest.mark.asyncio
+    async def test_review_pr_eager_runs_nodes_without_workflow(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pr in eager mode runs the nodes directly and merges their updates."""
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, eager=True)
+        agent.workflow = AsyncMock()
+        
+        calls = []
+        
+        def make_step(name, update):
+            async def step(state):
+                calls.append((name, state.pr_info))
+                return update
+            return step
+        
+        stages = [
+            [("fetch_pr", make_step("fetch_pr", {"pr_info": sample_pull_request}))],
+            [("fetch_repository_info", make_step("fetch_repository_info", {"approved": True}))],
+        ]
+        
+        with patch.object(agent, "_workflow_stages", return_value=stages):
+            result = await agent.review_pr(123, "test-owner/test-repo")
+        
+        agent.workflow.ainvoke.assert_not_called()
+        assert calls == [("fetch_pr", None), ("fetch_repository_info", sample_pull_request)]
+        assert result["pr_info"] == sample_pull_request
+        assert result["approved"] is True
+        assert result["pr_number"] == 123
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_splits_large_patches_on_hunks(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline sends large patches to the LLM in hunk-aligned chunks."""
+        header = "diff --git a/big.py b/big.py\n--- a/big.py\n+++ b/big.py\n"
+        hunks = [f"@@ -{i * 100},3 +{i * 100},3 @@\n" + "+x = 1\n" * 1000 for i in range(1, 4)]
+        changes = [FileChange(filename="big.py", status="modified", patch=header + "".join(hunks))]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.side_effect = lambda file_path, diff_content: [
+            {"line": int(diff_content.split("@@ -")[1].split(",")[0]), "description": "Issue", "type": "error"}
+        ]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        sent_patches = [c.kwargs["diff_content"] for c in mock_llm_service.analyze_diff.call_args_list]
+        assert sorted(sent_patches) == sorted(header + hunk for hunk in hunks)
+        assert [issue.line_number for issue in result["detected_issues"]] == [100, 200, 300]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_analyzes_identical_patches_once(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline sends identical hunks from different files to the LLM only once."""
+        hunk = "@@ -1,3 +1,3 @@\n-# Copyright 2023\n+# Copyright 2024\n"
+        changes = [
+            FileChange(filename=name, status="modified", patch=f"diff --git a/{name} b/{name}\n{hunk}")
+            for name in ("a.py", "b.py", "c.py")
+        ] + [FileChange(filename="d.py", status="modified", patch="@@ -5 +5 @@\n-x\n+y")]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [{"line": 1, "description": "Update the year", "type": "nitpick"}]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        assert mock_llm_service.analyze_diff.call_count == 2
+        assert [issue.file_path for issue in result["detected_issues"]] == ["a.py", "b.py", "c.py", "d.py"]
+        assert all(issue.description == "Update the year" for issue in result["detected_issues"])
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_retries_transient_failures(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline retries a failed post, honoring GitHub's Retry-After header."""
+        changes = [FileChange(filename="a.py", status="added", patch="@@ -0,0 +1 @@\n+a")]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [{"line": 1, "description": "Issue", "severity": "low"}]
+        rate_limited = requests.Response()
+        rate_limited.status_code = 429
+        rate_limited.headers["Retry-After"] = "7"
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        posted_comment = agent._issue_to_comment(agent._issues_from_llm("a.py", mock_llm_service.analyze_diff.return_value)[0])
+        mock_github_service.add_pr_comment.side_effect = [
+            requests.HTTPError(response=rate_limited),
+            subprocess.CalledProcessError(1, ["gh", "pr", "comment"], stderr="HTTP 502: Bad Gateway"),
+            posted_comment
+        ]
+        with patch("src.core.pr_review_agent.asyncio.sleep", new_callable=AsyncMock) as mock_sleep, \
+             patch("src.core.pr_review_agent.random.uniform", return_value=0.5):
+            result = await agent.review_pipeline(state)
+        
+        assert result["added_comments"] == [posted_comment]
+        assert mock_github_service.add_pr_comment.call_count == 3
+        assert mock_sleep.await_args_list == [call(7.0), call(0.5)]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status_code, stderr", [
+        (404, None),
+        (422, None),
+        (None, "HTTP 404: Not Found (https://api.github.com/repos/test-owner/test-repo/issues/123/comments)"),
+        (None, "HTTP 422: Validation Failed"),
+        (None, None),
+    ], ids=["http_404", "http_422", "gh_404", "gh_422", "timeout"])
+    async def test_post_comment_does_not_retry_permanent_failures(self, mock_github_service, mock_llm_service, sample_pr_comment, status_code, stderr):
+        """Test a comment rejected by GitHub or lost in transit is not retried, only rate limits and server errors are."""
+        if status_code:
+            response = requests.Response()
+            response.status_code = status_code
+            error = requests.HTTPError(response=response)
+        elif stderr:
+            error = subprocess.CalledProcessError(1, ["gh", "api"], stderr=stderr)
+        else:
+            # The comment may have been created before the response was lost
+            error = requests.Timeout("Read timed out")
+        mock_github_service.add_pr_comment.side_effect = error
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        with patch("src.core.pr_review_agent.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            with pytest.raises(type(error)):
+                await agent._post_comment(123, sample_pr_comment, "test-owner/test-repo")
+        
+        mock_github_service.add_pr_comment.assert_called_once()
+        mock_sleep.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_fetch_repository_docs_returns_partial_update(self, mock_github_service, mock_llm_service):
+        """Test fetch_repository_docs returns only the repository context, keeping existing context."""
+        docs = [DocumentInfo(path="README.md", content="# Readme", type="readme")]
+        mock_github_service.get_repository_docs.return_value = docs
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            repository_context={"structure": {"src": []}}
+        )
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.fetch_repository_docs(state)
+        
+        assert result == {"repository_context": {"structure": {"src": []}, "docs": docs}}
+        assert state.repository_context == {"structure": {"src": []}}
+
+    @pytest.mark.asyncio
+    async def test_fetch_repository_docs_reuses_docs_until_branch_moves(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test repository docs are fetched again only when the base branch points to a new commit."""
+        docs = [DocumentInfo(path="README.md", content="# Readme", type="readme")]
+        mock_github_service.get_repository_docs.return_value = docs
+        mock_github_service.get_commit_sha.side_effect = ["sha1", "sha1", "sha2"]
+        state = PRReviewState(pr_number=123, repository="test-owner/test-repo", pr_info=sample_pull_request)
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        results = [await agent.fetch_repository_docs(state) for _ in range(3)]
+        
+        assert all(result["repository_context"]["docs"] == docs for result in results)
+        assert mock_github_service.get_repository_docs.call_count == 2
+        mock_github_service.get_commit_sha.assert_called_with("test-owner/test-repo", "main")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("default_branch, ref", [(None, "HEAD"), ("trunk", "trunk")], ids=["unknown", "trunk"])
+    async def test_fetch_repository_guidelines_keys_cache_on_default_branch(self, mock_github_service, mock_llm_service, sample_repository_info, sample_guidelines_info, default_branch, ref):
+        """Test cached guidelines are checked against the default branch, or HEAD while it isn't known."""
+        mock_github_service.get_repository_guidelines.return_value = sample_guidelines_info
+        repository_info = sample_repository_info.model_copy(update={"default_branch": default_branch}) if default_branch else None
+        state = PRReviewState(pr_number=123, repository="test-owner/test-repo", repository_info=repository_info)
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        await agent.fetch_repository_guidelines(state)
+        
+        mock_github_service.get_commit_sha.assert_called_once_with("test-owner/test-repo", ref)
+
+    @pytest.mark.asyncio
+    async def test_fetch_linked_issues_reuses_issues_for_unchanged_description(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test linked issues are fetched again only when the PR description changes."""
+        issues = [IssueInfo(number=42, title="Bug", body="Broken", labels=[])]
+        mock_github_service.get_linked_issues.return_value = issues
+        state = PRReviewState(pr_number=123, repository="test-owner/test-repo", pr_info=sample_pull_request)
+        edited_pr = sample_pull_request.model_copy(update={"description": "Fixes #42 and #43"})
+        edited_state = state.model_copy(update={"pr_info": edited_pr})
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        first = await agent.fetch_linked_issues(state)
+        second = await agent.fetch_linked_issues(state)
+        await agent.fetch_linked_issues(edited_state)
+        
+        assert first == second == {"linked_issues": issues}
+        assert mock_github_service.get_linked_issues.call_args_list == [
+            call(pr_description=sample_pull_request.description),
+            call(pr_description="Fixes #42 and #43")
+        ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("eager", [False, True])
+    async def test_review_pr_stops_when_pr_fetch_fails(self, mock_github_service, mock_llm_service, eager):
+        """Test review_pr ends right after fetch_pr when the PR cannot be fetched."""
+        mock_github_service.get_pull_request.side_effect = RuntimeError("Not Found")
+        mock_github_service.get_pr_diff.return_value = []
+        mock_github_service.get_repository_info.return_value = None
+        mock_github_service.get_repository_guidelines.return_value = None
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, eager=eager)
+        result = await agent.review_pr(123, "test-owner/test-repo")
+        
+        assert result["errors"] == [{"step": "fetch_pr", "message": "Failed to fetch PR #123: Not Found"}]
+        mock_github_service.get_repository_docs.assert_not_called()
+        mock_github_service.add_pr_comment.assert_not_called()
+        mock_llm_service.analyze_diff.assert_not_called()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("eager", [False, True])
+    async def test_review_pr_fetches_independent_context_concurrently(self, mock_github_service, mock_llm_service, sample_pull_request, eager):
+        """Test review_pr fetches the PR, repository info and guidelines at the same time."""
+        all_started = threading.Barrier(3, timeout=5)
+        
+        def wait_for_others(result):
+            def call(*args, **kwargs):
+                all_started.wait()
+                return result
+            return call
+        
+        mock_github_service.get_pull_request.side_effect = wait_for_others(sample_pull_request)
+        mock_github_service.get_repository_info.side_effect = wait_for_others(None)
+        mock_github_service.get_repository_guidelines.side_effect = wait_for_others(None)
+        mock_github_service.get_pr_diff.return_value = []
+        mock_github_service.get_complete_files_batch.return_value = {}
+        mock_github_service.get_repository_docs.return_value = []
+        mock_github_service.get_linked_issues.return_value = []
+        mock_llm_service.analyze_pr_description.return_value = {"purpose": "Test"}
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, eager=eager)
+        result = await agent.review_pr(123, "test-owner/test-repo")
+        
+        assert result["errors"] == []
+        assert result["pr_info"].title == sample_pull_request.title
+        assert result["pr_description_analysis"] == {"purpose": "Test"}
+        mock_github_service.get_repository_docs.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_analysis_respects_llm_concurrency(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test the number of files analyzed at the same time is bounded by llm_concurrency."""
+        changes = [
+            FileChange(filename=f"file_{i}.py", status="modified", patch=f"@@ -1 +1 @@\n-old{i}\n+new{i}")
+            for i in range(6)
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+        
+        def analyze_diff(file_path, diff_content):
+            with lock:
+                in_flight.append(file_path)
+                peak.append(len(in_flight))
+            threading.Event().wait(0.02)
+            with lock:
+                in_flight.remove(file_path)
+            return []
+        
+        mock_llm_service.analyze_diff.side_effect = analyze_diff
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, llm_concurrency=2)
+        await agent.review_pipeline(state)
+        
+        assert mock_llm_service.analyze_diff.call_count == 6
+        assert max(peak) == 2
+
+    def test_prioritize_relevant_docs_uses_prebuilt_index(self, mock_github_service, mock_llm_service):
+        """Test the most relevant docs for the changed file are selected using the prebuilt index."""
+        docs = [
+            DocumentInfo(path="docs/CONTRIBUTING.md", content="How to contribute", type="contributing"),
+            DocumentInfo(path="src/core/NOTES.md", content="See SRC/CORE/agent.py for details", type="other"),
+            DocumentInfo(path="README.md", content="# Project", type="readme"),
+            DocumentInfo(path="CHANGELOG.md", content="Release notes", type="other"),
+        ]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        doc_index = agent._build_doc_index(docs)
+        
+        assert [entry[1:] for entry in doc_index] == [
+            ("docs/contributing.md", "how to contribute", 6),
+            ("src/core/notes.md", "see src/core/agent.py for details", 0),
+            ("readme.md", "# project", 8),
+            ("changelog.md", "release notes", 0),
+        ]
+        assert agent._prioritize_relevant_docs("src/core/agent.py", doc_index) == [docs[1], docs[2], docs[0]]
+        assert agent._prioritize_relevant_docs("src/core/agent.py", []) == []
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_batches_small_files(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test small files are analyzed together when batching is enabled, other files on their own."""
+        changes = [
+            FileChange(filename="a.py", status="modified", patch="@@ -1 +1 @@\n-a\n+a1"),
+            FileChange(filename="b.py", status="modified", patch="@@ -1 +1 @@\n-b\n+b1"),
+            FileChange(filename="new.py", status="added", patch="@@ -0,0 +1 @@\n+new"),
+            FileChange(filename="big.py", status="modified", patch="@@ -1 +1 @@\n-big\n+" + "x" * 500),
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes}),
+            complete_files={"a.py": "a1\n", "b.py": "b1\n", "big.py": "x\n"}
+        )
+        mock_llm_service.analyze_diffs_with_context_batch.return_value = {
+            "a.py": [{"line": 1, "description": "Issue in a"}],
+            "b.py": [{"line": 1, "description": "Issue in b"}],
+        }
+        mock_llm_service.analyze_diff.return_value = [{"line": 1, "description": "Issue in new"}]
+        mock_llm_service.analyze_diff_with_context.return_value = [{"line": 1, "description": "Issue in big"}]
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, llm_batch_bytes=200)
+        result = await agent.review_pipeline(state)
+        
+        assert [issue.file_path for issue in result["detected_issues"]] == ["a.py", "b.py", "new.py", "big.py"]
+        mock_llm_service.analyze_diffs_with_context_batch.assert_called_once()
+        batched_files = mock_llm_service.analyze_diffs_with_context_batch.call_args.kwargs["files"]
+        assert [file_path for file_path, _, _ in batched_files] == ["a.py", "b.py"]
+        mock_llm_service.analyze_diff.assert_called_once()
+        mock_llm_service.analyze_diff_with_context.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_analysis_runs_llm_concurrency_blocking_calls_at_once(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test blocking LLM calls are not limited by the size of the default thread pool."""
+        changes = [
+            FileChange(filename=f"file_{i}.py", status="modified", patch=f"@@ -1 +1 @@\n-old{i}\n+new{i}")
+            for i in range(8)
+        ]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        barrier = threading.Barrier(8, timeout=5)
+        
+        def analyze_diff(file_path, diff_content):
+            barrier.wait()
+            return [{"line": 1, "description": f"Issue in {file_path}"}]
+        
+        mock_llm_service.analyze_diff.side_effect = analyze_diff
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service, llm_concurrency=8)
+        result = await agent.review_pipeline(state)
+        
+        assert len(result["detected_issues"]) == 8
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_posts_line_comments_as_one_review(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test review_pipeline posts line comments in a single review and other comments one by one."""
+        changes = [FileChange(filename="a.py", status="added", patch="@@ -0,0 +1,3 @@\n+a\n+b\n+c")]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [
+            {"line": line, "description": f"Issue {line}", "severity": "low"} for line in (1, 2, 3)
+        ] + [{"line": None, "description": "Overall issue", "severity": "low"}]
+        mock_github_service.create_review.side_effect = lambda pr_number, comments, repository: comments
+        mock_github_service.add_pr_comment.side_effect = lambda pr_number, comment, repository: comment
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        line_comments = result["generated_comments"][:3]
+        other_comment = result["generated_comments"][3]
+        mock_github_service.create_review.assert_called_once_with(
+            pr_number=123,
+            comments=line_comments,
+            repository="test-owner/test-repo"
+        )
+        mock_github_service.add_pr_comment.assert_called_once_with(
+            pr_number=123,
+            comment=other_comment,
+            repository="test-owner/test-repo"
+        )
+        assert result["added_comments"] == line_comments + [other_comment]
+
+    @pytest.mark.asyncio
+    async def test_review_pipeline_posts_lines_outside_diff_as_regular_comments(self, mock_github_service, mock_llm_service, sample_pull_request):
+        """Test comments on lines outside the diff skip the review and the failed line comment."""
+        patch_text = "@@ -1,2 +1,3 @@\n context\n-old\n+new\n+added\n"
+        changes = [FileChange(filename="a.py", status="modified", patch=patch_text)]
+        state = PRReviewState(
+            pr_number=123,
+            repository="test-owner/test-repo",
+            pr_info=sample_pull_request.model_copy(update={"changes": changes})
+        )
+        mock_llm_service.analyze_diff.return_value = [
+            {"line": line, "description": f"Line {line}", "severity": "low"} for line in (1, 3, 40)
+        ]
+        mock_github_service.create_review.side_effect = lambda pr_number, comments, repository: comments
+        mock_github_service.add_pr_comment.side_effect = lambda pr_number, comment, repository: comment
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        result = await agent.review_pipeline(state)
+        
+        assert mock_github_service.create_review.call_args.kwargs["comments"] == result["generated_comments"][:2]
+        posted = mock_github_service.add_pr_comment.call_args.kwargs["comment"]
+        assert (posted.file_path, posted.line_number, posted.comment_type) == ("a.py", 40, "body")
+        assert len(result["added_comments"]) == 3
+
+    @pytest.mark.parametrize("suggestion, guideline_violation, expected", [
+        ("Use a set", "Rule 3", "**HIGH**: Slow lookup\n\n**Suggestion**: Use a set\n\n**Guideline Violation**: Rule 3"),
+        ("Use a set", None, "**HIGH**: Slow lookup\n\n**Suggestion**: Use a set"),
+        ("", None, "**HIGH**: Slow lookup\n\n"),
+    ], ids=["suggestion_and_guideline", "suggestion", "description_only"])
+    def test_issue_to_comment_content_is_stable(self, mock_github_service, mock_llm_service, suggestion, guideline_violation, expected):
+        """Test the comment format stays the same, so comments from earlier reviews are recognized."""
+        issue = PRIssue(
+            file_path="a.py",
+            line_number=3,
+            description="Slow lookup",
+            suggestion=suggestion,
+            severity="high",
+            issue_type="suggestion",
+            guideline_violation=guideline_violation
+        )
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        comment = agent._issue_to_comment(issue)
+        
+        assert comment.content == expected
+        assert (comment.file_path, comment.line_number, comment.comment_type) == ("a.py", 3, "inline")
+
+    def test_issues_from_llm_normalizes_type_and_severity(self, mock_github_service, mock_llm_service):
+        """Test LLM issue types and severities are mapped onto the shared constant strings."""
+        llm_issues = json.loads(
+            '[{"line": 1, "description": "A", "type": "error", "severity": "high"},'
+            ' {"line": 2, "description": "B", "type": "bug", "severity": "critical"},'
+            ' {"line": 3, "description": "C", "type": ["error"]}]'
+        )
+        
+        agent = PRReviewAgent(mock_github_service, mock_llm_service)
+        issues = agent._issues_from_llm("a.py", llm_issues)
+        
+        assert [(issue.issue_type, issue.severity) for issue in issues] == [
+            ("error", "high"), ("suggestion", "critical"), ("suggestion", "low")
+        ]
+        assert issues[0].issue_type is ISSUE_TYPES["error"]
+        assert issues[0].severity is SEVERITIES["high"]